@@ -3,8 +3,18 @@
 #   2020 Fabian Jankowski
 #
 
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+import json
+import multiprocessing
 import os.path
+import platform
+import resource
+import socket
+import sys
 import time
+import tracemalloc
 
 import matplotlib
 
@@ -14,7 +24,8 @@ import numpy as np
 import pandas as pd
 
 from meertrapdb.clustering.clusterer import Clusterer
-from meertrapdb.parsing_helpers import parse_spccl_file
+from meertrapdb.simulation.generator import CandidateGenerator
+from meertrapdb.version import __version__
 
 
 class MyTimer:
@@ -22,20 +33,313 @@ class MyTimer:
         """
         A simple timing context manager for benchmarking purposes.
         """
-        self.start = time.time()
+        self.start = time.perf_counter()
 
     def __enter__(self):
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        end = time.time()
+        end = time.perf_counter()
         self.runtime = end - self.start
 
-        msg = "The function took: {0:.3f} s.".format(self.runtime)
-        print(msg)
 
+def parse_args():
+    """
+    Parse the commandline arguments.
+
+    Returns
+    -------
+    options: argparse.Parser object
+    """
+
+    parser = argparse.ArgumentParser(
+        description="Benchmark the multi-beam clusterer.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[5000, 10000, 25000, 50000, 100000, 200000],
+        help="The numbers of candidates to benchmark.",
+    )
+
+    parser.add_argument(
+        "--rates",
+        type=float,
+        nargs="+",
+        default=[0.5, 5.0],
+        help="The candidate densities to benchmark in candidates per second.",
+    )
+
+    parser.add_argument(
+        "--algorithms",
+        choices=Clusterer.algorithms,
+        nargs="+",
+        default=["sweep"],
+        help="The clustering algorithms to benchmark.",
+    )
+
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="The number of timing runs. The fastest one counts.",
+    )
+
+    parser.add_argument(
+        "--history",
+        type=str,
+        default="clusterer_benchmark_history.csv",
+        help="The CSV file to append the results to.",
+    )
+
+    parser.add_argument(
+        "--output",
+        type=str,
+        default="clusterer_benchmark.json",
+        help="The JSON file to write the report of this run to.",
+    )
+
+    parser.add_argument(
+        "--baseline",
+        type=str,
+        default=None,
+        help="The JSON report of a previous run to compare the throughput with.",
+    )
+
+    parser.add_argument(
+        "--margin",
+        type=float,
+        default=0.2,
+        help="The tolerated fractional drop in throughput against the baseline.",
+    )
+
+    parser.add_argument(
+        "--max_exponent",
+        type=float,
+        default=1.3,
+        help="The maximum tolerated scaling exponent of the runtime.",
+    )
+
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=42,
+        help="The seed for generating the synthetic candidates.",
+    )
+
+    return parser.parse_args()
+
+
+def get_peak_rss():
+    """
+    Get the peak resident set size of the current process.
+
+    The operating system reports the peak over the lifetime of the process, so
+    it only measures a single benchmark if it runs in a process of its own.
+
+    Returns
+    -------
+    rss: float
+        The peak resident set size in MiB.
+    """
+
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # bytes on macos, kibibytes elsewhere
+    if sys.platform == "darwin":
+        rss = rss / 1024.0
+
+    return rss / 1024.0
+
+
+def run_benchmark(algorithm, candidates, repeat):
+    """
+    Benchmark the clustering of some candidates.
+
+    This runs in a fresh child process for each benchmark, see
+    `run_benchmark_isolated`.
+
+    Parameters
+    ----------
+    algorithm: str
+        The clustering algorithm to benchmark.
+    candidates: ~np.record
+        The candidates to cluster.
+    repeat: int
+        The number of timing runs.
+
+    Returns
+    -------
+    result: dict
+        The fastest runtime in s, the throughput in candidates per second, the
+        peak memory allocated during clustering and the peak resident set size
+        of the process in MiB, and the number of cluster heads.
+    """
+
+    clust = Clusterer(algorithm=algorithm)
+    runtimes = []
+
+    for _ in range(repeat):
+        with MyTimer() as timer:
+            info = clust.match_candidates(candidates)
+
+        runtimes.append(timer.runtime)
+
+    # memory tracing slows down the clustering, so measure it separately
+    tracemalloc.start()
+    clust.match_candidates(candidates)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    runtime = min(runtimes)
+
+    result = {
+        "runtime": runtime,
+        "throughput": len(candidates) / runtime,
+        "peak_alloc": peak / 1024.0**2,
+        "peak_rss": get_peak_rss(),
+        "heads": int(np.count_nonzero(info["is_head"])),
+    }
+
+    return result
+
+
+def run_benchmark_isolated(algorithm, candidates, repeat):
+    """
+    Benchmark the clustering of some candidates in a child process.
+
+    The child process is spawned afresh, so that its peak resident set size
+    covers the interpreter, the candidates and this benchmark only, and not the
+    ones before it.
+
+    Parameters
+    ----------
+    algorithm: str
+        The clustering algorithm to benchmark.
+    candidates: ~np.record
+        The candidates to cluster.
+    repeat: int
+        The number of timing runs.
+
+    Returns
+    -------
+    result: dict
+        The results of the benchmark, see `run_benchmark`.
+    """
+
+    with ProcessPoolExecutor(
+        max_workers=1, mp_context=multiprocessing.get_context("spawn")
+    ) as executor:
+        result = executor.submit(run_benchmark, algorithm, candidates, repeat).result()
+
+    return result
 
-def plot_runtime_scaling(df):
+
+def fit_scaling(df):
+    """
+    Fit the scaling of the runtime with the number of candidates.
+
+    Parameters
+    ----------
+    df: ~pd.DataFrame
+        The benchmark results.
+
+    Returns
+    -------
+    fits: ~pd.DataFrame
+        The exponent and normalisation of a power law fit to the runtime for
+        each algorithm and candidate density.
+    """
+
+    fits = []
+
+    for (algorithm, rate), group in df.groupby(["algorithm", "rate"]):
+        if len(group) < 2:
+            continue
+
+        exponent, norm = np.polyfit(
+            np.log10(group["ncands"].astype(float)),
+            np.log10(group["runtime"].astype(float)),
+            1,
+        )
+
+        fits.append(
+            {
+                "algorithm": algorithm,
+                "rate": rate,
+                "exponent": exponent,
+                "norm": 10**norm,
+            }
+        )
+
+    fits = pd.DataFrame(fits, columns=["algorithm", "rate", "exponent", "norm"])
+
+    return fits
+
+
+def get_key(item):
+    """
+    Get the key of a benchmark setting.
+
+    Parameters
+    ----------
+    item: dict
+        The benchmark result.
+
+    Returns
+    -------
+    key: str
+        The key.
+    """
+
+    key = "{0}_{1}_{2}".format(item["algorithm"], item["rate"], item["ncands"])
+
+    return key
+
+
+def check_baseline(df, baseline, margin):
+    """
+    Compare the throughput with that of a baseline run.
+
+    Parameters
+    ----------
+    df: ~pd.DataFrame
+        The benchmark results.
+    baseline: dict
+        The report of the baseline run.
+    margin: float
+        The tolerated fractional drop in throughput.
+
+    Returns
+    -------
+    regressions: list of str
+        The settings where the throughput dropped by more than the margin.
+    """
+
+    reference = {get_key(item): item["throughput"] for item in baseline["results"]}
+
+    regressions = []
+
+    for item in df.to_dict(orient="records"):
+        key = get_key(item)
+
+        if key not in reference:
+            continue
+
+        if item["throughput"] < (1.0 - margin) * reference[key]:
+            regressions.append(
+                "{0}: {1:.1f} candidates/s, baseline {2:.1f} candidates/s".format(
+                    key, item["throughput"], reference[key]
+                )
+            )
+
+    return regressions
+
+
+def plot_runtime_scaling(df, fits):
     """
     Plot the runtime scaling.
 
@@ -43,6 +347,8 @@ def plot_runtime_scaling(df):
     ----------
     df: ~pd.DataFrame
         The input data.
+    fits: ~pd.DataFrame
+        The power law fits to the runtime.
     """
 
     fig = plt.figure()
@@ -50,9 +356,22 @@ def plot_runtime_scaling(df):
 
     plot_range = np.geomspace(np.min(df["ncands"]), np.max(df["ncands"]), num=100)
 
-    ax.plot(df["ncands"], df["runtime"], marker="o", label="measured")
-
-    ax.plot(plot_range, 4.0e-7 * plot_range**1.6, label=r"$T(n) \propto n^{1.6}$")
+    for (algorithm, rate), group in df.groupby(["algorithm", "rate"]):
+        ax.plot(
+            group["ncands"],
+            group["runtime"],
+            marker="o",
+            label="{0}, {1} cands/s".format(algorithm, rate),
+        )
+
+    for item in fits.to_dict(orient="records"):
+        ax.plot(
+            plot_range,
+            item["norm"] * plot_range ** item["exponent"],
+            ls="dashed",
+            color="grey",
+            label=r"$T(n) \propto n^{{{0:.2f}}}$".format(item["exponent"]),
+        )
 
     ax.grid()
     ax.legend(loc="best", frameon=False)
@@ -74,44 +393,101 @@ def plot_runtime_scaling(df):
 
 
 def main():
-    test_file = os.path.join(
-        os.path.dirname(__file__), "..", "tests", "test_clusterer_candidates.spccl.log"
-    )
-
-    example_cands = parse_spccl_file(test_file, 1)
-    print("Number of example candidates: {0}".format(len(example_cands)))
+    args = parse_args()
 
-    df = pd.DataFrame(columns=["ncands", "runtime"])
+    results = []
 
     # benchmark on increasing numbers of synthetic candidates
-    for ncands in [5000, 10000, 25000, 50000, 100000, 200000]:
-        # generate larger synthetic data set from example candidates
-        # pick candidates with replacement
-        idx = np.random.choice(example_cands.shape[0], ncands, replace=True)
-
-        candidates = example_cands[idx]
-
-        # generate correct indices so that the clusterer works
-        # each input candidate needs to have a unique index
-        candidates["index"] = np.arange(len(candidates))
-
-        print("Number of synthetic candidates: {0}".format(len(candidates)))
+    for rate in args.rates:
+        gen = CandidateGenerator(rate=rate, seed=args.seed)
+
+        for ncands in args.sizes:
+            candidates = gen.generate(ncands, version=1)
+
+            for algorithm in args.algorithms:
+                result = run_benchmark_isolated(algorithm, candidates, args.repeat)
+                result.update({"algorithm": algorithm, "rate": rate, "ncands": ncands})
+                results.append(result)
+
+                print(
+                    "{0}, {1} candidates/s, {2} candidates: {3:.3f} s, "
+                    "{4:.1f} candidates/s, {5:.1f} MiB".format(
+                        algorithm,
+                        rate,
+                        ncands,
+                        result["runtime"],
+                        result["throughput"],
+                        result["peak_alloc"],
+                    )
+                )
+
+    columns = [
+        "algorithm",
+        "rate",
+        "ncands",
+        "runtime",
+        "throughput",
+        "peak_alloc",
+        "peak_rss",
+        "heads",
+    ]
+    df = pd.DataFrame(results, columns=columns)
+    fits = fit_scaling(df)
 
-        clust = Clusterer()
-
-        with MyTimer() as timer:
-            clust.match_candidates(candidates)
-
-        print("Runtime: {0:.1f} s".format(timer.runtime))
-        print("Clustering rate: {0:.1f} candidates/s".format(ncands / timer.runtime))
-
-        df_temp = pd.DataFrame({"ncands": ncands, "runtime": timer.runtime}, index=[0])
+    print(df.to_string())
+    print(fits.to_string())
+
+    # check for regressions
+    failures = []
+
+    for item in fits.to_dict(orient="records"):
+        if item["exponent"] > args.max_exponent:
+            failures.append(
+                "{0}_{1}: scaling exponent {2:.2f}".format(
+                    item["algorithm"], item["rate"], item["exponent"]
+                )
+            )
+
+    if args.baseline is not None:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+
+        failures += check_baseline(df, baseline, args.margin)
+
+    # record the run
+    meta = {
+        "utc": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S"),
+        "version": __version__,
+        "host": socket.gethostname(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+    }
+
+    report = {
+        "meta": meta,
+        "results": df.to_dict(orient="records"),
+        "fits": fits.to_dict(orient="records"),
+        "failures": failures,
+    }
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    history = df.copy()
+    for key in ["host", "version", "utc"]:
+        history.insert(0, key, meta[key])
+
+    history.to_csv(
+        args.history, mode="a", header=not os.path.isfile(args.history), index=False
+    )
 
-        df = pd.concat([df, df_temp], ignore_index=True)
+    plot_runtime_scaling(df, fits)
 
-    print(df.to_string())
+    if len(failures) > 0:
+        for item in failures:
+            print("Regression: {0}".format(item))
 
-    plot_runtime_scaling(df)
+        sys.exit(1)
 
 
 if __name__ == "__main__":
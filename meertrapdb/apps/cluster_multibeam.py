@@ -12,7 +12,7 @@ from astropy.coordinates import SkyCoord
 import numpy as np
 
 from meertrapdb.clustering.clusterer import Clusterer
-from meertrapdb.parsing_helpers import parse_spccl_file
+from meertrapdb.parsing_helpers import load_spccl_files
 
 # disable false positives of 'assigning to function call which does not return'
 # pylint test case in numpy masks
@@ -33,7 +33,12 @@ def parse_args():
         formatter_class=argparse.ArgumentDefaultsHelpFormatter,
     )
 
-    parser.add_argument("filename", type=str)
+    parser.add_argument(
+        "filenames",
+        type=str,
+        nargs="+",
+        help="The SPCCL files to cluster together.",
+    )
 
     parser.add_argument(
         "--dm", type=float, default=0.02, help="Fractional DM tolerance."
@@ -46,11 +51,39 @@ def parse_args():
         help="Time tolerance for matching in milliseconds.",
     )
 
+    parser.add_argument(
+        "--algorithm",
+        choices=Clusterer.algorithms,
+        default="sweep",
+        help="The clustering algorithm to use.",
+    )
+
+    parser.add_argument(
+        "--nproc",
+        type=int,
+        default=1,
+        help="The number of processes to use for loading and clustering.",
+    )
+
+    parser.add_argument(
+        "--cache",
+        action="store_true",
+        default=False,
+        help="Cache the parsed SPCCL files in binary files for later runs.",
+    )
+
+    parser.add_argument(
+        "--cache_dir",
+        type=str,
+        default=None,
+        help="The directory to store the cache files in.",
+    )
+
     parser.add_argument(
         "--spccl_version",
         type=int,
         default=2,
-        help="The version of the input SPCCL file.",
+        help="The version of the input SPCCL files.",
     )
 
     return parser.parse_args()
@@ -64,9 +97,15 @@ def parse_args():
 def main():
     args = parse_args()
 
-    candidates = parse_spccl_file(args.filename, args.spccl_version)
+    candidates = load_spccl_files(
+        args.filenames,
+        args.spccl_version,
+        nproc=args.nproc,
+        cache=args.cache,
+        cache_dir=args.cache_dir,
+    )
 
-    clust = Clusterer(args.time, args.dm)
+    clust = Clusterer(args.time, args.dm, algorithm=args.algorithm, nproc=args.nproc)
     info = clust.match_candidates(candidates)
 
     mask = info["is_head"]
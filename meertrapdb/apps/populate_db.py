@@ -4,38 +4,69 @@
 #
 
 import argparse
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 from decimal import Decimal
 import glob
+from itertools import repeat
 import json
 import logging
+import multiprocessing
 import os.path
 import random
 import shutil
+import signal
 import sys
+import threading
 import time
 from time import sleep
 
 from astropy.coordinates import SkyCoord
-from astropy.time import Time
 import astropy.units as u
 import numpy as np
 from numpy.lib import recfunctions
-from pony.orm import db_session, delete, select
+from pony.orm import IntegrityError, db_session, exists, flush, select
 from pytz import timezone
 
 from meertrapdb.clustering.clusterer import Clusterer
 from meertrapdb.config_helpers import get_config
-from meertrapdb.db_helpers import setup_db
+from meertrapdb.db_helpers import (
+    delete_links,
+    insert_entities,
+    insert_links,
+    setup_db,
+)
 from meertrapdb.db_logger import DBHandler
 from meertrapdb.dm_helpers import get_mw_dm
 from meertrapdb.general_helpers import setup_logging
-from meertrapdb.parsing_helpers import parse_spccl_file
+from meertrapdb.ingest_helpers import (
+    EntityCache,
+    IngestJournal,
+    PlotCopier,
+    StagingScanner,
+    copy_plots,
+    get_candidate_times,
+    get_duplicates,
+    get_mjd_keys,
+    is_ingest_complete,
+    make_dir,
+)
+from meertrapdb.knownsource_helpers import (
+    find_known_sources,
+    get_matcher_cache_file,
+    load_matcher,
+)
+from meertrapdb.parsing_helpers import (
+    SpcclFollower,
+    get_spccl_file_info,
+    parse_spccl_file,
+)
 from meertrapdb.schedule_block_helpers import get_sb_info
 from meertrapdb import schema
 from meertrapdb.schema import db
 from meertrapdb.slack_helpers import send_slack_notification
 from meertrapdb.version import __version__
+import psrmatch
 from psrmatch.matcher import Matcher
 
 # astropy generates members dynamically, pylint therefore fails
@@ -67,10 +98,18 @@ def parse_args():
             "production",
             "sift",
             "parameters",
+            "watch",
         ],
         help="Mode of operation.",
     )
 
+    parser.add_argument(
+        "-i",
+        "--incremental",
+        action="store_true",
+        help='Only sift the candidates that are not yet sifted, extending the existing clusters. This flag works with "production" and "sift" modes only.',
+    )
+
     parser.add_argument(
         "-s",
         "--schedule_block",
@@ -83,7 +122,7 @@ def parse_args():
         "-t",
         "--test_run",
         action="store_true",
-        help='Do neither move, nor copy files. This flag works with "production" mode only.',
+        help='Do neither move, nor copy files. This flag works with "production" and "watch" modes only.',
     )
 
     parser.add_argument(
@@ -109,12 +148,17 @@ def check_args(args):
     """
 
     # sanity check test_run flag
-    if args.test_run is True and args.mode != "production":
-        print('The "test_run" flag is only valid for "production" mode.')
+    if args.test_run is True and args.mode not in ["production", "watch"]:
+        print('The "test_run" flag is only valid for "production" and "watch" modes.')
+        sys.exit(1)
+
+    # sanity check incremental flag
+    if args.incremental is True and args.mode not in ["production", "sift"]:
+        print('The "incremental" flag is only valid for "production" and "sift" modes.')
         sys.exit(1)
 
     # check that there is a schedule block id given
-    if args.mode in ["known_sources", "production", "sift", "parameters"]:
+    if args.mode in ["known_sources", "production", "sift", "parameters", "watch"]:
         if not args.schedule_block:
             print("Please specify a schedule block ID to use.")
             sys.exit(1)
@@ -265,27 +309,29 @@ def run_fake():
     log.info("Done. Time taken: {0}".format(datetime.now() - start))
 
 
-def insert_candidates(data, sb_id, summary, obs_utc_start, node_name):
+def insert_observation(sb_id, summary, obs_utc_start, cache):
     """
-    Insert candidates into database.
+    Insert the schedule block and observation of a pipeline run into the
+    database, if they are not there yet.
 
     Parameters
     ----------
-    data: numpy.rec
-        The parsed candidate data.
     sb_id: int
         The ID of the schedule block in the MeerTRAP database.
     summary: dict
         Information about the pipeline run.
     obs_utc_start: datetime.datetime
         The start UTC of the observation.
-    node_name: str
-        The name of the node, e.g. `tpn-0-37`.
+    cache: ~EntityCache
+        The primary keys of the parent rows known from previous calls.
 
     Returns
     -------
-    plots: list of dict
-        Plot files to be copied.
+    obs_pk: int
+        The primary key of the observation.
+    new: list of tuple
+        The parent rows that are not yet in the cache. They should only be added
+        to it once the transaction is committed.
     """
 
     log = logging.getLogger("meertrapdb.populate_db")
@@ -294,206 +340,374 @@ def insert_candidates(data, sb_id, summary, obs_utc_start, node_name):
     fsconf = config["filesystem"]
 
     # start time of the schedule block
-    sb_local_time_start = datetime.strptime(
-        summary["sb_details"]["actual_start_time"][:-2], fsconf["date_formats"]["local"]
-    )
-    sb_utc_start = sb_local_time_start.replace(tzinfo=timezone("UTC"))
+    sb_utc_start = get_sb_utc_start(summary)
+
+    new = []
 
     with db_session:
         # 1) schedule blocks
         # check if schedule block is already in the database, otherwise reference it
-        sb_queried = schema.ScheduleBlock.select(lambda sb: sb.sb_id == sb_id)[:]
+        sb_pk = cache.get("schedule_block", sb_id)
+
+        if sb_pk is None:
+            sb_queried = schema.ScheduleBlock.select(lambda sb: sb.sb_id == sb_id)[:]
+
+            if len(sb_queried) == 0:
+                schedule_block = schema.ScheduleBlock(
+                    sb_id=sb_id,
+                    sb_id_mk=summary["sb_details"]["id"],
+                    sb_id_code_mk=summary["sb_details"]["id_code"],
+                    proposal_id_mk=summary["sb_details"]["proposal_id"],
+                    proj_main=summary["sb_details"]["description"].split()[0],
+                    proj="MeerTRAP internal",
+                    utc_start=sb_utc_start,
+                    sub_array=summary["sb_details"]["sub_nr"],
+                    observer=summary["sb_details"]["owner"],
+                    description=summary["sb_details"]["description"],
+                )
 
-        if len(sb_queried) == 0:
-            schedule_block = schema.ScheduleBlock(
-                sb_id=sb_id,
-                sb_id_mk=summary["sb_details"]["id"],
-                sb_id_code_mk=summary["sb_details"]["id_code"],
-                proposal_id_mk=summary["sb_details"]["proposal_id"],
-                proj_main=summary["sb_details"]["description"].split()[0],
-                proj="MeerTRAP internal",
-                utc_start=sb_utc_start,
-                sub_array=summary["sb_details"]["sub_nr"],
-                observer=summary["sb_details"]["owner"],
-                description=summary["sb_details"]["description"],
-            )
+            elif len(sb_queried) == 1:
+                log.info("Schedule block is already in the database: {0}".format(sb_id))
+                schedule_block = sb_queried[0]
 
-        elif len(sb_queried) == 1:
-            log.info("Schedule block is already in the database: {0}".format(sb_id))
-            schedule_block = sb_queried[0]
+            else:
+                msg = "There are duplicate schedule blocks: {0}".format(sb_id)
+                raise RuntimeError(msg)
 
-        else:
-            msg = "There are duplicate schedule blocks: {0}".format(sb_id)
-            raise RuntimeError(msg)
+            flush()
+            sb_pk = schedule_block.id
+            new.append(("schedule_block", sb_id, sb_pk))
 
         # 2) observations
         # check if observation is already in the database, otherwise reference it
-        obs_queried = schema.Observation.select(lambda o: o.utc_start == obs_utc_start)[
-            :
-        ]
+        obs_pk = cache.get("observation", obs_utc_start)
 
-        if len(obs_queried) == 0:
-            beam_config = schema.BeamConfig(
-                cb_angle=summary["beams"]["coherent_beam_shape"]["angle"],
-                cb_x=summary["beams"]["coherent_beam_shape"]["x"],
-                cb_y=summary["beams"]["coherent_beam_shape"]["y"],
-            )
+        if obs_pk is None:
+            obs_queried = schema.Observation.select(
+                lambda o: o.utc_start == obs_utc_start
+            )[:]
+
+            if len(obs_queried) == 0:
+                beam_config = schema.BeamConfig(
+                    cb_angle=summary["beams"]["coherent_beam_shape"]["angle"],
+                    cb_x=summary["beams"]["coherent_beam_shape"]["x"],
+                    cb_y=summary["beams"]["coherent_beam_shape"]["y"],
+                )
+
+                tilings = summary["beams"]["ca_target_request"]["tilings"]
+
+                for tiling in tilings:
+                    schema.Tiling(
+                        epoch=tiling["epoch"],
+                        nbeam=tiling["nbeams"],
+                        overlap=tiling["overlap"],
+                        ref_freq=1e-6 * tiling["reference_frequency"],
+                        target=tiling["target"],
+                        tiling_mode="fill",
+                        beam_config=beam_config,
+                    )
+
+                # utc end time of the observation
+                if "utc_stop" in summary:
+                    obs_utc_end = datetime.strptime(
+                        summary["utc_stop"], fsconf["date_formats"]["utc"]
+                    )
 
-            tilings = summary["beams"]["ca_target_request"]["tilings"]
+                    log.info("Observation UTC end: {0}".format(obs_utc_end))
+                    finished = True
+                    tobs = (obs_utc_end - obs_utc_start).total_seconds()
+
+                else:
+                    log.warning("Summary file does not have utc_stop field.")
+                    obs_utc_end = None
+                    finished = False
+                    tobs = None
+
+                # receiver
+                cfreq = 1e-6 * summary["data"]["cfreq"]
+                bw = 1e-6 * summary["data"]["bw"]
+
+                if 1000 < cfreq < 2000:
+                    receiver = 1
+                elif cfreq <= 1000:
+                    receiver = 2
+                elif cfreq >= 2000:
+                    receiver = 3
+                # Is that even needed now?
+                else:
+                    raise NotImplementedError("Unknown receiver: {0}".format(cfreq))
 
-            for tiling in tilings:
-                schema.Tiling(
-                    epoch=tiling["epoch"],
-                    nbeam=tiling["nbeams"],
-                    overlap=tiling["overlap"],
-                    ref_freq=1e-6 * tiling["reference_frequency"],
-                    target=tiling["target"],
-                    tiling_mode="fill",
+                observation = schema.Observation(
+                    schedule_block=schema.ScheduleBlock[sb_pk],
+                    # XXX: how to populate these?
+                    # these are bogus values at the moment
+                    field_name="NGC 6101",
+                    boresight_ra="16:26:00.00",
+                    boresight_dec="-73:00:00.0",
+                    utc_start=obs_utc_start,
+                    utc_end=obs_utc_end,
+                    tobs=tobs,
+                    finished=finished,
+                    cb_nant=len(summary["beams"]["cb_antennas"]),
+                    ib_nant=len(summary["beams"]["ib_antennas"]),
+                    receiver=receiver,
+                    cfreq=cfreq,
+                    bw=bw,
+                    nchan=summary["data"]["nchan"],
+                    npol=1,
+                    tsamp=summary["data"]["tsamp"],
                     beam_config=beam_config,
                 )
 
-            # utc end time of the observation
-            if "utc_stop" in summary:
-                obs_utc_end = datetime.strptime(
-                    summary["utc_stop"], fsconf["date_formats"]["utc"]
+            elif len(obs_queried) == 1:
+                log.info(
+                    "Observation is already in the database: {0}".format(obs_utc_start)
                 )
-
-                log.info("Observation UTC end: {0}".format(obs_utc_end))
-                finished = True
-                tobs = (obs_utc_end - obs_utc_start).total_seconds()
+                observation = obs_queried[0]
 
             else:
-                log.warning("Summary file does not have utc_stop field.")
-                obs_utc_end = None
-                finished = False
-                tobs = None
-
-            # receiver
-            cfreq = 1e-6 * summary["data"]["cfreq"]
-            bw = 1e-6 * summary["data"]["bw"]
-
-            if 1000 < cfreq < 2000:
-                receiver = 1
-            elif cfreq <= 1000:
-                receiver = 2
-            elif cfreq >= 2000:
-                receiver = 3
-            # Is that even needed now?
-            else:
-                raise NotImplementedError("Unknown receiver: {0}".format(cfreq))
-
-            observation = schema.Observation(
-                schedule_block=schedule_block,
-                # XXX: how to populate these?
-                # these are bogus values at the moment
-                field_name="NGC 6101",
-                boresight_ra="16:26:00.00",
-                boresight_dec="-73:00:00.0",
-                utc_start=obs_utc_start,
-                utc_end=obs_utc_end,
-                tobs=tobs,
-                finished=finished,
-                cb_nant=len(summary["beams"]["cb_antennas"]),
-                ib_nant=len(summary["beams"]["ib_antennas"]),
-                receiver=receiver,
-                cfreq=cfreq,
-                bw=bw,
-                nchan=summary["data"]["nchan"],
-                npol=1,
-                tsamp=summary["data"]["tsamp"],
-                beam_config=beam_config,
-            )
+                msg = "There are duplicate observations: {0}".format(obs_utc_start)
+                raise RuntimeError(msg)
+
+            flush()
+            obs_pk = observation.id
+            new.append(("observation", obs_utc_start, obs_pk))
+
+    return obs_pk, new
+
+
+def finish_observation(summary, obs_utc_start):
+    """
+    Set the end time of an observation that was inserted while the pipeline
+    run was still going on.
+
+    Parameters
+    ----------
+    summary: dict
+        Information about the finished pipeline run.
+    obs_utc_start: datetime.datetime
+        The start UTC of the observation.
+    """
+
+    log = logging.getLogger("meertrapdb.populate_db")
+
+    config = get_config()
+    fsconf = config["filesystem"]
+
+    obs_utc_end = datetime.strptime(summary["utc_stop"], fsconf["date_formats"]["utc"])
+
+    with db_session:
+        obs_queried = schema.Observation.select(
+            lambda o: o.utc_start == obs_utc_start and not o.finished
+        )[:]
+
+        for observation in obs_queried:
+            log.info("Observation UTC end: {0}".format(obs_utc_end))
+            observation.utc_end = obs_utc_end
+            observation.tobs = (obs_utc_end - obs_utc_start).total_seconds()
+            observation.finished = True
 
-        elif len(obs_queried) == 1:
-            log.info(
-                "Observation is already in the database: {0}".format(obs_utc_start)
-            )
-            observation = obs_queried[0]
 
+def insert_candidates(data, sb_id, summary, obs_utc_start, node_name, cache=None):
+    """
+    Insert candidates into database.
+
+    The candidates that are already in the database are skipped. If another
+    ingest inserts some of them in the meantime, the unique ingest keys reject
+    the transaction and the insert is retried, skipping those too.
+
+    Parameters
+    ----------
+    data: numpy.rec
+        The parsed candidate data.
+    sb_id: int
+        The ID of the schedule block in the MeerTRAP database.
+    summary: dict
+        Information about the pipeline run.
+    obs_utc_start: datetime.datetime
+        The start UTC of the observation.
+    node_name: str
+        The name of the node, e.g. `tpn-0-37`.
+    cache: ~EntityCache (default: None)
+        The primary keys of the parent rows known from previous calls. The
+        parent rows are looked up in the database if None.
+
+    Returns
+    -------
+    plots: list of dict
+        Plot files to be copied.
+    ninsert: int
+        The number of candidates inserted, without the duplicates.
+
+    Raises
+    ------
+    RuntimeError
+        If the insert fails repeatedly.
+    """
+
+    log = logging.getLogger("meertrapdb.populate_db")
+
+    if cache is None:
+        cache = EntityCache()
+
+    # the errors raised by pony and by the database driver directly
+    errors = (IntegrityError, db.provider.dbapi_module.IntegrityError)
+
+    nattempt = 3
+
+    for attempt in range(nattempt):
+        try:
+            plots, ninsert = _insert_candidates(
+                data, sb_id, summary, obs_utc_start, node_name, cache
+            )
+        except errors as err:
+            log.warning(
+                "Candidates were inserted concurrently, retrying: {0}".format(err)
+            )
         else:
-            msg = "There are duplicate observations: {0}".format(obs_utc_start)
-            raise RuntimeError(msg)
+            return plots, ninsert
+
+    raise RuntimeError("Could not insert candidates in {0} attempts.".format(nattempt))
+
+
+def _insert_candidates(data, sb_id, summary, obs_utc_start, node_name, cache):
+    """
+    Insert candidates into database in a single transaction.
+
+    Parameters
+    ----------
+    data: numpy.rec
+        The parsed candidate data.
+    sb_id: int
+        The ID of the schedule block in the MeerTRAP database.
+    summary: dict
+        Information about the pipeline run.
+    obs_utc_start: datetime.datetime
+        The start UTC of the observation.
+    node_name: str
+        The name of the node, e.g. `tpn-0-37`.
+    cache: ~EntityCache
+        The primary keys of the parent rows known from previous calls.
+
+    Returns
+    -------
+    plots: list of dict
+        Plot files to be copied.
+    ninsert: int
+        The number of candidates inserted, without the duplicates.
+    """
+
+    log = logging.getLogger("meertrapdb.populate_db")
+
+    config = get_config()
+    fsconf = config["filesystem"]
+
+    with db_session:
+        # 1) schedule blocks and 2) observations
+        # the parent rows that are not yet in the cache
+        obs_pk, new = insert_observation(sb_id, summary, obs_utc_start, cache)
 
         # 3) nodes
         # check if node is already in the database, otherwise reference it
         node_nr = int(node_name[6:])
         log.info("Node number: {0}".format(node_nr))
 
-        node_queried = select(
-            n
-            for n in schema.Node
-            for obs in schema.Observation
-            if (obs.utc_start == obs_utc_start and n.number == node_nr)
-        )[:]
+        node_pk = cache.get("node", (obs_utc_start, node_nr))
+
+        if node_pk is None:
+            node_queried = select(
+                n
+                for n in schema.Node
+                for obs in schema.Observation
+                if (obs.utc_start == obs_utc_start and n.number == node_nr)
+            )[:]
+
+            if len(node_queried) == 0:
+                node = schema.Node(number=node_nr, hostname="tpn-0-{0}".format(node_nr))
 
-        if len(node_queried) == 0:
-            node = schema.Node(number=node_nr, hostname="tpn-0-{0}".format(node_nr))
+            elif len(node_queried) == 1:
+                log.info(
+                    "Node is already in the database: {0}, {1}".format(
+                        obs_utc_start, node_nr
+                    )
+                )
+                node = node_queried[0]
 
-        elif len(node_queried) == 1:
-            log.info(
-                "Node is already in the database: {0}, {1}".format(
+            else:
+                msg = "There are duplicate nodes: {0}, {1}".format(
                     obs_utc_start, node_nr
                 )
-            )
-            node = node_queried[0]
+                raise RuntimeError(msg)
 
-        else:
-            msg = "There are duplicate nodes: {0}, {1}".format(obs_utc_start, node_nr)
-            raise RuntimeError(msg)
+            flush()
+            node_pk = node.id
+            new.append(("node", (obs_utc_start, node_nr), node_pk))
 
         # 4) pipeline config
         # check if pipeline config is already in the database, otherwise reference it
-        pc_queried = select(
-            pc
-            for pc in schema.PipelineConfig
-            for c in pc.sps_candidate
-            for obs in c.observation
-            for n in c.node
-            if (obs.utc_start == obs_utc_start and n.number == node_nr)
-        )[:]
+        pc_pk = cache.get("pipeline_config", (obs_utc_start, node_nr))
+
+        if pc_pk is None:
+            pc_queried = select(
+                pc
+                for pc in schema.PipelineConfig
+                for c in pc.sps_candidate
+                for obs in c.observation
+                for n in c.node
+                if (obs.utc_start == obs_utc_start and n.number == node_nr)
+            )[:]
 
-        if len(pc_queried) == 0:
-            ddplan_str = None
+            if len(pc_queried) == 0:
+                ddplan_str = None
 
-            if isinstance(summary["pipeline"]["cheetah"]["ddplan_str"], str):
-                ddplan_str = summary["pipeline"]["cheetah"]["ddplan_str"]
-            elif isinstance(summary["pipeline"]["cheetah"]["ddplan_str"], dict):
-                bw_str = str(int(summary["data"]["bw"] * 1e-06))
-                cstr = "c" + bw_str
+                if isinstance(summary["pipeline"]["cheetah"]["ddplan_str"], str):
+                    ddplan_str = summary["pipeline"]["cheetah"]["ddplan_str"]
+                elif isinstance(summary["pipeline"]["cheetah"]["ddplan_str"], dict):
+                    bw_str = str(int(summary["data"]["bw"] * 1e-06))
+                    cstr = "c" + bw_str
 
-                try:
-                    ddplan_str = summary["pipeline"]["cheetah"]["ddplan_str"][cstr]
-                except KeyError:
-                    raise RuntimeError("Unrecognised ddplan option {0}".format(cstr))
+                    try:
+                        ddplan_str = summary["pipeline"]["cheetah"]["ddplan_str"][cstr]
+                    except KeyError:
+                        raise RuntimeError(
+                            "Unrecognised ddplan option {0}".format(cstr)
+                        )
 
-            else:
-                raise RuntimeError("Unrecognised ddplan_str type!")
-
-            pipeline_config = schema.PipelineConfig(
-                name=summary["pipeline"]["mode"],
-                version=summary["version_info"]["control"],
-                dd_plan=ddplan_str,
-                dm_threshold=summary["pipeline"]["cheetah"]["spsift"]["dm_thresh"],
-                snr_threshold=summary["pipeline"]["cheetah"]["spsift"]["sigma_thresh"],
-                width_threshold=summary["pipeline"]["cheetah"]["spsift"][
-                    "pulse_width_threshold"
-                ],
-                zerodm_zapping=True,
-            )
+                else:
+                    raise RuntimeError("Unrecognised ddplan_str type!")
+
+                pipeline_config = schema.PipelineConfig(
+                    name=summary["pipeline"]["mode"],
+                    version=summary["version_info"]["control"],
+                    dd_plan=ddplan_str,
+                    dm_threshold=summary["pipeline"]["cheetah"]["spsift"]["dm_thresh"],
+                    snr_threshold=summary["pipeline"]["cheetah"]["spsift"][
+                        "sigma_thresh"
+                    ],
+                    width_threshold=summary["pipeline"]["cheetah"]["spsift"][
+                        "pulse_width_threshold"
+                    ],
+                    zerodm_zapping=True,
+                )
 
-        elif len(pc_queried) == 1:
-            msg = "Pipeline config is already in the database:" + " {0}, {1}".format(
-                obs_utc_start, node_nr
-            )
-            log.info(msg)
-            pipeline_config = pc_queried[0]
+            elif len(pc_queried) == 1:
+                msg = (
+                    "Pipeline config is already in the database:"
+                    + " {0}, {1}".format(obs_utc_start, node_nr)
+                )
+                log.info(msg)
+                pipeline_config = pc_queried[0]
 
-        else:
-            msg = "There are duplicate pipeline configs:" + " {0}, {1}".format(
-                obs_utc_start, node_nr
-            )
-            log.error(msg)
-            pipeline_config = pc_queried[0]
+            else:
+                msg = "There are duplicate pipeline configs:" + " {0}, {1}".format(
+                    obs_utc_start, node_nr
+                )
+                log.error(msg)
+                pipeline_config = pc_queried[0]
+
+            flush()
+            pc_pk = pipeline_config.id
+            new.append(("pipeline_config", (obs_utc_start, node_nr), pc_pk))
 
         # 5) beams
         # check if beam is already in the database, otherwise reference it
@@ -512,75 +726,92 @@ def insert_candidates(data, sb_id, summary, obs_utc_start, node_name):
                 beam_source = item["source"]
                 break
 
-        beam_queried = select(
-            beam
-            for beam in schema.Beam
-            for c in beam.sps_candidate
+        beam_key = (obs_utc_start, node_nr, beam_nr, beam_coherent)
+        beam_pk = cache.get("beam", beam_key)
+
+        if beam_pk is None:
+            beam_queried = select(
+                beam
+                for beam in schema.Beam
+                for c in beam.sps_candidate
+                for obs in c.observation
+                for n in c.node
+                if (
+                    obs.utc_start == obs_utc_start
+                    and beam.number == beam_nr
+                    and n.number == node_nr
+                    and beam.coherent == beam_coherent
+                )
+            )[:]
+
+            if len(beam_queried) == 0:
+                beam = schema.Beam(
+                    number=beam_nr,
+                    coherent=beam_coherent,
+                    source=beam_source,
+                    ra=ra,
+                    dec=dec,
+                )
+
+            elif len(beam_queried) == 1:
+                msg = "Beam is already in the database:" + " {0}, {1}, {2}".format(
+                    obs_utc_start, node_nr, beam_nr
+                )
+                log.info(msg)
+                beam = beam_queried[0]
+
+            else:
+                msg = "There are duplicate beams:" + " {0}, {1}, {2}".format(
+                    obs_utc_start, node_nr, beam_nr
+                )
+                log.error(msg)
+                beam = beam_queried[0]
+
+            flush()
+            beam_pk = beam.id
+            new.append(("beam", beam_key, beam_pk))
+
+        # 6) candidates
+        # plot files to be copied
+        plots = []
+
+        # load the candidates of the beam that are already in the database
+        cand_queried = select(
+            c.mjd
+            for c in schema.SpsCandidate
+            for beam in c.beam
             for obs in c.observation
-            for n in c.node
             if (
-                obs.utc_start == obs_utc_start
-                and beam.number == beam_nr
-                and n.number == node_nr
+                beam.number == beam_nr
                 and beam.coherent == beam_coherent
+                and obs.utc_start == obs_utc_start
             )
         )[:]
 
-        if len(beam_queried) == 0:
-            beam = schema.Beam(
-                number=beam_nr,
-                coherent=beam_coherent,
-                source=beam_source,
-                ra=ra,
-                dec=dec,
-            )
+        existing = set(get_mjd_keys(cand_queried))
 
-        elif len(beam_queried) == 1:
-            msg = "Beam is already in the database:" + " {0}, {1}, {2}".format(
-                obs_utc_start, node_nr, beam_nr
-            )
-            log.info(msg)
-            beam = beam_queried[0]
+        # skip the duplicates
+        keys = get_mjd_keys(data["mjd"])
+        duplicate = get_duplicates(keys, existing)
 
-        else:
-            msg = "There are duplicate beams:" + " {0}, {1}, {2}".format(
-                obs_utc_start, node_nr, beam_nr
+        for key in keys[duplicate]:
+            msg = "Candidate is already in the database:" + " {0}, {1}, {2}".format(
+                obs_utc_start, beam_nr, Decimal(int(key)).scaleb(-10)
             )
             log.error(msg)
-            beam = beam_queried[0]
 
-        # 6) candidates
-        # plot files to be copied
-        plots = []
+        data = data[~duplicate]
+        keys = keys[~duplicate]
 
-        for item in data:
-            cand_mjd = Decimal("{0:.10f}".format(item["mjd"]))
-            cand_utc = Time(item["mjd"], format="mjd").iso
+        # convert the times of all candidates at once
+        cand_utcs, cand_mjds = get_candidate_times(data["mjd"])
 
-            # check if candidate is already in the database
-            cand_queried = select(
-                (c.mjd, beam.number, obs.utc_start)
-                for c in schema.SpsCandidate
-                for beam in c.beam
-                for obs in c.observation
-                if (
-                    beam.number == beam_nr
-                    and beam.coherent == beam_coherent
-                    and obs.utc_start == obs_utc_start
-                    and abs(c.mjd - cand_mjd) <= Decimal("0.0000000001")
-                )
-            )
+        obs_utc_start_str = obs_utc_start.strftime(fsconf["date_formats"]["utc"])
 
-            if cand_queried.count() > 0:
-                msg = "Candidate is already in the database:" + " {0}, {1}, {2}".format(
-                    obs_utc_start, beam_nr, cand_mjd
-                )
-                log.error(msg)
-                continue
+        ds_webs = []
 
+        for item in data:
             # assemble candidate plots
-            obs_utc_start_str = obs_utc_start.strftime(fsconf["date_formats"]["utc"])
-
             ds_staging = os.path.join(
                 fsconf["ingest"]["staging_dir"],
                 obs_utc_start_str,
@@ -614,69 +845,50 @@ def insert_candidates(data, sb_id, summary, obs_utc_start, node_name):
 
                 plots.append(file_info)
 
-            schema.SpsCandidate(
-                utc=cand_utc,
-                mjd=cand_mjd,
-                observation=observation,
-                beam=beam,
-                snr=item["snr"],
-                dm=item["dm"],
-                width=item["width"],
-                label=item["label"],
-                probability=item["probability"],
-                node=node,
-                dynamic_spectrum=ds_web,
-                profile="",
-                heimdall_plot="",
-                pipeline_config=pipeline_config,
-            )
-
-            # we need to explicitly commit the candidate to the database
-            # otherwise the duplicate detection won't work
-            db.commit()
-
-    return plots
-
-
-def copy_plots(plots):
-    """
-    Copy plots to webserver.
-
-    Parameters
-    ----------
-    plots: list of dict
-        Plot files to be copied.
-
-    Raises
-    ------
-    RuntimeError
-        On errors.
-    """
-
-    log = logging.getLogger("meertrapdb.populate_db")
-
-    for item in plots:
-        filename = item["staging"]
-        log.info("Copying plot: {0}".format(filename))
-
-        if not os.path.isfile(filename):
-            raise RuntimeError("Staging file does not exist: {0}".format(filename))
+            ds_webs.append(ds_web)
+
+        # insert the new candidates and their links in bulk
+        nnew = len(data)
+
+        values = {
+            "utc": [str(x) for x in cand_utcs],
+            "mjd": cand_mjds,
+            "snr": data["snr"].tolist(),
+            "dm": data["dm"].tolist(),
+            "width": data["width"].tolist(),
+            "label": data["label"].tolist(),
+            "probability": data["probability"].tolist(),
+            "dynamic_spectrum": ds_webs,
+            "profile": [""] * nnew,
+            "heimdall_plot": [""] * nnew,
+            "ingest_key": [
+                "{0}_{1}_{2:d}_{3}".format(obs_pk, beam_nr, beam_coherent, int(key))
+                for key in keys
+            ],
+        }
 
-        # copy to webserver
-        web_dir = os.path.dirname(item["webserver"])
+        batch_size = config["ingest"]["batch_size"]
 
-        if not os.path.isdir(web_dir):
-            os.makedirs(web_dir)
+        # look the ids up by the unique ingest keys, which does not depend on
+        # the auto-increment settings of the database
+        cand_ids = insert_entities(
+            schema.SpsCandidate, values, batch_size=batch_size, key="ingest_key"
+        )
 
-        shutil.copy(filename, item["webserver"])
+        for attr, parent_pk in [
+            (schema.SpsCandidate.observation, obs_pk),
+            (schema.SpsCandidate.beam, beam_pk),
+            (schema.SpsCandidate.node, node_pk),
+            (schema.SpsCandidate.pipeline_config, pc_pk),
+        ]:
+            insert_links(attr, cand_ids, parent_pk, batch_size=batch_size)
 
-        # move to processed
-        processed_dir = os.path.dirname(item["processed"])
+        log.info("Inserted {0} candidates.".format(nnew))
 
-        if not os.path.isdir(processed_dir):
-            os.makedirs(processed_dir)
+    # remember the new parent rows only once they are committed
+    cache.update(new)
 
-        shutil.move(filename, item["processed"])
+    return plots, nnew
 
 
 def load_summary_file(filename):
@@ -703,168 +915,1011 @@ def load_summary_file(filename):
     return data
 
 
-def run_production(schedule_block, test_run):
+def get_summary_file(filename):
     """
-    Run the processing for 'production' mode, i.e. insert real candidates into the database.
+    Get the name of the summary file of the pipeline run that an SPCCL file
+    belongs to.
 
     Parameters
     ----------
-    schedule_block: int
-        The schedule block ID to use to reference the candidates in the database.
-    test_run: bool
-        Determines whether to run in test mode, where no files are moved, nor copied.
+    filename: str
+        The name of the SPCCL file.
 
     Returns
     -------
-    sb_utc_start: datetime.datetime
-        The UTC start time of the schedule block.
+    summary_file: str
+        The name of the summary file.
     """
 
-    log = logging.getLogger("meertrapdb.populate_db")
-
     config = get_config()
     fsconf = config["filesystem"]
 
-    start = datetime.now()
+    node_name, utc_start_str, _ = get_spccl_file_info(
+        filename, fsconf["date_formats"]["utc"]
+    )
 
-    # check if schedule block is already in the database
-    with db_session:
-        sb_queried = schema.ScheduleBlock.select(lambda sb: sb.sb_id == schedule_block)[
-            :
-        ]
+    summary_file = os.path.join(
+        os.path.dirname(filename),
+        "{0}_{1}_{2}".format(
+            utc_start_str, node_name, fsconf["summary_file"]["postfix"]
+        ),
+    )
 
-        if len(sb_queried) == 1:
-            msg = (
-                "The schedule block is already in the database: {0}\n".format(
-                    schedule_block
-                )
-                + "Are you sure you want to continue? (Y/N) "
-            )
-            response = input(msg)
+    return summary_file
+
+
+def get_sb_utc_start(summary):
+    """
+    Get the UTC start time of the schedule block of a pipeline run.
+
+    Parameters
+    ----------
+    summary: dict
+        Information about the pipeline run.
+
+    Returns
+    -------
+    sb_utc_start: datetime.datetime
+        The UTC start time of the schedule block.
+    """
+
+    config = get_config()
+    fsconf = config["filesystem"]
+
+    sb_local_time_start = datetime.strptime(
+        summary["sb_details"]["actual_start_time"][:-2], fsconf["date_formats"]["local"]
+    )
+    sb_utc_start = sb_local_time_start.replace(tzinfo=timezone("UTC"))
+
+    return sb_utc_start
+
+
+def load_run_summary(filename):
+    """
+    Load the summary file of the pipeline run that an SPCCL file belongs to.
+
+    Parameters
+    ----------
+    filename: str
+        The name of the SPCCL file.
+
+    Returns
+    -------
+    summary_file: str
+        The name of the summary file.
+    summary: dict
+        The summary data or None if the file does not exist or cannot be parsed.
+    """
+
+    log = logging.getLogger("meertrapdb.populate_db")
+
+    config = get_config()
+    fsconf = config["filesystem"]
+
+    _, utc_start_str, _ = get_spccl_file_info(filename, fsconf["date_formats"]["utc"])
+
+    summary_file = get_summary_file(filename)
+
+    log.info("Summary filename: {0}".format(summary_file))
+
+    # sanity check summary file
+    if not os.path.isfile(summary_file):
+        log.error("Summary file does not exist: {0}".format(summary_file))
+        return summary_file, None
+
+    try:
+        summary = load_summary_file(summary_file)
+    except json.decoder.JSONDecodeError as err:
+        log.error("Could not parse summary file: {0}, {1}".format(summary_file, err))
+        return summary_file, None
+
+    # sanity check
+    assert utc_start_str == summary["utc_start"]
+
+    return summary_file, summary
+
+
+def get_journal_file():
+    """
+    Get the name of the ingest journal file.
+
+    Returns
+    -------
+    filename: str
+        The name of the journal file.
+    """
+
+    config = get_config()
+
+    filename = config["ingest"]["journal"]
+
+    # next to the staging directory by default
+    if filename is None:
+        staging_dir = os.path.normpath(config["filesystem"]["ingest"]["staging_dir"])
+        filename = os.path.join(os.path.dirname(staging_dir), "ingest_journal.sqlite")
+
+    return filename
+
+
+def recover_ingest(schedule_block, journal_file):
+    """
+    Publish the plots of files whose ingest was interrupted.
+
+    Parameters
+    ----------
+    schedule_block: int
+        The schedule block ID.
+    journal_file: str
+        The name of the ingest journal file.
+
+    Returns
+    -------
+    nfiles: int
+        The number of files recovered.
+    """
+
+    log = logging.getLogger("meertrapdb.populate_db")
+
+    config = get_config()
+
+    with IngestJournal(journal_file) as journal:
+        entries = journal.get_incomplete(schedule_block)
+
+        for entry in entries:
+            log.info("Recovering SPCCL file: {0}".format(entry["filename"]))
+
+            # the plots that were not moved yet are published
+            plots = [item for item in entry["plots"] if os.path.isfile(item["staging"])]
+
+            log.info("Copying {0} plots.".format(len(plots)))
+            copy_plots(plots, link=config["ingest"]["link_plots"])
+
+            journal.update(entry["filename"], schedule_block, published=True)
+
+    return len(entries)
+
+
+def ingest_spccl_files(
+    filenames, schedule_block, test_run, cache, journal_file, follower=None
+):
+    """
+    Ingest SPCCL files into the database one after the other.
+
+    This runs in the worker processes in parallel production mode. The progress
+    of each file is recorded in the ingest journal, and files that are
+    complete are skipped.
+
+    If a follower is given, only the candidates appended to the files since the
+    last call are ingested. A file is read to its end, published and moved only
+    once the summary file says that the pipeline run is finished.
+
+    Parameters
+    ----------
+    filenames: list of str
+        The names of the SPCCL files.
+    schedule_block: int
+        The schedule block ID to use to reference the candidates in the database.
+    test_run: bool
+        Determines whether to run in test mode, where no files are moved, nor copied.
+    cache: ~EntityCache
+        The primary keys of the parent rows known so far.
+    journal_file: str
+        The name of the ingest journal file.
+    follower: ~SpcclFollower (default: None)
+        The follower of the files that are still being written. The files are
+        read in full if None.
+
+    Returns
+    -------
+    stats: dict
+        The directory of the first file, the numbers of finished files and
+        candidates,
+        the plots, the last summary loaded, the cache hits and misses, and the
+        runtime in s.
+    """
+
+    log = logging.getLogger("meertrapdb.populate_db")
+
+    config = get_config()
+    fsconf = config["filesystem"]
+
+    start = time.time()
+
+    stats = {
+        "directory": os.path.dirname(filenames[0]) if len(filenames) > 0 else "",
+        "nfiles": 0,
+        "ncands": 0,
+        "plots": [],
+        "summary": None,
+    }
+
+    journal = IngestJournal(journal_file)
+
+    # the files whose plots are being copied
+    pending = []
+
+    def mark_published(wait=False):
+        for item in pending[:]:
+            filename, futures = item
+
+            if not (wait or all(future.done() for future in futures)):
+                continue
+
+            if all(future.exception() is None for future in futures):
+                journal.update(filename, schedule_block, published=True)
+
+            pending.remove(item)
+
+    # copy the plots in the background
+    # waits for all plots to be copied at the end
+    copier = PlotCopier(
+        nthreads=config["ingest"]["copy_threads"],
+        link=config["ingest"]["link_plots"],
+    )
+
+    try:
+        with copier:
+            for filename in filenames:
+                mark_published()
+
+                entry = journal.get(filename)
+
+                if is_ingest_complete(entry):
+                    log.info("SPCCL file is already ingested: {0}".format(filename))
+
+                    # keep the run information for the notification
+                    _, summary = load_run_summary(filename)
+
+                    if summary is not None:
+                        stats["summary"] = summary
+
+                    if follower is not None:
+                        follower.forget(filename)
+
+                    continue
+
+                log.info("Processing SPCCL file: {0}".format(filename))
+
+                # 2) work out basic parameters
+                node_name, utc_start_str, obs_utc_start = get_spccl_file_info(
+                    filename, fsconf["date_formats"]["utc"]
+                )
+
+                log.info("Observation UTC start: {0}".format(obs_utc_start))
+                log.info("Node: {0}".format(node_name))
+
+                # 3) load run information from summary file
+                summary_file, summary = load_run_summary(filename)
+
+                if summary is None:
+                    log.warning("Skipping SPCCL file: {0}".format(filename))
+                    continue
+
+                stats["summary"] = summary
+
+                if entry is not None and entry["inserted"]:
+                    # the plots are published by the recovery
+                    log.info("Candidates are already inserted: {0}".format(filename))
+                    plots = []
+
+                else:
+                    # 4) parse candidate data
+                    if follower is None:
+                        spccl_data = parse_spccl_file(
+                            filename, config["candidates"]["version"]
+                        )
+                        final = True
+                    else:
+                        # the pipeline writes the stop time once it is done
+                        final = "utc_stop" in summary
+                        spccl_data = follower.read(filename, final=final)
+
+                    if final:
+                        journal.update(filename, schedule_block, parsed=True)
+
+                    # the candidates inserted from the file before
+                    if entry is not None and entry["ncands"] is not None:
+                        ncands = entry["ncands"]
+                    else:
+                        ncands = 0
+
+                    # check if we have candidates
+                    if len(spccl_data) > 0:
+                        log.info("Parsed {0} candidates.".format(len(spccl_data)))
+
+                        # 5) insert data into database
+                        plots, ninsert = insert_candidates(
+                            spccl_data,
+                            schedule_block,
+                            summary,
+                            obs_utc_start,
+                            node_name,
+                            cache,
+                        )
+
+                    elif final and ncands > 0:
+                        plots, ninsert = [], 0
+
+                    else:
+                        if final:
+                            log.warning("No candidates found.")
+
+                            if follower is not None:
+                                follower.forget(filename)
+
+                        continue
+
+                    ncands += ninsert
+
+                    journal.update(
+                        filename,
+                        schedule_block,
+                        inserted=final,
+                        ncands=ncands,
+                        plots=plots,
+                        published=len(plots) == 0,
+                    )
+
+                    if final:
+                        stats["nfiles"] += 1
+
+                    stats["ncands"] += ninsert
+                    stats["plots"].extend(plots)
+
+                    if not final:
+                        # publish the plots, but leave the file in place
+                        if not test_run and len(plots) > 0:
+                            log.info("Copying {0} plots.".format(len(plots)))
+                            pending.append((filename, copier.submit(plots)))
+
+                        continue
+
+                    if follower is not None:
+                        finish_observation(summary, obs_utc_start)
+                        follower.forget(filename)
+
+                if not test_run:
+                    # 6) copy plots to webserver area and move them to processed
+                    # in the background, once their candidates are in the database
+                    if len(plots) > 0:
+                        log.info("Copying {0} plots.".format(len(plots)))
+                        pending.append((filename, copier.submit(plots)))
+                    elif entry is None or not entry["inserted"]:
+                        log.warning("No plots to copy found.")
+
+                    # 7) copy summary file to processed directory
+                    # we copy the file, because other spccl files might need it
+                    # summary files are deleted manually at the end of the ingest
+                    outfile = os.path.join(
+                        fsconf["ingest"]["processed_dir"],
+                        utc_start_str,
+                        node_name,
+                        os.path.basename(summary_file),
+                    )
+
+                    make_dir(os.path.dirname(outfile))
+                    shutil.copy(summary_file, outfile)
+
+                    # 8) move spccl file to processed directory
+                    outfile = os.path.join(
+                        fsconf["ingest"]["processed_dir"],
+                        utc_start_str,
+                        node_name,
+                        os.path.basename(filename),
+                    )
+
+                    shutil.move(filename, outfile)
+
+                    journal.update(filename, schedule_block, moved=True)
+
+    finally:
+        mark_published(wait=True)
+        journal.close()
+
+    stats["cache_hits"] = cache.hits
+    stats["cache_misses"] = cache.misses
+    stats["runtime"] = time.time() - start
+
+    return stats
+
+
+def ingest_files(filenames, schedule_block, test_run, cache, journal_file):
+    """
+    Ingest SPCCL files into the database, in parallel if configured.
+
+    Parameters
+    ----------
+    filenames: list of str
+        The names of the SPCCL files in sorted order.
+    schedule_block: int
+        The schedule block ID to use to reference the candidates in the database.
+    test_run: bool
+        Determines whether to run in test mode, where no files are moved, nor copied.
+    cache: ~EntityCache
+        The primary keys of the parent rows known so far.
+    journal_file: str
+        The name of the ingest journal file.
+
+    Returns
+    -------
+    stats: list of dict
+        The ingest statistics of each worker.
+    """
+
+    log = logging.getLogger("meertrapdb.populate_db")
+
+    config = get_config()
+    fsconf = config["filesystem"]
+
+    nproc = config["ingest"]["nproc"]
+
+    if nproc > 1:
+        # the files of each node directory are ingested in order by one worker
+        groups = {}
+
+        for filename in filenames:
+            groups.setdefault(os.path.dirname(filename), []).append(filename)
+
+        groups = list(groups.values())
+        log.info("Ingesting {0} node directories.".format(len(groups)))
+
+        # insert the shared parent rows up front
+        for group in groups:
+            for filename in group:
+                _, _, obs_utc_start = get_spccl_file_info(
+                    filename, fsconf["date_formats"]["utc"]
+                )
+                _, summary = load_run_summary(filename)
+
+                if summary is not None:
+                    _, new = insert_observation(
+                        schedule_block, summary, obs_utc_start, cache
+                    )
+                    cache.update(new)
+                    break
+
+        # count the lookups in the workers only
+        cache.hits = 0
+        cache.misses = 0
+
+        # the workers must open their own database connections
+        # they inherit the bound database and the configuration when forked,
+        # whereas spawned workers would import an unbound database
+        db.disconnect()
+
+        args = (
+            groups,
+            repeat(schedule_block),
+            repeat(test_run),
+            repeat(cache),
+            repeat(journal_file),
+        )
+
+        with ProcessPoolExecutor(
+            max_workers=nproc, mp_context=multiprocessing.get_context("fork")
+        ) as executor:
+            stats = list(executor.map(ingest_spccl_files, *args))
+
+    else:
+        stats = [
+            ingest_spccl_files(filenames, schedule_block, test_run, cache, journal_file)
+        ]
+
+    # gather the results
+    plots = []
+
+    for item in stats:
+        log.info(
+            "{0}: {1} files, {2} candidates, {3} plots, {4:.1f} s".format(
+                item["directory"],
+                item["nfiles"],
+                item["ncands"],
+                len(item["plots"]),
+                item["runtime"],
+            )
+        )
+        plots.extend(item["plots"])
+
+    log.info("Processed {0} plots.".format(len(plots)))
+    log.info(
+        "Entity cache: {0} hits, {1} misses.".format(
+            sum(item["cache_hits"] for item in stats),
+            sum(item["cache_misses"] for item in stats),
+        )
+    )
+    return stats
+
+
+def run_production(schedule_block, test_run):
+    """
+    Run the processing for 'production' mode, i.e. insert real candidates into the database.
+
+    Parameters
+    ----------
+    schedule_block: int
+        The schedule block ID to use to reference the candidates in the database.
+    test_run: bool
+        Determines whether to run in test mode, where no files are moved, nor copied.
+
+    Returns
+    -------
+    sb_utc_start: datetime.datetime
+        The UTC start time of the schedule block.
+
+    Raises
+    ------
+    RuntimeError
+        If there are duplicate schedule blocks, or if no summary file was found,
+        e.g. because there are no SPCCL files left to ingest.
+    """
+
+    log = logging.getLogger("meertrapdb.populate_db")
+
+    config = get_config()
+    fsconf = config["filesystem"]
+
+    start = datetime.now()
+
+    # check if schedule block is already in the database
+    with db_session:
+        sb_queried = schema.ScheduleBlock.select(lambda sb: sb.sb_id == schedule_block)[
+            :
+        ]
+
+        if len(sb_queried) == 1:
+            msg = (
+                "The schedule block is already in the database: {0}\n".format(
+                    schedule_block
+                )
+                + "Are you sure you want to continue? (Y/N) "
+            )
+            response = input(msg)
             if response != "Y":
                 sys.exit(1)
 
-        elif len(sb_queried) > 1:
-            msg = "There are duplicate schedule blocks: {0}".format(schedule_block)
-            raise RuntimeError(msg)
+        elif len(sb_queried) > 1:
+            msg = "There are duplicate schedule blocks: {0}".format(schedule_block)
+            raise RuntimeError(msg)
+
+    # 1) gather all spccl files
+    staging_dir = fsconf["ingest"]["staging_dir"]
+    log.info("Staging directory: {0}".format(staging_dir))
+
+    glob_pattern = os.path.join(staging_dir, fsconf["ingest"]["glob_pattern"])
+    log.info("SPCCL glob pattern: {0}".format(glob_pattern))
+
+    spcll_files = glob.glob(glob_pattern)
+    spcll_files = sorted(spcll_files)
+    log.info("Found {0} SPCCL files.".format(len(spcll_files)))
+
+    # the parent rows of the candidates are only looked up once per run
+    cache = EntityCache()
+
+    # resume an interrupted ingest
+    journal_file = get_journal_file()
+    log.info("Ingest journal: {0}".format(journal_file))
+
+    if not test_run:
+        nrecovered = recover_ingest(schedule_block, journal_file)
+        log.info("Recovered {0} interrupted files.".format(nrecovered))
+
+    stats = ingest_files(spcll_files, schedule_block, test_run, cache, journal_file)
+
+    summary = None
+
+    for item in stats:
+        if item["summary"] is not None:
+            summary = item["summary"]
+
+    log.info("Done. Time taken: {0}".format(datetime.now() - start))
+
+    if summary is None:
+        msg = "No summary file found for schedule block: {0}".format(schedule_block)
+        raise RuntimeError(msg)
+
+    # return start time of schedule block for notification
+    sb_utc_start = get_sb_utc_start(summary)
+
+    return sb_utc_start
+
+
+def write_watch_status(filename, status):
+    """
+    Write the state of the watch mode to a JSON file.
+
+    The file is replaced atomically, so that monitoring tools never see it half
+    written.
+
+    Parameters
+    ----------
+    filename: str
+        The name of the status file.
+    status: dict
+        The state of the watch mode.
+    """
+
+    temp_file = "{0}.tmp".format(filename)
+
+    with open(temp_file, "w") as fd:
+        json.dump(status, fd, indent=2)
+
+    os.replace(temp_file, filename)
+
+
+def is_run_finished(filename):
+    """
+    Check whether the pipeline run that an SPCCL file belongs to is finished.
+
+    The pipeline writes the stop time to the summary file at the end of the
+    run, after which it no longer appends to the SPCCL files.
+
+    Parameters
+    ----------
+    filename: str
+        The name of the SPCCL file.
+
+    Returns
+    -------
+    finished: bool
+        Whether the run is finished.
+    """
+
+    try:
+        summary = load_summary_file(get_summary_file(filename))
+    except (OSError, json.decoder.JSONDecodeError):
+        return False
+
+    finished = "utc_stop" in summary
+
+    return finished
+
+
+def run_watch(schedule_block, test_run):
+    """
+    Run the processing for 'watch' mode, i.e. insert real candidates into the
+    database continuously, as they are written to the staging directory.
+
+    The candidates that the pipeline appended to the SPCCL files since the last
+    poll are ingested in batches, once the summary files of the runs exist. The
+    files are read up to the last complete line. They are read to their end and
+    moved only once the summary files say that the runs are finished. Once the
+    staging directory has not changed for the settle time, the parameters, sift
+    and known source stages are run on the schedule block. This runs until the
+    process is interrupted or was idle for the configured maximum time.
+
+    The files are ingested in this process, as the read offsets are kept here.
+
+    Parameters
+    ----------
+    schedule_block: int
+        The schedule block ID to use to reference the candidates in the database.
+    test_run: bool
+        Determines whether to run in test mode, where no files are moved, nor copied.
+    """
+
+    log = logging.getLogger("meertrapdb.populate_db")
+
+    config = get_config()
+    fsconf = config["filesystem"]
+    wconf = config["watch"]
+
+    staging_dir = fsconf["ingest"]["staging_dir"]
+    log.info("Watching staging directory: {0}".format(staging_dir))
+
+    glob_pattern = os.path.join(staging_dir, fsconf["ingest"]["glob_pattern"])
+    log.info("SPCCL glob pattern: {0}".format(glob_pattern))
+
+    # resume an interrupted ingest
+    journal_file = get_journal_file()
+    log.info("Ingest journal: {0}".format(journal_file))
+
+    if not test_run:
+        nrecovered = recover_ingest(schedule_block, journal_file)
+        log.info("Recovered {0} interrupted files.".format(nrecovered))
+
+    scanner = StagingScanner(glob_pattern)
+    follower = SpcclFollower(config["candidates"]["version"])
+    cache = EntityCache()
+
+    # finish the current batch before stopping
+    stop = threading.Event()
+
+    def handle_signal(signum, frame):
+        log.info("Received signal {0}, stopping.".format(signum))
+        stop.set()
+
+    handlers = {
+        signum: signal.signal(signum, handle_signal)
+        for signum in [signal.SIGINT, signal.SIGTERM]
+    }
+
+    status = {
+        "schedule_block": schedule_block,
+        "started": datetime.now(timezone("UTC")).strftime("%Y-%m-%dT%H:%M:%S"),
+        "nfiles": 0,
+        "ncands": 0,
+        "nbatches": 0,
+        "nstages": 0,
+    }
+
+    # whether candidates were ingested since the stages last ran
+    dirty = False
+    last_ingest = time.time()
+
+    try:
+        while not stop.is_set():
+            now = time.time()
+            changed = scanner.scan()
+
+            # the unchanged files of the runs that finished in the meantime
+            finished = [
+                item
+                for item in follower.offsets
+                if item not in changed and is_run_finished(item)
+            ]
+
+            # the summary files are needed to ingest the candidates
+            ready = [item for item in changed if os.path.isfile(get_summary_file(item))]
+            batch = sorted(ready + finished)[: wconf["batch_files"]]
+
+            status["queue_depth"] = scanner.get_queue_depth()
+            status["lag"] = scanner.get_lag(now)
+            status["open_files"] = len(follower.offsets)
+
+            log.debug(
+                "Queue depth: {0} files, lag: {1:.1f} s".format(
+                    status["queue_depth"], status["lag"]
+                )
+            )
+
+            if len(batch) > 0:
+                log.info(
+                    "Ingesting {0} of {1} queued files, lag: {2:.1f} s".format(
+                        len(batch), status["queue_depth"], status["lag"]
+                    )
+                )
+
+                stats = ingest_spccl_files(
+                    batch, schedule_block, test_run, cache, journal_file, follower
+                )
+                scanner.mark_done(batch)
+
+                status["nfiles"] += stats["nfiles"]
+                status["ncands"] += stats["ncands"]
+                status["nbatches"] += 1
+
+                dirty = True
+                last_ingest = time.time()
+
+                if wconf["status_file"] is not None:
+                    write_watch_status(wconf["status_file"], status)
+
+                # drain the queue without waiting
+                continue
+
+            # the files that are still being written
+            last_change = max(last_ingest, scanner.get_last_modified() or 0.0)
+
+            if dirty and now - last_change >= wconf["settle_time"]:
+                log.info("Staging directory settled, running processing stages.")
+
+                try:
+                    run_parameters(schedule_block)
+                    run_sift(schedule_block, incremental=True)
+                    run_known_sources(schedule_block)
+                except RuntimeError as err:
+                    log.error("Processing stages failed: {0}".format(err))
+
+                dirty = False
+                status["nstages"] += 1
+
+            elif (
+                not dirty
+                and wconf["max_idle"] is not None
+                and now - last_change >= wconf["max_idle"]
+            ):
+                log.info(
+                    "No new candidates for {0} s, stopping.".format(wconf["max_idle"])
+                )
+                break
+
+            if wconf["status_file"] is not None:
+                write_watch_status(wconf["status_file"], status)
+
+            stop.wait(wconf["poll_interval"])
+
+    finally:
+        for signum in handlers:
+            signal.signal(signum, handlers[signum])
+
+    log.info(
+        "Ingested {0} files, {1} candidates in {2} batches.".format(
+            status["nfiles"], status["ncands"], status["nbatches"]
+        )
+    )
+
 
-    # 1) gather all spccl files
-    staging_dir = fsconf["ingest"]["staging_dir"]
-    log.info("Staging directory: {0}".format(staging_dir))
+def iter_candidates(schedule_block, chunk_size):
+    """
+    Load the candidates of a schedule block from the database in order of MJD.
 
-    glob_pattern = os.path.join(staging_dir, fsconf["ingest"]["glob_pattern"])
-    log.info("SPCCL glob pattern: {0}".format(glob_pattern))
+    Parameters
+    ----------
+    schedule_block: int
+        The schedule block ID to load.
+    chunk_size: int or None
+        The maximum number of candidates to load at a time. All candidates are
+        loaded at once if None.
 
-    spcll_files = glob.glob(glob_pattern)
-    spcll_files = sorted(spcll_files)
-    log.info("Found {0} SPCCL files.".format(len(spcll_files)))
+    Yields
+    ------
+    candidates: ~np.record
+        The meta data of the single-pulse candidates.
+    """
+
+    dtype = [
+        ("index", int),
+        ("mjd", float),
+        ("dm", float),
+        ("snr", float),
+        ("beam", int),
+        ("ra", "|U32"),
+        ("dec", "|U32"),
+    ]
+
+    last_mjd = None
+    last_id = None
+
+    while True:
+        with db_session:
+            query = select(
+                (c.id, c.mjd, c.dm, c.snr, beam.number, beam.ra, beam.dec)
+                for c in schema.SpsCandidate
+                for beam in c.beam
+                for obs in c.observation
+                for sb in obs.schedule_block
+                if (sb.sb_id == schedule_block)
+            )
 
-    for filename in spcll_files:
-        log.info("Processing SPCCL file: {0}".format(filename))
+            # continue after the last candidate of the previous chunk
+            if last_mjd is not None:
+                query = query.filter(
+                    lambda cid, mjd, dm, snr, number, ra, dec: mjd > last_mjd
+                    or (mjd == last_mjd and cid > last_id)
+                )
 
-        # 2) work out basic parameters
-        utc_start_str = os.path.basename(filename)[:19]
+            query = query.sort_by(2, 1)
 
-        obs_utc_start = datetime.strptime(utc_start_str, fsconf["date_formats"]["utc"])
+            if chunk_size is None:
+                candidates = query[:]
+            else:
+                candidates = query[:chunk_size]
 
-        log.info("Observation UTC start: {0}".format(obs_utc_start))
+            # convert to numpy record
+            candidates = [item for item in candidates]
 
-        node_name = os.path.basename(os.path.dirname(filename))
+        candidates = np.array(candidates, dtype=dtype)
 
-        log.info("Node: {0}".format(node_name))
+        yield candidates
 
-        # 3) load run information from summary file
-        summary_file = os.path.join(
-            os.path.dirname(filename),
-            "{0}_{1}_{2}".format(
-                utc_start_str, node_name, fsconf["summary_file"]["postfix"]
-            ),
-        )
+        if chunk_size is None or len(candidates) < chunk_size:
+            break
 
-        log.info("Summary filename: {0}".format(summary_file))
+        last_id = int(candidates["index"][-1])
+        last_mjd = Decimal("{0:.10f}".format(candidates["mjd"][-1]))
 
-        # sanity check summary file
-        if not os.path.isfile(summary_file):
-            log.error("Summary file does not exist: {0}".format(summary_file))
-            log.warning("Skipping SPCCL file: {0}".format(filename))
-            continue
 
-        try:
-            summary = load_summary_file(summary_file)
-        except json.decoder.JSONDecodeError as err:
-            log.error(
-                "Could not parse summary file: {0}, {1}".format(summary_file, err)
-            )
-            log.warning("Skipping SPCCL file: {0}".format(filename))
-            continue
+def insert_sift_results(info):
+    """
+    Insert sift results into the database.
 
-        # sanity check
-        assert utc_start_str == summary["utc_start"]
+    The sift results and their links to the candidates and cluster heads are
+    inserted with multi-row statements, keyed directly by the candidate IDs in
+    the clustering information. No candidates are loaded from the database.
 
-        # 4) parse candidate data
-        spccl_data = parse_spccl_file(filename, config["candidates"]["version"])
+    Parameters
+    ----------
+    info: ~np.record
+        The clustering information.
+    """
 
-        # check if we have candidates
-        if len(spccl_data) > 0:
-            log.info("Parsed {0} candidates.".format(len(spccl_data)))
-        else:
-            log.warning("No candidates found.")
-            continue
+    config = get_config()
+    batch_size = config["ingest"]["batch_size"]
+
+    if len(info) == 0:
+        return
+
+    values = {
+        "cluster_id": info["cluster_id"].tolist(),
+        "is_head": info["is_head"].tolist(),
+        "members": info["members"].tolist(),
+        "beams": info["beams"].tolist(),
+    }
+
+    # spatial extent of the cluster, if available
+    if "extent_area" in info.dtype.names:
+        for field in ["extent_ra", "extent_dec", "extent_area"]:
+            values[field] = info[field].tolist()
 
-        # 5) insert data into database
-        plots = insert_candidates(
-            spccl_data, schedule_block, summary, obs_utc_start, node_name
+    with db_session:
+        sr_ids = insert_entities(schema.SiftResult, values, batch_size=batch_size)
+
+        insert_links(
+            schema.SiftResult.sps_candidate,
+            sr_ids,
+            info["index"].tolist(),
+            batch_size=batch_size,
         )
 
-        if not test_run:
-            # 6) copy plots to webserver area and move them to processed
-            if len(plots) > 0:
-                log.info("Copying {0} plots.".format(len(plots)))
-                copy_plots(plots)
-            else:
-                log.warning("No plots to copy found.")
-
-            # 7) copy summary file to processed directory
-            # we copy the file, because other spccl files might need it
-            # summary files are deleted manually at the end of the ingest
-            outfile = os.path.join(
-                fsconf["ingest"]["processed_dir"],
-                utc_start_str,
-                node_name,
-                os.path.basename(summary_file),
-            )
+        insert_links(
+            schema.SiftResult.head,
+            sr_ids,
+            info["head"].tolist(),
+            batch_size=batch_size,
+        )
 
-            outdir = os.path.dirname(outfile)
 
-            if not os.path.isdir(outdir):
-                os.makedirs(outdir)
+def delete_sift_results(schedule_block, cand_ids=None):
+    """
+    Delete sift results from the database.
 
-            shutil.copy(summary_file, outfile)
+    The rows are deleted with set-based statements without loading them. Their
+    links to the candidates are removed by the database through the foreign
+    keys.
 
-            # 8) move spccl file to processed directory
-            outfile = os.path.join(
-                fsconf["ingest"]["processed_dir"],
-                utc_start_str,
-                node_name,
-                os.path.basename(filename),
-            )
+    Parameters
+    ----------
+    schedule_block: int
+        The schedule block ID.
+    cand_ids: list of int (default: None)
+        Only delete the sift results of these candidates.
 
-            shutil.move(filename, outfile)
+    Returns
+    -------
+    ndeleted: int
+        The number of sift results deleted.
+    """
 
-    log.info("Done. Time taken: {0}".format(datetime.now() - start))
+    config = get_config()
+    batch_size = config["ingest"]["batch_size"]
 
-    # return start time of schedule block for notification
-    sb_local_time_start = datetime.strptime(
-        summary["sb_details"]["actual_start_time"][:-2], fsconf["date_formats"]["local"]
-    )
-    sb_utc_start = sb_local_time_start.replace(tzinfo=timezone("UTC"))
+    ndeleted = 0
 
-    return sb_utc_start
+    with db_session:
+        if cand_ids is None:
+            ndeleted += select(
+                sr
+                for sr in schema.SiftResult
+                if exists(
+                    c
+                    for c in sr.sps_candidate
+                    for obs in c.observation
+                    for sb in obs.schedule_block
+                    if sb.sb_id == schedule_block
+                )
+            ).delete(bulk=True)
+
+        else:
+            for i in range(0, len(cand_ids), batch_size):
+                chunk = [int(item) for item in cand_ids[i : i + batch_size]]
+
+                ndeleted += select(
+                    sr
+                    for sr in schema.SiftResult
+                    if exists(c for c in sr.sps_candidate if c.id in chunk)
+                ).delete(bulk=True)
 
+    return ndeleted
 
-def run_sift(schedule_block):
+
+def run_sift_incremental(schedule_block):
     """
-    Run the processing for 'sift' mode.
+    Sift the candidates of a schedule block that are not yet sifted.
+
+    The new candidates are matched against the existing clusters in their time
+    range and the remaining ones are clustered amongst themselves. Only the sift
+    results of the new candidates and of the clusters that they join are
+    written to the database.
 
     Parameters
     ----------
@@ -874,7 +1929,7 @@ def run_sift(schedule_block):
     Returns
     -------
     ncands: int
-        The total number of candidates loaded.
+        The number of new candidates loaded.
     """
 
     log = logging.getLogger("meertrapdb.populate_db")
@@ -882,100 +1937,250 @@ def run_sift(schedule_block):
     config = get_config()
     sconfig = config["sifter"]
 
-    start = datetime.now()
-
-    # check if schedule block is in the database
-    check_if_schedule_block_exists(schedule_block)
-
-    # delete any previous sift results for that schedule block
-    log.info(
-        "Deleting previous sift results for schedule block: {0}".format(schedule_block)
+    clust = Clusterer(
+        sconfig["time_thresh"],
+        sconfig["dm_thresh"],
+        beam_thresh=sconfig["beam_thresh"],
     )
-    with db_session:
-        delete(
-            sr
-            for sr in schema.SiftResult
-            for c in sr.sps_candidate
-            for obs in c.observation
-            for sb in obs.schedule_block
-            if (sb.sb_id == schedule_block)
-        )
 
-    # get the candidates
-    log.info("Loading candidates from database.")
+    # 1) get the candidates that are not yet sifted
+    log.info("Loading new candidates from database.")
     with db_session:
         candidates = select(
-            (c.id, c.mjd, c.dm, c.snr, beam.number)
+            (c.id, c.mjd, c.dm, c.snr, beam.number, beam.ra, beam.dec)
             for c in schema.SpsCandidate
             for beam in c.beam
             for obs in c.observation
             for sb in obs.schedule_block
-            if (sb.sb_id == schedule_block)
+            if (sb.sb_id == schedule_block and not c.sift_result)
         ).sort_by(1)[:]
 
-    if len(candidates) == 0:
-        raise RuntimeError("No single-pulse candidates found.")
+        candidates = [item for item in candidates]
 
-    log.info("Candidates loaded: {0}".format(len(candidates)))
+    log.info("New candidates loaded: {0}".format(len(candidates)))
+
+    if len(candidates) == 0:
+        log.warning("No new single-pulse candidates found.")
+        return 0
 
-    # convert to numpy record
-    candidates = [item for item in candidates]
     dtype = [
         ("index", int),
         ("mjd", float),
         ("dm", float),
         ("snr", float),
         ("beam", int),
+        ("ra", "|U32"),
+        ("dec", "|U32"),
     ]
     candidates = np.array(candidates, dtype=dtype)
 
-    # do the clustering
-    clust = Clusterer(sconfig["time_thresh"], sconfig["dm_thresh"])
+    # 2) get the existing clusters in their time range
+    # a new candidate only joins a cluster whose members are all within the time
+    # tolerance of it, the window has a margin for the rounding of the mjds
+    mjd_tol = 1e-3 * sconfig["time_thresh"] / (24 * 60 * 60.0)
+    mjd_start = Decimal("{0:.10f}".format(np.min(candidates["mjd"]) - 2 * mjd_tol))
+    mjd_end = Decimal("{0:.10f}".format(np.max(candidates["mjd"]) + 2 * mjd_tol))
 
-    info = clust.match_candidates(candidates)
+    log.info("Loading existing clusters from database.")
+    with db_session:
+        cluster_ids = select(
+            sr.cluster_id
+            for sr in schema.SiftResult
+            for c in sr.sps_candidate
+            for obs in c.observation
+            for sb in obs.schedule_block
+            if (sb.sb_id == schedule_block and c.mjd >= mjd_start and c.mjd <= mjd_end)
+        )[:]
 
-    # write results back to database
-    log.info("Writing results into database.")
+        cluster_ids = list(cluster_ids)
+
+        existing = select(
+            (c.id, c.mjd, c.dm, c.snr, beam.number, beam.ra, beam.dec, sr.cluster_id)
+            for sr in schema.SiftResult
+            for c in sr.sps_candidate
+            for beam in c.beam
+            for obs in c.observation
+            for sb in obs.schedule_block
+            if (sb.sb_id == schedule_block and sr.cluster_id in cluster_ids)
+        )[:]
+
+        existing = [item for item in existing]
+
+        max_cluster_id = select(
+            sr.cluster_id
+            for sr in schema.SiftResult
+            for c in sr.sps_candidate
+            for obs in c.observation
+            for sb in obs.schedule_block
+            if (sb.sb_id == schedule_block)
+        ).max()
+
+    log.info(
+        "Existing clusters loaded: {0}, {1}".format(len(cluster_ids), len(existing))
+    )
+
+    existing = np.array(existing, dtype=dtype + [("cluster_id", int)])
+
+    if max_cluster_id is None:
+        max_cluster_id = -1
+
+    # 3) do the clustering
+    info = clust.extend_clusters(candidates, existing, cluster_id=max_cluster_id + 1)
+
+    # 4) write results back to database
+    is_new = np.isin(info["index"], candidates["index"])
+
+    # the changed sift results are replaced in one transaction
+    log.info(
+        "Updating existing sift results: {0}, new: {1}".format(
+            np.count_nonzero(~is_new), np.count_nonzero(is_new)
+        )
+    )
     with db_session:
-        for item in info:
-            # find sps candidate
-            cand_queried = schema.SpsCandidate.select(
-                lambda c: c.id == int(item["index"])
-            )[:]
+        delete_sift_results(schedule_block, info["index"][~is_new])
+        insert_sift_results(info)
 
-            if len(cand_queried) == 1:
-                cand = cand_queried[0]
-            else:
-                msg = "Something is wrong with the candidate index mapping: {0}, {1}, {2}".format(
-                    item["index"], len(cand_queried), cand_queried
-                )
-                raise RuntimeError(msg)
+    return len(candidates)
 
-            # find cluster head
-            head_queried = schema.SpsCandidate.select(
-                lambda c: c.id == int(item["head"])
-            )[:]
 
-            if len(head_queried) == 1:
-                head = head_queried[0]
-            else:
-                msg = "Something is wrong with the head index mapping: {0}, {1}, {2}".format(
-                    item["head"], len(head_queried), head_queried
-                )
-                raise RuntimeError(msg)
+def run_sift(schedule_block, incremental=False):
+    """
+    Run the processing for 'sift' mode.
+
+    Parameters
+    ----------
+    schedule_block: int
+        The schedule block ID to process.
+    incremental: bool (default: False)
+        Determines whether to only sift the candidates that are not yet sifted,
+        extending the existing clusters.
+
+    Returns
+    -------
+    ncands: int
+        The total number of candidates loaded.
+    """
+
+    log = logging.getLogger("meertrapdb.populate_db")
+
+    config = get_config()
+    sconfig = config["sifter"]
+
+    start = datetime.now()
+
+    # check if schedule block is in the database
+    check_if_schedule_block_exists(schedule_block)
+
+    if incremental:
+        ncands = run_sift_incremental(schedule_block)
+        log.info("Done. Time taken: {0}".format(datetime.now() - start))
+        return ncands
+
+    # delete any previous sift results for that schedule block
+    log.info(
+        "Deleting previous sift results for schedule block: {0}".format(schedule_block)
+    )
+    ndeleted = delete_sift_results(schedule_block)
+    log.info("Deleted sift results: {0}".format(ndeleted))
+
+    # do the clustering
+    clust = Clusterer(
+        sconfig["time_thresh"],
+        sconfig["dm_thresh"],
+        nproc=sconfig["nproc"],
+        beam_thresh=sconfig["beam_thresh"],
+    )
+
+    if sconfig["chunk_size"] is None:
+        # get the candidates
+        log.info("Loading candidates from database.")
+        candidates = np.concatenate(list(iter_candidates(schedule_block, None)))
+
+        if len(candidates) == 0:
+            raise RuntimeError("No single-pulse candidates found.")
 
-            schema.SiftResult(
-                sps_candidate=cand,
-                cluster_id=item["cluster_id"],
-                head=head,
-                is_head=item["is_head"],
-                members=item["members"],
-                beams=item["beams"],
+        log.info("Candidates loaded: {0}".format(len(candidates)))
+
+        info = clust.match_candidates(candidates)
+        ncands = len(candidates)
+
+        # write results back to database
+        log.info("Writing results into database.")
+        insert_sift_results(info)
+
+    else:
+        # cluster and write back the candidates in chunks of bounded size
+        log.info(
+            "Streaming candidates from database in chunks of: {0}".format(
+                sconfig["chunk_size"]
             )
+        )
+        chunks = iter_candidates(schedule_block, sconfig["chunk_size"])
+        ncands = 0
+
+        for info in clust.match_candidates_stream(chunks):
+            log.info("Writing results into database: {0}".format(len(info)))
+            insert_sift_results(info)
+            ncands += len(info)
+
+        if ncands == 0:
+            raise RuntimeError("No single-pulse candidates found.")
 
     log.info("Done. Time taken: {0}".format(datetime.now() - start))
 
-    return len(candidates)
+    return ncands
+
+
+def get_matcher(catalogue):
+    """
+    Get a known source matcher with the catalogue loaded and the search tree
+    created.
+
+    The prepared matcher is cached on disk, if configured.
+
+    Parameters
+    ----------
+    catalogue: str
+        The name of the catalogue, e.g. `psrcat`.
+
+    Returns
+    -------
+    m: ~psrmatch.matcher.Matcher
+        The prepared matcher.
+    """
+
+    log = logging.getLogger("meertrapdb.populate_db")
+
+    config = get_config()
+    ksconfig = config["knownsources"]
+
+    def create_matcher():
+        m = Matcher(
+            dist_thresh=ksconfig["dist_thresh"], dm_thresh=ksconfig["dm_thresh"]
+        )
+
+        log.info("Loading pulsar catalogue.")
+        m.load_catalogue(catalogue)
+
+        log.info("Creating k-d search tree.")
+        m.create_search_tree()
+
+        return m
+
+    if ksconfig["cache_dir"] is None:
+        return create_matcher()
+
+    cache_file = get_matcher_cache_file(
+        catalogue,
+        ksconfig["dist_thresh"],
+        ksconfig["dm_thresh"],
+        os.path.dirname(psrmatch.__file__),
+        ksconfig["cache_dir"],
+    )
+
+    m = load_matcher(cache_file, create_matcher)
+
+    return m
 
 
 def run_known_sources(schedule_block):
@@ -998,41 +2203,15 @@ def run_known_sources(schedule_block):
     log = logging.getLogger("meertrapdb.populate_db")
 
     config = get_config()
-    ksconfig = config["knownsources"]
+    batch_size = config["ingest"]["batch_size"]
 
     start = datetime.now()
 
     # check if schedule block is in the database
     check_if_schedule_block_exists(schedule_block)
 
-    # delete any previous known source matching for that schedule block
-    log.info(
-        "Deleting previous known source matching for schedule block: {0}".format(
-            schedule_block
-        )
-    )
-    with db_session:
-        # just remove the links to the known source entries
-        candidates = select(
-            c
-            for c in schema.SpsCandidate
-            for obs in c.observation
-            for sr in c.sift_result
-            for sb in obs.schedule_block
-            if (sb.sb_id == schedule_block and sr.is_head)
-        )[:]
-
-        for cand in candidates:
-            cand.known_source.clear()
-
     # prepare known source matcher
-    m = Matcher(dist_thresh=ksconfig["dist_thresh"], dm_thresh=ksconfig["dm_thresh"])
-
-    log.info("Loading pulsar catalogue.")
-    m.load_catalogue("psrcat")
-
-    log.info("Creating k-d search tree.")
-    m.create_search_tree()
+    m = get_matcher("psrcat")
 
     # get the cluster heads
     log.info("Loading cluster heads from database.")
@@ -1057,6 +2236,10 @@ def run_known_sources(schedule_block):
     dtype = [("index", int), ("dm", float), ("ra", "|U32"), ("dec", "|U32")]
     candidates = np.array(candidates, dtype=dtype)
 
+    # match each cluster head once, even if it is linked to several beams
+    _, first = np.unique(candidates["index"], return_index=True)
+    candidates = candidates[np.sort(first)]
+
     coords = SkyCoord(
         ra=candidates["ra"],
         dec=candidates["dec"],
@@ -1064,79 +2247,50 @@ def run_known_sources(schedule_block):
         unit=(u.hourangle, u.deg),
     )
 
-    dtype = [
-        ("index", int),
-        ("has_match", bool),
-        ("source", "|U32"),
-        ("catalogue", "|U32"),
-        ("dm", float),
-        ("type", "|U32"),
-    ]
-    info = np.zeros(len(candidates), dtype=dtype)
-
-    for i in range(len(candidates)):
-        cand = candidates[i]
-
-        match = m.find_matches(coords[i], cand["dm"])
-
-        info["index"][i] = cand["index"]
-
-        if match is None:
-            info["has_match"][i] = False
-        else:
-            info["has_match"][i] = True
-            info["source"][i] = match["psrj"]
-
-            for field in ["catalogue", "dm", "type"]:
-                info[field][i] = match[field]
+    info = find_known_sources(m, coords, candidates["dm"])
 
     # consider only those cluster heads that have a match
-    matched = info[info["has_match"] == True]
+    matched = info[info["has_match"]]
+    cand_ids = candidates["index"][info["has_match"]]
 
     # write results back to database
     log.info("Writing results into database.")
     with db_session:
-        for item in matched:
-            # find sps candidate
-            cand_queried = schema.SpsCandidate.select(
-                lambda c: c.id == int(item["index"])
-            )[:]
+        # delete any previous known source matching for that schedule block
+        # just remove the links to the known source entries
+        nremoved = delete_links(
+            schema.SpsCandidate.known_source,
+            candidates["index"].tolist(),
+            batch_size=batch_size,
+        )
+        log.info("Removed previous known source links: {0}".format(nremoved))
 
-            if len(cand_queried) == 1:
-                cand = cand_queried[0]
-            else:
-                msg = "Something is wrong with the candidate index mapping: {0}, {1}, {2}".format(
-                    item["index"], len(cand_queried), cand_queried
-                )
-                raise RuntimeError(msg)
+        # the known sources in the database
+        ks_ids = dict(select((ks.name, ks.id) for ks in schema.KnownSource)[:])
 
-            # find known source
-            ks_queried = schema.KnownSource.select(lambda c: c.name == item["source"])[
-                :
-            ]
+        # insert the new known sources
+        _, first = np.unique(matched["source"], return_index=True)
+        new = [i for i in np.sort(first) if matched["source"][i] not in ks_ids]
 
-            if len(ks_queried) == 0:
-                # insert known source and link
-                schema.KnownSource(
-                    sps_candidate=cand,
-                    name=item["source"],
-                    catalogue=item["catalogue"],
-                    dm=item["dm"],
-                    source_type=item["type"],
-                )
+        values = {
+            "name": matched["source"][new].tolist(),
+            "catalogue": matched["catalogue"][new].tolist(),
+            "dm": matched["dm"][new].tolist(),
+            "source_type": matched["type"][new].tolist(),
+        }
 
-                db.commit()
+        new_ids = insert_entities(schema.KnownSource, values, batch_size=batch_size)
+        ks_ids.update(zip(values["name"], new_ids))
 
-            elif len(ks_queried) == 1:
-                # link sps candidate and known source
-                ks = ks_queried[0]
-                cand.known_source.add(ks)
+        log.info("New known sources: {0}".format(len(new_ids)))
 
-            else:
-                msg = "Duplicate known source names are present: {0}, {1}, {2}".format(
-                    item["source"], len(ks_queried), ks_queried
-                )
-                raise RuntimeError(msg)
+        # link the cluster heads and their known sources
+        insert_links(
+            schema.SpsCandidate.known_source,
+            cand_ids.tolist(),
+            [ks_ids[item] for item in matched["source"]],
+            batch_size=batch_size,
+        )
 
     log.info("Done. Time taken: {0}".format(datetime.now() - start))
 
@@ -1274,7 +2428,7 @@ def main():
     elif args.mode == "production":
         sb_utc_start = run_production(args.schedule_block, args.test_run)
         run_parameters(args.schedule_block)
-        raw_cands = run_sift(args.schedule_block)
+        raw_cands = run_sift(args.schedule_block, args.incremental)
         unique_heads, known_matched = run_known_sources(args.schedule_block)
 
         info = {
@@ -1287,11 +2441,14 @@ def main():
         send_slack_notification(info)
 
     elif args.mode == "sift":
-        run_sift(args.schedule_block)
+        run_sift(args.schedule_block, args.incremental)
 
     elif args.mode == "parameters":
         run_parameters(args.schedule_block)
 
+    elif args.mode == "watch":
+        run_watch(args.schedule_block, args.test_run)
+
     log.info("All done.")
 
 
@@ -0,0 +1,125 @@
+#
+#   2020 Fabian Jankowski
+#   Sweep the multi-beam sifter over a grid of thresholds.
+#
+
+import argparse
+import logging
+
+import numpy as np
+
+from meertrapdb.clustering.clusterer import Clusterer
+from meertrapdb.general_helpers import setup_logging
+from meertrapdb.parsing_helpers import load_spccl_files
+
+
+def parse_args():
+    """
+    Parse the commandline arguments.
+
+    Returns
+    -------
+    options: argparse.Parser object
+    """
+
+    parser = argparse.ArgumentParser(
+        description="Sweep the multi-beam sifter over a grid of thresholds.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+
+    parser.add_argument("filenames", type=str, nargs="+")
+
+    parser.add_argument(
+        "--dm",
+        type=float,
+        nargs="+",
+        default=[0.01, 0.02, 0.05, 0.1],
+        help="Fractional DM tolerances.",
+    )
+
+    parser.add_argument(
+        "--time",
+        type=float,
+        nargs="+",
+        default=[1.0, 5.0, 10.0, 20.0, 50.0],
+        help="Time tolerances for matching in milliseconds.",
+    )
+
+    parser.add_argument(
+        "--nproc",
+        type=int,
+        default=1,
+        help="The number of processes to use for loading and clustering.",
+    )
+
+    parser.add_argument(
+        "--output",
+        type=str,
+        default="sifter_grid.csv",
+        help="The output file for the clustering statistics.",
+    )
+
+    parser.add_argument(
+        "--cache",
+        action="store_true",
+        default=False,
+        help="Cache the parsed SPCCL files in binary files for later runs.",
+    )
+
+    parser.add_argument(
+        "--cache_dir",
+        type=str,
+        default=None,
+        help="The directory to store the cache files in.",
+    )
+
+    parser.add_argument(
+        "--spccl_version",
+        type=int,
+        default=2,
+        help="The version of the input SPCCL files.",
+    )
+
+    return parser.parse_args()
+
+
+#
+# MAIN
+#
+
+
+def main():
+    args = parse_args()
+
+    log = logging.getLogger("meertrapdb.sweep_sifter")
+    setup_logging(logging.INFO)
+
+    candidates = load_spccl_files(
+        args.filenames,
+        args.spccl_version,
+        nproc=args.nproc,
+        cache=args.cache,
+        cache_dir=args.cache_dir,
+    )
+    log.info("Candidates loaded: {0}".format(len(candidates)))
+
+    clust = Clusterer(nproc=args.nproc)
+    stats = clust.match_candidates_grid(candidates, args.time, args.dm)
+
+    fmt = ["%.3f", "%.4f", "%d", "%d", "%.3f", "%.1f", "%.1f", "%d", "%.4f", "%.3f"]
+
+    np.savetxt(
+        args.output,
+        stats,
+        fmt=fmt,
+        delimiter=",",
+        header=",".join(stats.dtype.names),
+        comments="",
+    )
+
+    with open(args.output, "r") as f:
+        print(f.read())
+
+
+if __name__ == "__main__":
+    main()
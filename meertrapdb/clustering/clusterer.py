@@ -3,15 +3,73 @@
 #   Cluster single-pulse candidates in various ways.
 #
 
+from concurrent.futures import ProcessPoolExecutor
 import logging
 
+from astropy.coordinates import SkyCoord
+import astropy.units as u
 import numpy as np
+from scipy.spatial import cKDTree
 
 # disable false positives of 'assigning to function call which does not return'
 # pylint test case in numpy masks
 # pylint: disable=E1111
 
 
+def _cluster_part(params, candidates, mjd_tol):
+    """
+    Cluster a part of the candidates in a worker process.
+
+    Parameters
+    ----------
+    params: list
+        The parameters of the clusterer.
+    candidates: ~np.record
+        The meta data of the single-pulse candidates, sorted by MJD.
+    mjd_tol: float
+        The MJD tolerance to use for matching.
+
+    Returns
+    -------
+    info: ~np.record
+        The clustering information, with cluster IDs starting at zero.
+    nclusters: int
+        The number of clusters found.
+    """
+
+    clust = Clusterer(*params)
+    info = clust._get_info(candidates)
+    nclusters = clust._cluster(candidates, info, mjd_tol)
+
+    return info, nclusters
+
+
+def _cluster_grid_part(params, candidates, settings):
+    """
+    Cluster the candidates for a part of a grid of thresholds in a worker
+    process.
+
+    Parameters
+    ----------
+    params: list
+        The parameters of the clusterer.
+    candidates: ~np.record
+        The meta data of the single-pulse candidates, sorted by MJD.
+    settings: list of tuple
+        The time and DM thresholds to use.
+
+    Returns
+    -------
+    stats: list of tuple
+        The clustering statistics for each setting.
+    """
+
+    clust = Clusterer(*params)
+    stats = clust._cluster_grid(candidates, settings)
+
+    return stats
+
+
 class Clusterer(object):
     """
     Cluster single-pulse candidates in various ways.
@@ -19,7 +77,17 @@ class Clusterer(object):
 
     name = "Clusterer"
 
-    def __init__(self, time_thresh=10.0, dm_thresh=0.02):
+    # the available clustering algorithms
+    algorithms = ["naive", "sweep"]
+
+    def __init__(
+        self,
+        time_thresh=10.0,
+        dm_thresh=0.02,
+        algorithm="sweep",
+        nproc=1,
+        beam_thresh=None,
+    ):
         """
         Cluster single-pulse candidates in various ways.
 
@@ -29,22 +97,50 @@ class Clusterer(object):
             The width of the matching box in ms.
         dm_thresh: float (default: 0.02)
             The fractional DM tolerance to use for matching.
+        algorithm: str (default: sweep)
+            The clustering algorithm to use. Either "naive", which compares
+            each candidate with all others, or "sweep", which only looks at
+            the candidates within the MJD tolerance. Both give identical output.
+        nproc: int (default: 1)
+            The number of processes to use for clustering. Candidates separated
+            by more than the time threshold can never share a cluster, so the
+            candidates are split at such gaps and the parts are clustered in
+            parallel. The output is identical to that of the serial run.
+        beam_thresh: float (default: None)
+            The maximum angular distance in degrees between the beam of the
+            first candidate in a cluster and those of its members. This
+            restricts matches to spatially adjacent beams. The candidates must
+            then have `ra` and `dec` fields, either in degrees or as
+            sexagesimal strings. The angular extent of each cluster is output
+            too. Beam positions are ignored by default.
         """
 
         self.__time_thresh = None
         self.__dm_thresh = None
+        self.__algorithm = None
+        self.__nproc = None
+        self.__beam_thresh = None
         self.__log = logging.getLogger("meertrapdb.clustering.clusterer")
 
         # use validation in the setter functions
         self.time_thresh = time_thresh
         self.dm_thresh = dm_thresh
+        self.algorithm = algorithm
+        self.nproc = nproc
+        self.beam_thresh = beam_thresh
 
     def __repr__(self):
         """
         Representation of the object.
         """
 
-        info_dict = {"time_thresh": self.time_thresh, "dm_thresh": self.dm_thresh}
+        info_dict = {
+            "time_thresh": self.time_thresh,
+            "dm_thresh": self.dm_thresh,
+            "algorithm": self.algorithm,
+            "nproc": self.nproc,
+            "beam_thresh": self.beam_thresh,
+        }
 
         info_str = "{0}".format(info_dict)
 
@@ -107,36 +203,133 @@ class Clusterer(object):
         else:
             raise RuntimeError("DM threshold is invalid: {0}".format(thresh))
 
-    def match_candidates(self, t_candidates):
+    @property
+    def algorithm(self):
+        """
+        The clustering algorithm to use.
         """
-        Match candidates based on MJD and DM.
 
-        This function implements a simplistic multi-beam sifter.
+        return self.__algorithm
 
-        Parameters
-        ----------
-        t_candidates: ~np.record
-            The meta data of the single-pulse candidates.
+    @algorithm.setter
+    def algorithm(self, algorithm):
+        """
+        Set the clustering algorithm to use.
 
-        Returns
-        -------
-        info: ~np.record
-            Information about the matching.
+        Raises
+        ------
+        RuntimeError
+            If the algorithm is unknown.
+        """
+
+        if algorithm in self.algorithms:
+            self.__algorithm = algorithm
+        else:
+            raise RuntimeError("Clustering algorithm is invalid: {0}".format(algorithm))
+
+    @property
+    def nproc(self):
+        """
+        The number of processes to use for clustering.
+        """
+
+        return self.__nproc
+
+    @nproc.setter
+    def nproc(self, nproc):
+        """
+        Set the number of processes to use for clustering.
 
         Raises
         ------
         RuntimeError
-            On errors.
+            If the number of processes is invalid.
         """
 
-        candidates = np.copy(t_candidates)
+        if type(nproc) == int and nproc > 0:
+            self.__nproc = nproc
+        else:
+            raise RuntimeError("Number of processes is invalid: {0}".format(nproc))
+
+    @property
+    def beam_thresh(self):
+        """
+        The maximum angular distance between matching beams in degrees.
+        """
+
+        return self.__beam_thresh
+
+    @beam_thresh.setter
+    def beam_thresh(self, thresh):
+        """
+        Set the maximum angular distance between matching beams in degrees.
+
+        Raises
+        ------
+        RuntimeError
+            If beam threshold is invalid.
+        """
+
+        if thresh is None or (type(thresh) == float and thresh >= 0):
+            self.__beam_thresh = thresh
+        else:
+            raise RuntimeError("Beam threshold is invalid: {0}".format(thresh))
+
+    def _get_mjd_tol(self):
+        """
+        Get the MJD tolerance corresponding to the time threshold.
+
+        Returns
+        -------
+        mjd_tol: float
+            The MJD tolerance to use for matching.
+        """
 
         mjd_tol = 1e-3 * self.time_thresh / (24 * 60 * 60.0)
-        self.__log.info("Time tolerance: {0:.2f} ms".format(self.time_thresh))
-        self.__log.info("MJD tolerance: {0:.10f}".format(mjd_tol))
-        self.__log.info("DM tolerance: {0:.2f} %".format(100 * self.dm_thresh))
 
-        candidates = np.sort(candidates, order=["mjd", "dm", "snr"])
+        return mjd_tol
+
+    def _get_mjd_pad(self, mjd, mjd_tol):
+        """
+        Get the half-width of the MJD search windows.
+
+        We pad the MJD tolerance slightly, so that floating point rounding in
+        the window boundaries never excludes a candidate in the matching box.
+
+        Parameters
+        ----------
+        mjd: ~np.array of float
+            The MJDs of the candidates.
+        mjd_tol: float
+            The MJD tolerance to use for matching.
+
+        Returns
+        -------
+        mjd_pad: float
+            The padded MJD tolerance.
+        """
+
+        if len(mjd) == 0:
+            return mjd_tol
+
+        mjd_pad = mjd_tol + 4 * np.spacing(np.max(np.abs(mjd)))
+
+        return mjd_pad
+
+    def _get_info(self, candidates):
+        """
+        Get an empty clustering information array for the candidates.
+
+        Parameters
+        ----------
+        candidates: ~np.record
+            The meta data of the single-pulse candidates.
+
+        Returns
+        -------
+        info: ~np.record
+            The clustering information, with the candidate indices filled in.
+        """
 
         dtype = [
             ("index", int),
@@ -147,11 +340,268 @@ class Clusterer(object):
             ("beams", int),
             ("processed", bool),
         ]
+
+        if self.beam_thresh is not None:
+            dtype += [
+                ("extent_ra", float),
+                ("extent_dec", float),
+                ("extent_area", float),
+            ]
+
         info = np.zeros(len(candidates), dtype=dtype)
 
         # fill in the candidate indices
         info["index"] = candidates["index"]
 
+        return info
+
+    def _get_positions(self, candidates):
+        """
+        Get the beam positions of the candidates.
+
+        Parameters
+        ----------
+        candidates: ~np.record
+            The meta data of the single-pulse candidates.
+
+        Returns
+        -------
+        ra: ~np.array of float
+            The right ascensions in degrees.
+        dec: ~np.array of float
+            The declinations in degrees.
+
+        Raises
+        ------
+        RuntimeError
+            If the candidates do not have beam positions.
+        """
+
+        if not ("ra" in candidates.dtype.names and "dec" in candidates.dtype.names):
+            raise RuntimeError("The candidates do not have beam positions.")
+
+        ra = np.asarray(candidates["ra"])
+        dec = np.asarray(candidates["dec"])
+
+        if ra.dtype.kind in ["U", "S"]:
+            # convert each distinct position only once
+            pos, inverse = np.unique(
+                np.char.add(np.char.add(ra.astype("U"), " "), dec.astype("U")),
+                return_inverse=True,
+            )
+
+            if len(pos) > 0:
+                coords = SkyCoord(pos, frame="icrs", unit=(u.hourangle, u.deg))
+                ra = np.array(coords.ra.deg)[inverse]
+                dec = np.array(coords.dec.deg)[inverse]
+            else:
+                ra = np.zeros(0)
+                dec = np.zeros(0)
+
+        return ra.astype(float), dec.astype(float)
+
+    def _get_beam_neighbours(self, candidates):
+        """
+        Find the spatially adjacent beams of each candidate.
+
+        We look up the distinct beam positions in a k-d tree on the unit sphere.
+
+        Parameters
+        ----------
+        candidates: ~np.record
+            The meta data of the single-pulse candidates.
+
+        Returns
+        -------
+        beam_ids: ~np.array of int
+            The ID of the beam position of each candidate.
+        neighbours: list of set
+            The IDs of the adjacent beam positions of each beam position,
+            including itself.
+        """
+
+        ra, dec = self._get_positions(candidates)
+
+        pos, beam_ids = np.unique(
+            np.column_stack((ra, dec)), axis=0, return_inverse=True
+        )
+        beam_ids = beam_ids.reshape(-1)
+
+        ra = np.radians(pos[:, 0])
+        dec = np.radians(pos[:, 1])
+        xyz = np.column_stack(
+            (np.cos(dec) * np.cos(ra), np.cos(dec) * np.sin(ra), np.sin(dec))
+        )
+
+        # the chord length corresponding to the angular distance
+        radius = 2 * np.sin(0.5 * np.radians(self.beam_thresh))
+
+        tree = cKDTree(xyz)
+        neighbours = [set(item) for item in tree.query_ball_point(xyz, radius)]
+
+        return beam_ids, neighbours
+
+    def _fill_extent(self, candidates, info, rows):
+        """
+        Work out the angular extent of the clusters.
+
+        The extent is that of the bounding box of the members' beam positions,
+        where the extent in right ascension is measured on the sky.
+
+        Parameters
+        ----------
+        candidates: ~np.record
+            The meta data of the single-pulse candidates.
+        info: ~np.record
+            The clustering information with the cluster IDs filled in. The
+            extent fields are filled in.
+        rows: ~np.array of int
+            The positions of all members of the clusters to work on.
+        """
+
+        if len(rows) == 0:
+            return
+
+        ra, dec = self._get_positions(candidates[rows])
+        cluster_id = info["cluster_id"][rows]
+
+        order, start, group = self._get_groups(cluster_id)
+
+        # right ascension offsets from the first member, treating wraps
+        ra = ra[order]
+        dec = dec[order]
+        dra = np.mod(ra - ra[start][group] + 180.0, 360.0) - 180.0
+
+        extent_ra = np.maximum.reduceat(dra, start) - np.minimum.reduceat(dra, start)
+        extent_dec = np.maximum.reduceat(dec, start) - np.minimum.reduceat(dec, start)
+        mean_dec = np.add.reduceat(dec, start) / np.diff(np.append(start, len(dec)))
+        extent_ra *= np.cos(np.radians(mean_dec))
+
+        info["extent_ra"][rows[order]] = extent_ra[group]
+        info["extent_dec"][rows[order]] = extent_dec[group]
+        info["extent_area"][rows[order]] = (extent_ra * extent_dec)[group]
+
+    def _cluster(self, candidates, info, mjd_tol):
+        """
+        Assign the candidates to clusters using the selected algorithm.
+
+        Parameters
+        ----------
+        candidates: ~np.record
+            The meta data of the single-pulse candidates, sorted by MJD.
+        info: ~np.record
+            The clustering information to fill in.
+        mjd_tol: float
+            The MJD tolerance to use for matching.
+
+        Returns
+        -------
+        nclusters: int
+            The number of clusters found.
+        """
+
+        if self.algorithm == "naive":
+            nclusters = self._cluster_naive(candidates, info, mjd_tol)
+        else:
+            nclusters = self._cluster_sweep(candidates, info, mjd_tol)
+
+        return nclusters
+
+    def _cluster_parallel(self, candidates, info, mjd_tol):
+        """
+        Assign the candidates to clusters using multiple processes.
+
+        Two candidates further apart than the MJD tolerance can never share a
+        cluster, so the candidates split into independent segments at every
+        such gap. We cluster the segments in a process pool and number the
+        clusters in order of the segments, which gives the serial result.
+
+        Parameters
+        ----------
+        candidates: ~np.record
+            The meta data of the single-pulse candidates, sorted by MJD.
+        info: ~np.record
+            The clustering information to fill in.
+        mjd_tol: float
+            The MJD tolerance to use for matching.
+
+        Returns
+        -------
+        nclusters: int
+            The number of clusters found.
+        """
+
+        # the segment boundaries
+        gaps = np.flatnonzero(np.diff(candidates["mjd"]) > mjd_tol) + 1
+
+        # combine the segments into a few similarly sized parts per process
+        nparts = min(4 * self.nproc, len(gaps) + 1)
+        targets = np.linspace(0, len(candidates), nparts + 1)[1:-1]
+        bounds = np.unique(gaps[np.searchsorted(gaps, targets).clip(0, len(gaps) - 1)])
+        bounds = np.concatenate(([0], bounds, [len(candidates)])).astype(int)
+        bounds = np.unique(bounds)
+
+        self.__log.info(
+            "Clustering {0} segments in {1} parts using {2} processes.".format(
+                len(gaps) + 1, len(bounds) - 1, self.nproc
+            )
+        )
+
+        params = [
+            self.time_thresh,
+            self.dm_thresh,
+            self.algorithm,
+            1,
+            self.beam_thresh,
+        ]
+        tasks = [
+            candidates[lo:hi] for lo, hi in zip(bounds[:-1], bounds[1:]) if hi > lo
+        ]
+
+        with ProcessPoolExecutor(max_workers=self.nproc) as executor:
+            results = executor.map(
+                _cluster_part, [params] * len(tasks), tasks, [mjd_tol] * len(tasks)
+            )
+
+            nclusters = 0
+            lo = 0
+
+            for part_info, part_nclusters in results:
+                hi = lo + len(part_info)
+
+                part_info["cluster_id"] += nclusters
+                info[lo:hi] = part_info
+
+                nclusters += part_nclusters
+                lo = hi
+
+        return nclusters
+
+    def _cluster_naive(self, candidates, info, mjd_tol):
+        """
+        Assign the candidates to clusters by comparing each with all others.
+
+        The runtime of this algorithm scales roughly as n^1.6 with the number
+        of candidates.
+
+        Parameters
+        ----------
+        candidates: ~np.record
+            The meta data of the single-pulse candidates, sorted by MJD.
+        info: ~np.record
+            The clustering information to fill in.
+        mjd_tol: float
+            The MJD tolerance to use for matching.
+
+        Returns
+        -------
+        nclusters: int
+            The number of clusters found.
+        """
+
+        if self.beam_thresh is not None:
+            beam_ids, neighbours = self._get_beam_neighbours(candidates)
+
         cluster_id = 0
 
         for i in range(len(candidates)):
@@ -172,6 +622,11 @@ class Clusterer(object):
                 np.abs(candidates["dm"] - cand["dm"]) / cand["dm"] <= self.dm_thresh,
             )
 
+            if self.beam_thresh is not None:
+                mask_in_box = np.logical_and(
+                    mask_in_box, np.isin(beam_ids, list(neighbours[beam_ids[i]]))
+                )
+
             mask_not_processed = np.logical_not(info["processed"])
 
             mask = np.logical_and(mask_in_box, mask_not_processed)
@@ -201,59 +656,941 @@ class Clusterer(object):
 
             cluster_id += 1
 
-        # sanity checks
-        # 1) candidate indices must be unique
-        if not len(info["index"]) == len(np.unique(info["index"])):
-            raise RuntimeError("The candidate indices are not not unique.")
+        if self.beam_thresh is not None:
+            self._fill_extent(candidates, info, np.flatnonzero(info["processed"]))
 
-        # 2) the number of cluster heads must match
-        if not len(info[info["is_head"]]) == len(np.unique(info["head"])):
-            raise RuntimeError("The number of cluster heads is incorrect.")
+        return cluster_id
 
-        # 3) check that all candidates have been processed
-        if not np.all(info["processed"]):
-            raise RuntimeError("Not all candidates have been processed.")
+    def _get_sweep_context(self, candidates, mjd_tol, context=None):
+        """
+        Work out the search windows and other data for the sort-and-sweep
+        algorithm.
 
-        # output sifting statistics
-        mask = info["is_head"]
+        Parameters
+        ----------
+        candidates: ~np.record
+            The meta data of the single-pulse candidates, sorted by MJD.
+        mjd_tol: float
+            The MJD tolerance to use for matching.
+        context: dict (default: None)
+            The context for the same candidates but a different MJD tolerance.
+            Everything but the search windows is reused.
 
-        self.__log.info("Total candidates: {0}".format(len(candidates)))
-        if len(candidates) > 0:
-            self.__log.info(
-                "Cluster heads: {0} ({1:.2f})".format(
-                    len(candidates[mask]),
-                    100 * len(candidates[mask]) / float(len(candidates)),
-                )
-            )
+        Returns
+        -------
+        context: dict
+            The search windows and the candidate data as lists.
+        """
 
-            self.__log.info("Clusters: {0}".format(np.max(info["cluster_id"]) + 1))
+        mjd = candidates["mjd"]
+        dm = candidates["dm"]
 
-            for field in ["members", "beams"]:
-                self.__log.info(
-                    "{0} (min, mean, median, max): {1}, {2}, {3}, {4}".format(
-                        field.capitalize(),
-                        np.min(info[field]),
-                        np.mean(info[field]),
-                        np.median(info[field]),
-                        np.max(info[field]),
-                    )
-                )
+        if context is None:
+            context = {
+                "mjd": mjd.tolist(),
+                "dm": dm.tolist(),
+                # the pure python path does not handle nans or zero dms
+                "clean": np.all(np.isfinite(mjd))
+                and np.all(np.isfinite(dm))
+                and np.all(dm > 0),
+            }
 
-        # display some debug output
-        for item, cand in zip(info, candidates):
-            self.__log.debug(
-                "{0}, {1}, {2}, {3}, {4}, {5}, {6}, {7}, {8}".format(
-                    item["index"],
-                    item["cluster_id"],
-                    item["is_head"],
-                    item["members"],
-                    item["beams"],
-                    item["head"],
-                    cand["mjd"],
-                    cand["dm"],
-                    cand["snr"],
-                )
-            )
+            if self.beam_thresh is not None:
+                beam_ids, neighbours = self._get_beam_neighbours(candidates)
+                context["beam_ids"] = beam_ids
+                context["beam_ids_l"] = beam_ids.tolist()
+                context["neighbours"] = neighbours
+
+        else:
+            context = dict(context)
+
+        mjd_pad = self._get_mjd_pad(mjd, mjd_tol)
+        context["lower"] = np.searchsorted(mjd, mjd - mjd_pad, side="left").tolist()
+        context["upper"] = np.searchsorted(mjd, mjd + mjd_pad, side="right").tolist()
+
+        return context
+
+    def _cluster_sweep(
+        self, candidates, info, mjd_tol, stop=None, cluster_id=0, context=None
+    ):
+        """
+        Assign the candidates to clusters using a sort-and-sweep approach.
+
+        As the candidates are sorted by MJD, only those within the MJD
+        tolerance of a candidate can be in its matching box. We look them up
+        using a binary search and compare with those only. The matching
+        criteria are evaluated exactly as in the naive algorithm, which yields
+        identical output, but the runtime scales roughly as n log n.
+
+        Parameters
+        ----------
+        candidates: ~np.record
+            The meta data of the single-pulse candidates, sorted by MJD.
+        info: ~np.record
+            The clustering information to fill in. Candidates that are marked
+            as processed already are not assigned again.
+        mjd_tol: float
+            The MJD tolerance to use for matching.
+        stop: int (default: None)
+            Only start new clusters at candidates before this position. All
+            by default.
+        cluster_id: int (default: 0)
+            The ID of the first new cluster.
+        context: dict (default: None)
+            The search windows and other data for the candidates. Worked out
+            if not given.
+
+        Returns
+        -------
+        cluster_id: int
+            The ID of the next cluster, i.e. the number of clusters found if
+            starting from zero.
+        """
+
+        # search windows up to this size are handled in pure python, which is
+        # faster than numpy for a handful of elements
+        small_window = 16
+
+        mjd = candidates["mjd"]
+        dm = candidates["dm"]
+        dm_thresh = self.dm_thresh
+
+        if stop is None:
+            stop = len(candidates)
+
+        # a byte array is fast to access from python, the numpy view of it
+        # shares its memory
+        processed = bytearray(info["processed"].tobytes())
+        processed_np = np.frombuffer(processed, dtype=bool)
+
+        if context is None:
+            context = self._get_sweep_context(candidates, mjd_tol)
+
+        clean = context["clean"]
+        mjd_l = context["mjd"]
+        dm_l = context["dm"]
+        lower_l = context["lower"]
+        upper_l = context["upper"]
+
+        # restrict the matches to spatially adjacent beams
+        spatial = self.beam_thresh is not None
+
+        if spatial:
+            beam_ids = context["beam_ids"]
+            beam_ids_l = context["beam_ids_l"]
+            neighbours = context["neighbours"]
+
+        # collect the cluster members, fill them in at the end
+        positions = []
+        sizes = []
+
+        for i in range(stop):
+            # check if the candidate was already processed
+            if processed[i]:
+                continue
+
+            lo = lower_l[i]
+            hi = upper_l[i]
+
+            if clean and hi - lo <= small_window:
+                mjd_i = mjd_l[i]
+                dm_i = dm_l[i]
+
+                idx = [
+                    j
+                    for j in range(lo, hi)
+                    if not processed[j]
+                    and abs(mjd_l[j] - mjd_i) <= mjd_tol
+                    and abs(dm_l[j] - dm_i) / dm_i <= dm_thresh
+                ]
+
+                if spatial:
+                    near = neighbours[beam_ids_l[i]]
+                    idx = [j for j in idx if beam_ids_l[j] in near]
+
+            else:
+                mask = np.abs(mjd[lo:hi] - mjd[i]) <= mjd_tol
+                mask &= np.abs(dm[lo:hi] - dm[i]) / dm[i] <= dm_thresh
+                mask &= np.logical_not(processed_np[lo:hi])
+
+                if spatial:
+                    near = list(neighbours[beam_ids_l[i]])
+                    mask &= np.isin(beam_ids[lo:hi], near)
+
+                idx = (lo + np.flatnonzero(mask)).tolist()
+
+            # skip further in the candidates
+            if len(idx) == 0:
+                self.__log.info("No members found.")
+                continue
+
+            for j in idx:
+                processed[j] = True
+
+            positions.extend(idx)
+            sizes.append(len(idx))
+
+        # fill in all members
+        positions = np.array(positions, dtype=int)
+        nclusters = len(sizes)
+
+        info["cluster_id"][positions] = cluster_id + np.repeat(
+            np.arange(nclusters), sizes
+        )
+        info["processed"] = processed_np
+
+        # the cluster heads, members and beams
+        self._fill_cluster_info(candidates, info, positions)
+
+        return cluster_id + nclusters
+
+    def _get_groups(self, keys):
+        """
+        Group elements by their keys.
+
+        Parameters
+        ----------
+        keys: ~np.array
+            The key of each element.
+
+        Returns
+        -------
+        order: ~np.array of int
+            The elements in order of their keys. The order of elements with
+            the same key is kept.
+        start: ~np.array of int
+            The start of each group in the sorted elements.
+        group: ~np.array of int
+            The group number of each sorted element.
+        """
+
+        order = np.argsort(keys, kind="stable")
+        is_start = np.ones(len(keys), dtype=bool)
+        is_start[1:] = keys[order][1:] != keys[order][:-1]
+
+        start = np.flatnonzero(is_start)
+        group = np.cumsum(is_start) - 1
+
+        return order, start, group
+
+    def _fill_cluster_info(self, candidates, info, rows=None):
+        """
+        Work out the cluster heads, members and beams from the cluster IDs.
+
+        The cluster head is the candidate with the highest S/N. Ties are
+        broken exactly like sorting the cluster members by S/N does.
+
+        Parameters
+        ----------
+        candidates: ~np.record
+            The meta data of the single-pulse candidates.
+        info: ~np.record
+            The clustering information with the cluster IDs filled in. The
+            other fields are filled in.
+        rows: ~np.array of int (default: None)
+            The positions of all members of the clusters to work on. All
+            by default.
+        """
+
+        if rows is None:
+            rows = np.arange(len(info))
+
+        if len(rows) == 0:
+            return
+
+        cluster_id = info["cluster_id"][rows]
+        snr = candidates["snr"][rows]
+
+        # sort by cluster, then by snr within each cluster
+        order = np.lexsort((snr, cluster_id))
+        _, start, group = self._get_groups(cluster_id[order])
+        end = np.append(start[1:], len(order))
+
+        # the cluster heads are the last in each cluster
+        heads = order[end - 1]
+
+        # break ties exactly like sorting the members by snr does
+        sorted_snr = snr[order]
+        top = sorted_snr[end - 1][group]
+        is_top = np.logical_or(
+            sorted_snr == top, np.logical_and(np.isnan(sorted_snr), np.isnan(top))
+        )
+        ntop = np.add.reduceat(is_top.astype(int), start)
+
+        for i in np.flatnonzero(ntop > 1):
+            tied = order[start[i] : end[i]][is_top[start[i] : end[i]]]
+            heads[i] = tied[np.argsort(candidates[rows[tied]], order="snr")[-1]]
+
+        # count the distinct beams in each cluster
+        beam = candidates["beam"][rows][order]
+        beam_order = np.lexsort((beam, group))
+        new_beam = np.ones(len(order), dtype=bool)
+        new_beam[1:] = np.logical_or(
+            group[beam_order][1:] != group[beam_order][:-1],
+            beam[beam_order][1:] != beam[beam_order][:-1],
+        )
+        beams = np.add.reduceat(new_beam.astype(int), start)
+
+        members = rows[order]
+        info["head"][members] = info["index"][rows[heads]][group]
+        info["is_head"][members] = False
+        info["is_head"][rows[heads]] = True
+        info["members"][members] = (end - start)[group]
+        info["beams"][members] = beams[group]
+
+        if self.beam_thresh is not None:
+            self._fill_extent(candidates, info, rows)
+
+    def _get_summary(self, candidates, info):
+        """
+        Work out the properties of each cluster.
+
+        Parameters
+        ----------
+        candidates: ~np.record
+            The meta data of the single-pulse candidates.
+        info: ~np.record
+            The clustering information.
+
+        Returns
+        -------
+        summary: ~np.record
+            The properties of each cluster, in order of cluster ID. The
+            centroids are weighted by S/N.
+        """
+
+        dtype = [
+            ("cluster_id", int),
+            ("head", int),
+            ("members", int),
+            ("beams", int),
+            ("snr_max", float),
+            ("mjd_min", float),
+            ("mjd_max", float),
+            ("mjd_centroid", float),
+            ("dm_min", float),
+            ("dm_max", float),
+            ("dm_centroid", float),
+            ("width_min", float),
+            ("width_max", float),
+        ]
+
+        if self.beam_thresh is not None:
+            dtype += [
+                ("extent_ra", float),
+                ("extent_dec", float),
+                ("extent_area", float),
+            ]
+
+        if len(info) == 0:
+            return np.zeros(0, dtype=dtype)
+
+        order, start, group = self._get_groups(info["cluster_id"])
+
+        summary = np.zeros(len(start), dtype=dtype)
+
+        # per-cluster fields are the same for all members
+        for field in ["cluster_id", "head", "members", "beams"]:
+            summary[field] = info[field][order][start]
+
+        if self.beam_thresh is not None:
+            for field in ["extent_ra", "extent_dec", "extent_area"]:
+                summary[field] = info[field][order][start]
+
+        snr = candidates["snr"][order]
+        weight = np.add.reduceat(snr, start)
+        summary["snr_max"] = np.maximum.reduceat(snr, start)
+
+        for field in ["mjd", "dm", "width"]:
+            if field not in candidates.dtype.names:
+                for item in ["min", "max", "centroid"]:
+                    if "{0}_{1}".format(field, item) in summary.dtype.names:
+                        summary["{0}_{1}".format(field, item)] = np.nan
+                continue
+
+            data = candidates[field][order]
+            summary["{0}_min".format(field)] = np.minimum.reduceat(data, start)
+            summary["{0}_max".format(field)] = np.maximum.reduceat(data, start)
+
+            if "{0}_centroid".format(field) in summary.dtype.names:
+                # relative to the minimum for numerical precision
+                offset = data - summary["{0}_min".format(field)][group]
+                summary["{0}_centroid".format(field)] = (
+                    summary["{0}_min".format(field)]
+                    + np.add.reduceat(snr * offset, start) / weight
+                )
+
+        return summary
+
+    def match_candidates(self, t_candidates, return_summary=False):
+        """
+        Match candidates based on MJD and DM.
+
+        This function implements a simplistic multi-beam sifter. The
+        candidates are processed in order of MJD. Each candidate that is not
+        yet part of a cluster forms a new one with all unassigned candidates in
+        its matching box. The candidate with the highest S/N is the cluster
+        head.
+
+        Parameters
+        ----------
+        t_candidates: ~np.record
+            The meta data of the single-pulse candidates.
+        return_summary: bool (default: False)
+            Whether to return a summary of the clusters too.
+
+        Returns
+        -------
+        info: ~np.record
+            Information about the matching.
+        summary: ~np.record
+            The properties of each cluster, i.e. its head, members, beams, the
+            ranges in MJD, DM and width, the maximum S/N and the S/N-weighted
+            centroids. Only returned if `return_summary` is set.
+
+        Raises
+        ------
+        RuntimeError
+            On errors.
+        """
+
+        candidates = np.copy(t_candidates)
+
+        mjd_tol = self._get_mjd_tol()
+        self.__log.info("Time tolerance: {0:.2f} ms".format(self.time_thresh))
+        self.__log.info("MJD tolerance: {0:.10f}".format(mjd_tol))
+        self.__log.info("DM tolerance: {0:.2f} %".format(100 * self.dm_thresh))
+
+        candidates = np.sort(candidates, order=["mjd", "dm", "snr"])
+
+        info = self._get_info(candidates)
+
+        if self.nproc > 1:
+            self._cluster_parallel(candidates, info, mjd_tol)
+        else:
+            self._cluster(candidates, info, mjd_tol)
+
+        # sanity checks
+        # 1) candidate indices must be unique
+        if not len(info["index"]) == len(np.unique(info["index"])):
+            raise RuntimeError("The candidate indices are not not unique.")
+
+        # 2) the number of cluster heads must match
+        if not len(info[info["is_head"]]) == len(np.unique(info["head"])):
+            raise RuntimeError("The number of cluster heads is incorrect.")
+
+        # 3) check that all candidates have been processed
+        if not np.all(info["processed"]):
+            raise RuntimeError("Not all candidates have been processed.")
+
+        # output sifting statistics
+        mask = info["is_head"]
+
+        self.__log.info("Total candidates: {0}".format(len(candidates)))
+        if len(candidates) > 0:
+            self.__log.info(
+                "Cluster heads: {0} ({1:.2f})".format(
+                    len(candidates[mask]),
+                    100 * len(candidates[mask]) / float(len(candidates)),
+                )
+            )
+
+            self.__log.info("Clusters: {0}".format(np.max(info["cluster_id"]) + 1))
+
+            for field in ["members", "beams"]:
+                self.__log.info(
+                    "{0} (min, mean, median, max): {1}, {2}, {3}, {4}".format(
+                        field.capitalize(),
+                        np.min(info[field]),
+                        np.mean(info[field]),
+                        np.median(info[field]),
+                        np.max(info[field]),
+                    )
+                )
+
+        # display some debug output, formatting it is expensive
+        if self.__log.isEnabledFor(logging.DEBUG):
+            for item, cand in zip(info, candidates):
+                self.__log.debug(
+                    "{0}, {1}, {2}, {3}, {4}, {5}, {6}, {7}, {8}".format(
+                        item["index"],
+                        item["cluster_id"],
+                        item["is_head"],
+                        item["members"],
+                        item["beams"],
+                        item["head"],
+                        cand["mjd"],
+                        cand["dm"],
+                        cand["snr"],
+                    )
+                )
+
+        if return_summary:
+            summary = self._get_summary(candidates, info)
+
+        info = np.sort(info, order="index")
+
+        if return_summary:
+            return info, summary
+        else:
+            return info
+
+    def _get_grid_dtype(self):
+        """
+        Get the data type of the clustering statistics for a grid of
+        thresholds.
+
+        Returns
+        -------
+        dtype: list
+            The data type.
+        """
+
+        dtype = [
+            ("time_thresh", float),
+            ("dm_thresh", float),
+            ("candidates", int),
+            ("heads", int),
+            ("reduction", float),
+            ("size_median", float),
+            ("size_p90", float),
+            ("size_max", int),
+            ("singles", float),
+            ("beams_mean", float),
+        ]
+
+        return dtype
+
+    def _cluster_grid(self, candidates, settings):
+        """
+        Cluster the candidates for a grid of thresholds.
+
+        The search windows are worked out once for each time threshold and
+        shared between all DM thresholds.
+
+        Parameters
+        ----------
+        candidates: ~np.record
+            The meta data of the single-pulse candidates, sorted by MJD.
+        settings: list of tuple
+            The time and DM thresholds to use.
+
+        Returns
+        -------
+        stats: list of tuple
+            The clustering statistics for each setting.
+        """
+
+        stats = []
+        context = None
+        context_time = None
+
+        for time_thresh, dm_thresh in settings:
+            clust = Clusterer(
+                time_thresh,
+                dm_thresh,
+                algorithm="sweep",
+                nproc=1,
+                beam_thresh=self.beam_thresh,
+            )
+
+            mjd_tol = clust._get_mjd_tol()
+
+            if time_thresh != context_time:
+                context = self._get_sweep_context(candidates, mjd_tol, context)
+                context_time = time_thresh
+
+            info = clust._get_info(candidates)
+            clust._cluster_sweep(candidates, info, mjd_tol, context=context)
+
+            sizes = info["members"][info["is_head"]]
+            beams = info["beams"][info["is_head"]]
+
+            if len(sizes) > 0:
+                item = (
+                    time_thresh,
+                    dm_thresh,
+                    len(candidates),
+                    len(sizes),
+                    len(candidates) / float(len(sizes)),
+                    np.median(sizes),
+                    np.percentile(sizes, 90),
+                    np.max(sizes),
+                    np.count_nonzero(sizes == 1) / float(len(sizes)),
+                    np.mean(beams),
+                )
+            else:
+                nan = np.nan
+                item = (time_thresh, dm_thresh, 0, 0, nan, nan, nan, 0, nan, nan)
+
+            stats.append(item)
+
+            self.__log.info(
+                "Time: {0:.2f} ms, DM: {1:.2f} %, heads: {2}".format(
+                    time_thresh, 100 * dm_thresh, len(sizes)
+                )
+            )
+
+        return stats
+
+    def match_candidates_grid(self, t_candidates, time_threshs, dm_threshs):
+        """
+        Match candidates based on MJD and DM for a grid of thresholds.
+
+        The candidates are sorted once and clustered for each combination of
+        time and DM threshold using the sort-and-sweep algorithm. The search
+        windows are shared between all DM thresholds. The clustering is
+        identical to that of `match_candidates` with the same thresholds. The
+        settings are spread over `nproc` processes.
+
+        Parameters
+        ----------
+        t_candidates: ~np.record
+            The meta data of the single-pulse candidates.
+        time_threshs: list of float
+            The widths of the matching box in ms.
+        dm_threshs: list of float
+            The fractional DM tolerances to use for matching.
+
+        Returns
+        -------
+        stats: ~np.record
+            The clustering statistics for each combination of thresholds,
+            i.e. the number of cluster heads, the reduction ratio, which is
+            the mean cluster size, the distribution of cluster sizes, the
+            fraction of single-member clusters and the mean number of beams per
+            cluster.
+
+        Raises
+        ------
+        RuntimeError
+            If a threshold is invalid.
+        """
+
+        for time_thresh in time_threshs:
+            if not (type(time_thresh) == float and time_thresh > 0):
+                raise RuntimeError("Time threshold is invalid: {0}".format(time_thresh))
+
+        for dm_thresh in dm_threshs:
+            if not (type(dm_thresh) == float and dm_thresh > 0):
+                raise RuntimeError("DM threshold is invalid: {0}".format(dm_thresh))
+
+        candidates = np.sort(np.asarray(t_candidates), order=["mjd", "dm", "snr"])
+
+        # grouped by time threshold, the search windows are worked out once for
+        # each time threshold and shared between its DM thresholds
+        settings = [
+            (time_thresh, dm_thresh)
+            for time_thresh in sorted(set(time_threshs), reverse=True)
+            for dm_thresh in sorted(set(dm_threshs))
+        ]
+
+        self.__log.info(
+            "Clustering {0} candidates for {1} settings.".format(
+                len(candidates), len(settings)
+            )
+        )
+
+        if self.nproc > 1 and len(settings) > 1:
+            # keep settings with the same time threshold together
+            parts = [
+                part.tolist()
+                for part in np.array_split(
+                    np.array(settings, dtype=object), min(self.nproc, len(settings))
+                )
+            ]
+            params = [self.time_thresh, self.dm_thresh, "sweep", 1, self.beam_thresh]
+
+            with ProcessPoolExecutor(max_workers=self.nproc) as executor:
+                results = executor.map(
+                    _cluster_grid_part,
+                    [params] * len(parts),
+                    [candidates] * len(parts),
+                    [[tuple(item) for item in part] for part in parts],
+                )
+
+                stats = [item for result in results for item in result]
+
+        else:
+            stats = self._cluster_grid(candidates, settings)
+
+        stats = np.array(stats, dtype=self._get_grid_dtype())
+
+        return stats
+
+    def match_candidates_stream(self, chunks):
+        """
+        Match candidates based on MJD and DM, one chunk of candidates at a time.
+
+        This is the streaming version of `match_candidates`, which clusters
+        with a fixed memory ceiling. Only the candidates in the currently open
+        time window are carried over between chunks. The clustering
+        information for the other candidates is final and is handed back as
+        soon as possible. It is identical to that of `match_candidates` on
+        all candidates at once. The sort-and-sweep algorithm is always used.
+
+        Parameters
+        ----------
+        chunks: iterable of ~np.record
+            The meta data of the single-pulse candidates in chunks. The chunks
+            must be in order of MJD, i.e. no candidate may have a lower MJD
+            than any in a previous chunk. The candidate indices must be unique
+            across all chunks.
+
+        Yields
+        ------
+        info: ~np.record
+            Information about the matching of the candidates that are done,
+            in order of MJD.
+
+        Raises
+        ------
+        RuntimeError
+            On errors.
+        """
+
+        mjd_tol = self._get_mjd_tol()
+        self.__log.info("Time tolerance: {0:.2f} ms".format(self.time_thresh))
+        self.__log.info("MJD tolerance: {0:.10f}".format(mjd_tol))
+        self.__log.info("DM tolerance: {0:.2f} %".format(100 * self.dm_thresh))
+
+        candidates = None
+        info = None
+        cluster_id = 0
+        last_mjd = -np.inf
+        ncands = 0
+        nheads = 0
+
+        for chunk in chunks:
+            chunk = np.asarray(chunk)
+
+            if len(chunk) == 0:
+                continue
+
+            if np.min(chunk["mjd"]) < last_mjd:
+                raise RuntimeError("The candidate chunks are not in order of MJD.")
+
+            last_mjd = np.max(chunk["mjd"])
+            ncands += len(chunk)
+
+            # add the chunk to the candidates carried over
+            if candidates is None:
+                candidates = np.copy(chunk)
+                info = self._get_info(candidates)
+            else:
+                candidates = np.concatenate((candidates, chunk))
+                info = np.concatenate((info, self._get_info(chunk)))
+
+            order = np.argsort(candidates, order=["mjd", "dm", "snr"])
+            candidates = candidates[order]
+            info = info[order]
+
+            # later chunks cannot fall into the matching box of candidates
+            # that are further than the search window from the last mjd
+            mjd_pad = self._get_mjd_pad(candidates["mjd"], mjd_tol)
+            stop = np.searchsorted(candidates["mjd"], last_mjd - 2 * mjd_pad)
+
+            cluster_id = self._cluster_sweep(
+                candidates, info, mjd_tol, stop=stop, cluster_id=cluster_id
+            )
+
+            done = info[:stop]
+            candidates = candidates[stop:]
+            info = info[stop:]
+
+            if len(done) > 0:
+                if not np.all(done["processed"]):
+                    raise RuntimeError("Not all candidates have been processed.")
+
+                nheads += np.count_nonzero(done["is_head"])
+                yield done
+
+        # flush the remaining candidates
+        if candidates is not None and len(candidates) > 0:
+            cluster_id = self._cluster_sweep(
+                candidates, info, mjd_tol, cluster_id=cluster_id
+            )
+
+            if not np.all(info["processed"]):
+                raise RuntimeError("Not all candidates have been processed.")
+
+            nheads += np.count_nonzero(info["is_head"])
+            yield info
+
+        # output sifting statistics
+        self.__log.info("Total candidates: {0}".format(ncands))
+        if ncands > 0:
+            self.__log.info(
+                "Cluster heads: {0} ({1:.2f})".format(nheads, 100 * nheads / ncands)
+            )
+            self.__log.info("Clusters: {0}".format(cluster_id))
+
+    def extend_clusters(self, t_candidates, t_existing, cluster_id=0):
+        """
+        Match new candidates against existing clusters.
+
+        This allows us to add candidates to a clustering incrementally,
+        without re-running it on all candidates. A new candidate joins an
+        existing cluster, if it is within the matching box of each member, i.e.
+        of both ends of the cluster's extent in MJD and DM. The clusters thus
+        stay at most twice the time tolerance wide, as in a full clustering,
+        and do not grow with each incremental run. If a beam threshold is set,
+        the cluster must also have a member in a spatially adjacent beam. If it
+        matches several clusters, it joins the one with the lowest ID. The
+        remaining new candidates are clustered amongst themselves.
+
+        Parameters
+        ----------
+        t_candidates: ~np.record
+            The meta data of the new single-pulse candidates.
+        t_existing: ~np.record
+            The meta data of all members of the existing clusters that the
+            new candidates might join, including their `cluster_id`.
+        cluster_id: int (default: 0)
+            The ID of the first new cluster. It must be larger than any
+            existing cluster ID.
+
+        Returns
+        -------
+        info: ~np.record
+            Information about the matching of the new candidates and the
+            members of all existing clusters that gained new members.
+
+        Raises
+        ------
+        RuntimeError
+            On errors.
+        """
+
+        fields = ["index", "mjd", "dm", "snr", "beam"]
+
+        if self.beam_thresh is not None:
+            fields += ["ra", "dec"]
+
+        dtype = [(field, t_candidates.dtype[field]) for field in fields]
+
+        candidates = np.zeros(len(t_candidates), dtype=dtype)
+        existing = np.zeros(len(t_existing), dtype=dtype)
+
+        for field in fields:
+            candidates[field] = t_candidates[field]
+            existing[field] = t_existing[field]
+
+        existing_id = np.array(t_existing["cluster_id"], dtype=int)
+
+        if len(existing_id) > 0 and np.max(existing_id) >= cluster_id:
+            raise RuntimeError("The new cluster IDs overlap the existing ones.")
+
+        mjd_tol = self._get_mjd_tol()
+
+        candidates = np.sort(candidates, order=["mjd", "dm", "snr"])
+        info = self._get_info(candidates)
+
+        # 1) extent of the existing clusters
+        clusters, inverse = np.unique(existing_id, return_inverse=True)
+        order = np.argsort(inverse, kind="stable")
+        start = np.flatnonzero(np.diff(inverse[order], prepend=-1))
+
+        mjd_min = np.minimum.reduceat(existing["mjd"][order], start)
+        mjd_max = np.maximum.reduceat(existing["mjd"][order], start)
+        dm_min = np.minimum.reduceat(existing["dm"][order], start)
+        dm_max = np.maximum.reduceat(existing["dm"][order], start)
+
+        # 2) find the matching clusters of each new candidate
+        # the clusters in order of their start mjd, which must be within the
+        # mjd tolerance of a new candidate that joins them
+        corder = np.argsort(mjd_min, kind="stable")
+
+        mjd = candidates["mjd"]
+        dm = candidates["dm"]
+        mjd_pad = self._get_mjd_pad(mjd, mjd_tol)
+
+        lower = np.searchsorted(mjd_min[corder], mjd - mjd_pad, "left")
+        upper = np.searchsorted(mjd_min[corder], mjd + mjd_pad, "right")
+
+        # all pairs of new candidates and clusters in their search windows
+        counts = upper - lower
+        pair_cand = np.repeat(np.arange(len(candidates)), counts)
+        offsets = np.cumsum(counts) - counts
+        pair_clust = corder[
+            lower[pair_cand] + np.arange(len(pair_cand)) - offsets[pair_cand]
+        ]
+
+        # the members farthest away in mjd and dm are at the ends of the extent
+        pair_mjd = mjd[pair_cand]
+        pair_dm = dm[pair_cand]
+
+        mask = np.abs(pair_mjd - mjd_min[pair_clust]) <= mjd_tol
+        mask &= np.abs(pair_mjd - mjd_max[pair_clust]) <= mjd_tol
+        mask &= (
+            np.abs(pair_dm - dm_min[pair_clust]) / dm_min[pair_clust] <= self.dm_thresh
+        )
+        mask &= (
+            np.abs(pair_dm - dm_max[pair_clust]) / dm_max[pair_clust] <= self.dm_thresh
+        )
+
+        # restrict the matches to clusters with a member in an adjacent beam
+        idx = np.flatnonzero(mask)
+
+        if self.beam_thresh is not None and len(idx) > 0:
+            beam_ids, neighbours = self._get_beam_neighbours(
+                np.concatenate((candidates, existing))
+            )
+            cand_beams = beam_ids[: len(candidates)].tolist()
+
+            cluster_beams = [set() for _ in range(len(clusters))]
+
+            for i, beam_id in zip(
+                inverse.tolist(), beam_ids[len(candidates) :].tolist()
+            ):
+                cluster_beams[i].add(beam_id)
+
+            mask[idx] = [
+                not neighbours[cand_beams[i]].isdisjoint(cluster_beams[j])
+                for i, j in zip(pair_cand[idx].tolist(), pair_clust[idx].tolist())
+            ]
+
+        # join the matching cluster with the lowest id
+        joined = np.full(len(candidates), len(clusters))
+        np.minimum.at(joined, pair_cand[mask], pair_clust[mask])
+        is_joined = joined < len(clusters)
+
+        info["cluster_id"][is_joined] = clusters[joined[is_joined]]
+        info["processed"][is_joined] = True
+
+        self.__log.info(
+            "New candidates joining existing clusters: {0}".format(
+                np.count_nonzero(is_joined)
+            )
+        )
+
+        # 3) cluster the remaining new candidates amongst themselves
+        rest = np.logical_not(is_joined)
+        rest_info = info[rest]
+
+        self._cluster_sweep(candidates[rest], rest_info, mjd_tol, cluster_id=cluster_id)
+        info[rest] = rest_info
+
+        # 4) work out the properties of all clusters that changed
+        changed = np.isin(existing_id, info["cluster_id"][is_joined])
+
+        members = np.concatenate((candidates[is_joined], existing[changed]))
+        members_info = np.concatenate(
+            (info[is_joined], self._get_info(existing[changed]))
+        )
+        members_info["cluster_id"][np.count_nonzero(is_joined) :] = existing_id[changed]
+        members_info["processed"] = True
+
+        self._fill_cluster_info(members, members_info)
+
+        info = np.concatenate((info[rest], members_info))
+
+        # sanity checks
+        if not len(info["index"]) == len(np.unique(info["index"])):
+            raise RuntimeError("The candidate indices are not not unique.")
+
+        if not np.all(info["processed"]):
+            raise RuntimeError("Not all candidates have been processed.")
 
         info = np.sort(info, order="index")
 
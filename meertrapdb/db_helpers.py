@@ -70,3 +70,385 @@ def setup_db():
             db.commit()
 
     log.info("Users and databases were created successfully.")
+
+
+def get_placeholder(provider):
+    """
+    Get the query parameter placeholder of a database provider.
+
+    Parameters
+    ----------
+    provider: ~pony.orm.dbapiprovider.DBAPIProvider
+        The database provider.
+
+    Returns
+    -------
+    placeholder: str
+        The placeholder.
+
+    Raises
+    ------
+    RuntimeError
+        If the parameter style of the provider is not supported.
+    """
+
+    if provider.paramstyle == "qmark":
+        placeholder = "?"
+    elif provider.paramstyle in ["format", "pyformat"]:
+        placeholder = "%s"
+    else:
+        raise RuntimeError(
+            "Parameter style is not supported: {0}".format(provider.paramstyle)
+        )
+
+    return placeholder
+
+
+def insert_rows(database, table, columns, rows, batch_size=1000, return_ids=False):
+    """
+    Insert rows into a table using multi-row INSERT statements.
+
+    The rows are written in the transaction of the current `db_session`,
+    which is neither flushed, nor committed.
+
+    Parameters
+    ----------
+    database: ~pony.orm.Database
+        The database to write to.
+    table: str or tuple of str
+        The name of the table.
+    columns: list of str
+        The names of the columns.
+    rows: list of tuple
+        The values of the rows, ready to be passed to the database driver.
+    batch_size: int (default: 1000)
+        The maximum number of rows per statement.
+    return_ids: bool (default: False)
+        Whether to return the auto-increment IDs of the inserted rows. They
+        are stepped by the `auto_increment_increment` of MySQL.
+
+    Returns
+    -------
+    ids: list of int
+        The IDs of the inserted rows in order, if requested.
+
+    Raises
+    ------
+    RuntimeError
+        If the IDs of the inserted rows cannot be determined.
+    """
+
+    provider = database.provider
+
+    if return_ids and provider.dialect not in ["MySQL", "SQLite"]:
+        raise RuntimeError("Database is not supported: {0}".format(provider.dialect))
+
+    # stay below the maximum number of query parameters
+    batch_size = max(1, min(batch_size, provider.max_params_count // len(columns)))
+
+    row_sql = "({0})".format(", ".join([get_placeholder(provider)] * len(columns)))
+    sql_start = "INSERT INTO {0} ({1}) VALUES ".format(
+        provider.quote_name(table),
+        ", ".join(provider.quote_name(column) for column in columns),
+    )
+
+    connection = database.get_connection()
+    cursor = connection.cursor()
+
+    # the step between consecutive auto-increment ids
+    step = 1
+
+    if return_ids and provider.dialect == "MySQL":
+        # the ids of a multi-row insert are only consecutive if the
+        # auto-increment values are not interleaved with other inserts
+        cursor.execute("SELECT @@innodb_autoinc_lock_mode, @@auto_increment_increment")
+        lock_mode, step = [int(item) for item in cursor.fetchone()]
+
+        if lock_mode == 2:
+            raise RuntimeError(
+                "Auto-increment IDs are not consecutive: innodb_autoinc_lock_mode = 2"
+            )
+
+    ids = []
+
+    for i in range(0, len(rows), batch_size):
+        batch = rows[i : i + batch_size]
+
+        sql = sql_start + ", ".join([row_sql] * len(batch))
+        params = [value for row in batch for value in row]
+
+        cursor.execute(sql, params)
+
+        if return_ids:
+            # mysql reports the first, sqlite the last id of the statement
+            if provider.dialect == "MySQL":
+                first_id = cursor.lastrowid
+            else:
+                first_id = cursor.lastrowid - step * (len(batch) - 1)
+
+            ids.extend(range(first_id, first_id + step * len(batch), step))
+
+    return ids
+
+
+def insert_entities(entity, values, batch_size=1000, key=None):
+    """
+    Insert entity rows without creating the Pony objects.
+
+    Attributes that are not given are set to their defaults. Relationships
+    have to be linked separately using `insert_links`.
+
+    The primary keys are worked out from the auto-increment IDs by default. If
+    a unique key attribute is given, they are selected back by its values
+    instead, which does not depend on the auto-increment settings of the
+    database, e.g. in a Galera cluster.
+
+    Parameters
+    ----------
+    entity: ~pony.orm.core.EntityMeta
+        The entity to insert, e.g. `schema.SpsCandidate`.
+    values: dict of list
+        The values of the attributes, keyed by attribute name.
+    batch_size: int (default: 1000)
+        The maximum number of rows per statement.
+    key: str (default: None)
+        The name of a unique attribute to look up the primary keys by.
+
+    Returns
+    -------
+    ids: list of int
+        The primary keys of the inserted rows in order.
+
+    Raises
+    ------
+    RuntimeError
+        If the values do not match the entity, or if the key attribute is not
+        unique.
+    """
+
+    if key is not None:
+        key_attr = entity._adict_.get(key)
+
+        if key_attr is None or not key_attr.is_unique or key not in values:
+            raise RuntimeError("Not a unique attribute: {0}".format(key))
+
+    nrow = None
+    columns = []
+    data = []
+
+    for attr in entity._attrs_:
+        if attr.is_collection or attr.is_pk or not attr.columns:
+            continue
+
+        if attr.name in values:
+            column = values[attr.name]
+
+            if nrow is None:
+                nrow = len(column)
+            elif len(column) != nrow:
+                raise RuntimeError("Number of values differ: {0}".format(attr.name))
+
+        elif attr.default is not None:
+            default = attr.default() if callable(attr.default) else attr.default
+            column = [default]
+
+        elif attr.py_type is str and not attr.nullable:
+            column = [""]
+
+        else:
+            column = [None]
+
+        # convert to the values that the database driver expects
+        converter = attr.converters[0]
+        column = [
+            None if value is None else converter.py2sql(converter.val2dbval(value))
+            for value in column
+        ]
+
+        columns.append(attr.columns[0])
+        data.append(column)
+
+    unknown = set(values.keys()) - set(attr.name for attr in entity._attrs_)
+
+    if len(unknown) > 0:
+        raise RuntimeError("Unknown attributes: {0}".format(sorted(unknown)))
+
+    if nrow is None or nrow == 0:
+        return []
+
+    # broadcast the defaults
+    data = [column * nrow if len(column) == 1 else column for column in data]
+    rows = list(zip(*data))
+
+    ids = insert_rows(
+        entity._database_,
+        entity._table_,
+        columns,
+        rows,
+        batch_size=batch_size,
+        return_ids=key is None,
+    )
+
+    if key is not None:
+        ids = select_ids(entity, key_attr, data[columns.index(key_attr.columns[0])])
+
+    return ids
+
+
+def select_ids(entity, attr, keys, batch_size=1000):
+    """
+    Look up the primary keys of entity rows by the values of a unique attribute.
+
+    Parameters
+    ----------
+    entity: ~pony.orm.core.EntityMeta
+        The entity, e.g. `schema.SpsCandidate`.
+    attr: ~pony.orm.core.Attribute
+        The unique attribute.
+    keys: list
+        The values of the attribute, ready to be passed to the database driver.
+    batch_size: int (default: 1000)
+        The maximum number of values per statement.
+
+    Returns
+    -------
+    ids: list of int
+        The primary keys in the order of the values.
+
+    Raises
+    ------
+    RuntimeError
+        If a value is not found.
+    """
+
+    provider = entity._database_.provider
+
+    batch_size = max(1, min(batch_size, provider.max_params_count))
+
+    sql_start = "SELECT {0}, {1} FROM {2} WHERE {1} IN ".format(
+        provider.quote_name(entity._pk_columns_[0]),
+        provider.quote_name(attr.columns[0]),
+        provider.quote_name(entity._table_),
+    )
+
+    connection = entity._database_.get_connection()
+    cursor = connection.cursor()
+
+    found = {}
+
+    for i in range(0, len(keys), batch_size):
+        batch = keys[i : i + batch_size]
+
+        sql = sql_start + "({0})".format(
+            ", ".join([get_placeholder(provider)] * len(batch))
+        )
+
+        cursor.execute(sql, batch)
+        found.update((value, pk) for pk, value in cursor.fetchall())
+
+    missing = [value for value in keys if value not in found]
+
+    if len(missing) > 0:
+        raise RuntimeError("Rows not found: {0}".format(missing[:10]))
+
+    ids = [found[value] for value in keys]
+
+    return ids
+
+
+def insert_links(attr, ids, other_ids, batch_size=1000):
+    """
+    Link entity rows through a many-to-many relationship.
+
+    Parameters
+    ----------
+    attr: ~pony.orm.core.Set
+        The relationship attribute, e.g. `schema.SpsCandidate.beam`.
+    ids: list of int
+        The primary keys of the entity rows that own the attribute.
+    other_ids: list of int or int
+        The primary keys of the rows to link them to. A single key links all
+        rows to the same one.
+    batch_size: int (default: 1000)
+        The maximum number of rows per statement.
+
+    Raises
+    ------
+    RuntimeError
+        If the attribute is not a many-to-many relationship.
+    """
+
+    if getattr(attr, "table", None) is None:
+        raise RuntimeError("Not a many-to-many relationship: {0}".format(attr))
+
+    if isinstance(other_ids, int):
+        other_ids = [other_ids] * len(ids)
+
+    if len(ids) != len(other_ids):
+        raise RuntimeError(
+            "Number of IDs differ: {0}, {1}".format(len(ids), len(other_ids))
+        )
+
+    columns = [attr.reverse.columns[0], attr.columns[0]]
+    rows = list(zip(ids, other_ids))
+
+    insert_rows(
+        attr.entity._database_, attr.table, columns, rows, batch_size=batch_size
+    )
+
+
+def delete_links(attr, ids, batch_size=1000):
+    """
+    Remove the many-to-many links of entity rows.
+
+    The link rows are deleted with set-based DELETE statements in the
+    transaction of the current `db_session`, without loading the entities.
+
+    Parameters
+    ----------
+    attr: ~pony.orm.core.Set
+        The relationship attribute, e.g. `schema.SpsCandidate.known_source`.
+    ids: list of int
+        The primary keys of the entity rows that own the attribute.
+    batch_size: int (default: 1000)
+        The maximum number of rows per statement.
+
+    Returns
+    -------
+    ndeleted: int
+        The number of links removed.
+
+    Raises
+    ------
+    RuntimeError
+        If the attribute is not a many-to-many relationship.
+    """
+
+    if getattr(attr, "table", None) is None:
+        raise RuntimeError("Not a many-to-many relationship: {0}".format(attr))
+
+    provider = attr.entity._database_.provider
+
+    batch_size = max(1, min(batch_size, provider.max_params_count))
+
+    sql_start = "DELETE FROM {0} WHERE {1} IN ".format(
+        provider.quote_name(attr.table),
+        provider.quote_name(attr.reverse.columns[0]),
+    )
+
+    connection = attr.entity._database_.get_connection()
+    cursor = connection.cursor()
+
+    ndeleted = 0
+
+    for i in range(0, len(ids), batch_size):
+        batch = [int(item) for item in ids[i : i + batch_size]]
+
+        sql = sql_start + "({0})".format(
+            ", ".join([get_placeholder(provider)] * len(batch))
+        )
+
+        cursor.execute(sql, batch)
+        ndeleted += cursor.rowcount
+
+    return ndeleted
@@ -0,0 +1,810 @@
+#
+#   2020 Fabian Jankowski
+#   Candidate ingest related helper functions.
+#
+
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+import errno
+import glob
+import json
+import logging
+import os.path
+import shutil
+import sqlite3
+import threading
+import time
+
+from astropy.time import Time
+import numpy as np
+import pandas as pd
+
+
+def get_candidate_times(mjd):
+    """
+    Convert the candidate MJDs to UTC strings and fixed-point MJDs.
+
+    All candidates are converted in one go, which is much faster than doing
+    it for each candidate. The results are identical.
+
+    Parameters
+    ----------
+    mjd: ~np.array of float
+        The candidate MJDs.
+
+    Returns
+    -------
+    utc: ~np.array of str
+        The UTCs in ISO format.
+    mjd_fixed: list of ~decimal.Decimal
+        The MJDs with ten decimal places.
+    """
+
+    mjd = np.atleast_1d(np.asarray(mjd, dtype=float))
+
+    if len(mjd) == 0:
+        return np.zeros(0, dtype=str), []
+
+    utc = Time(mjd, format="mjd").iso
+    mjd_fixed = [Decimal(item) for item in np.char.mod("%.10f", mjd)]
+
+    return utc, mjd_fixed
+
+
+def get_mjd_keys(mjd):
+    """
+    Get integer keys of the candidate MJDs.
+
+    The keys are the MJDs in units of the precision with which they are stored
+    in the database, i.e. ten decimal places. Two candidates have the same key
+    if and only if their stored MJDs are the same.
+
+    Parameters
+    ----------
+    mjd: ~np.array of float or list of ~decimal.Decimal
+        The candidate MJDs.
+
+    Returns
+    -------
+    keys: ~np.array of int
+        The keys.
+    """
+
+    if len(mjd) == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    if isinstance(mjd[0], Decimal):
+        mjd_str = np.array(["{0:.10f}".format(item) for item in mjd])
+    else:
+        mjd_str = np.char.mod("%.10f", np.asarray(mjd, dtype=float))
+
+    keys = np.char.replace(mjd_str, ".", "").astype(np.int64)
+
+    return keys
+
+
+def get_duplicates(keys, existing):
+    """
+    Find the duplicate candidates.
+
+    A candidate is a duplicate if its key is already present in the database or
+    in one of the preceding candidates.
+
+    Parameters
+    ----------
+    keys: ~np.array of int
+        The keys of the candidates.
+    existing: set of int or ~np.array of int
+        The keys of the candidates that are already in the database.
+
+    Returns
+    -------
+    mask: ~np.array of bool
+        The mask of the duplicates.
+    """
+
+    keys = pd.Series(keys, dtype=np.int64)
+
+    mask = keys.isin(existing) | keys.duplicated(keep="first")
+
+    return mask.to_numpy()
+
+
+class EntityCache:
+    """
+    Cache the primary keys of the parent rows of the candidates.
+
+    The schedule block, observation, node, pipeline config and beam rows change
+    hardly ever during an ingest. They are cached by schedule block ID, by
+    observation start UTC, by observation start UTC and node number, and by
+    observation start UTC, node number, beam number and coherent flag. The
+    cache is filled lazily and is valid for one ingest run only.
+    """
+
+    kinds = ["schedule_block", "observation", "node", "pipeline_config", "beam"]
+
+    def __init__(self):
+        self.clear()
+
+    def __len__(self):
+        return sum(len(self.keys[kind]) for kind in self.kinds)
+
+    def clear(self):
+        """
+        Forget all primary keys.
+        """
+
+        self.keys = {kind: {} for kind in self.kinds}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, kind, key):
+        """
+        Look up the primary key of a row.
+
+        Parameters
+        ----------
+        kind: str
+            The kind of row, e.g. `beam`.
+        key: object
+            The key of the row.
+
+        Returns
+        -------
+        pk: int
+            The primary key or None if the row is not in the cache.
+
+        Raises
+        ------
+        RuntimeError
+            If the kind of row is unknown.
+        """
+
+        if kind not in self.kinds:
+            raise RuntimeError("Unknown kind of row: {0}".format(kind))
+
+        pk = self.keys[kind].get(key)
+
+        if pk is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+
+        return pk
+
+    def update(self, entries):
+        """
+        Add primary keys to the cache.
+
+        Parameters
+        ----------
+        entries: list of tuple
+            The kind, key and primary key of each row.
+
+        Raises
+        ------
+        RuntimeError
+            If the kind of row is unknown.
+        """
+
+        for kind, key, pk in entries:
+            if kind not in self.kinds:
+                raise RuntimeError("Unknown kind of row: {0}".format(kind))
+
+            self.keys[kind][key] = pk
+
+
+def make_dir(dirname, known_dirs=None):
+    """
+    Create a directory if it does not exist.
+
+    Parameters
+    ----------
+    dirname: str
+        The name of the directory.
+    known_dirs: set of str (default: None)
+        The directories known to exist. It is updated in place and saves the
+        checks on the filesystem for repeated calls.
+    """
+
+    if known_dirs is not None and dirname in known_dirs:
+        return
+
+    os.makedirs(dirname, exist_ok=True)
+
+    if known_dirs is not None:
+        known_dirs.add(dirname)
+
+
+def copy_file(src, dst):
+    """
+    Copy a file, sharing the data blocks where the filesystem allows it.
+
+    The data are copied in the kernel using `copy_file_range`, which creates a
+    reflink on filesystems that support it, e.g. btrfs or xfs. It falls back to
+    a normal copy otherwise.
+
+    Parameters
+    ----------
+    src: str
+        The name of the source file.
+    dst: str
+        The name of the destination file.
+    """
+
+    if hasattr(os, "copy_file_range"):
+        try:
+            with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+                size = os.fstat(fsrc.fileno()).st_size
+                copied = 0
+
+                while copied < size:
+                    nbytes = os.copy_file_range(
+                        fsrc.fileno(), fdst.fileno(), size - copied
+                    )
+
+                    if nbytes == 0:
+                        break
+
+                    copied += nbytes
+
+            if copied == size:
+                shutil.copymode(src, dst)
+                return
+
+        except OSError as err:
+            if err.errno not in [
+                errno.EINVAL,
+                errno.ENOSYS,
+                errno.EOPNOTSUPP,
+                errno.EXDEV,
+            ]:
+                raise
+
+    shutil.copy(src, dst)
+
+
+def publish_file(src, dst, link=True, devices=None):
+    """
+    Publish a file under a second name.
+
+    The file is hard linked if the source and the destination directory are on
+    the same filesystem, so that no data are written. It is copied otherwise.
+
+    Parameters
+    ----------
+    src: str
+        The name of the source file.
+    dst: str
+        The name of the destination file. An existing file is replaced.
+    link: bool (default: True)
+        Whether to hard link the file if possible.
+    devices: dict (default: None)
+        The devices of the directories seen so far. It is updated in place and
+        saves the checks on the filesystem for repeated calls.
+
+    Returns
+    -------
+    linked: bool
+        Whether the file was hard linked.
+    """
+
+    if devices is None:
+        devices = {}
+
+    if link:
+        for dirname in [os.path.dirname(src), os.path.dirname(dst)]:
+            if dirname not in devices:
+                devices[dirname] = os.stat(dirname).st_dev
+
+        link = devices[os.path.dirname(src)] == devices[os.path.dirname(dst)]
+
+    if os.path.lexists(dst):
+        os.remove(dst)
+
+    if link:
+        try:
+            os.link(src, dst)
+            return True
+        except OSError as err:
+            # e.g. bind mounts or filesystems without hard links
+            if err.errno not in [errno.EMLINK, errno.EPERM, errno.EXDEV]:
+                raise
+
+    copy_file(src, dst)
+
+    return False
+
+
+def copy_plots(plots, known_dirs=None, link=True, devices=None):
+    """
+    Copy plots to webserver.
+
+    The plots are hard linked into the webserver directory, if it is on the
+    same filesystem as the staging directory, and copied otherwise.
+
+    Parameters
+    ----------
+    plots: list of dict
+        Plot files to be copied.
+    known_dirs: set of str (default: None)
+        The output directories known to exist.
+    link: bool (default: True)
+        Whether to hard link the plots if possible.
+    devices: dict (default: None)
+        The devices of the directories seen so far.
+
+    Returns
+    -------
+    nlinked: int
+        The number of plots that were hard linked.
+
+    Raises
+    ------
+    RuntimeError
+        On errors.
+    """
+
+    log = logging.getLogger("meertrapdb.ingest_helpers")
+
+    nlinked = 0
+
+    for item in plots:
+        filename = item["staging"]
+        log.info("Copying plot: {0}".format(filename))
+
+        if not os.path.isfile(filename):
+            raise RuntimeError("Staging file does not exist: {0}".format(filename))
+
+        # publish to webserver
+        make_dir(os.path.dirname(item["webserver"]), known_dirs)
+
+        if publish_file(filename, item["webserver"], link=link, devices=devices):
+            nlinked += 1
+
+        # move to processed
+        make_dir(os.path.dirname(item["processed"]), known_dirs)
+        shutil.move(filename, item["processed"])
+
+    return nlinked
+
+
+class PlotCopier:
+    """
+    Copy plots to the webserver in the background.
+
+    The plots are copied by a pool of threads, so that the disk I/O overlaps
+    with the database inserts. Only submit plots once their candidates are
+    committed to the database.
+    """
+
+    def __init__(self, nthreads=4, max_pending=1000, link=True):
+        """
+        Parameters
+        ----------
+        nthreads: int (default: 4)
+            The number of copy threads.
+        max_pending: int (default: 1000)
+            The maximum number of plots waiting to be copied. Submitting more
+            blocks until some are done.
+        link: bool (default: True)
+            Whether to hard link the plots if possible.
+
+        Raises
+        ------
+        RuntimeError
+            If the parameters are invalid.
+        """
+
+        if not (type(nthreads) == int and nthreads > 0):
+            raise RuntimeError("Invalid number of threads: {0}".format(nthreads))
+
+        if not (type(max_pending) == int and max_pending > 0):
+            raise RuntimeError("Invalid queue length: {0}".format(max_pending))
+
+        self._executor = ThreadPoolExecutor(max_workers=nthreads)
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._known_dirs = set()
+        self._devices = {}
+        self._futures = []
+        self.link = link
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        # do not hide the original exception
+        if exc_type is None:
+            self.wait()
+        else:
+            self._executor.shutdown(wait=True)
+
+    def _copy(self, item):
+        try:
+            return copy_plots(
+                [item], self._known_dirs, link=self.link, devices=self._devices
+            )
+        finally:
+            self._slots.release()
+
+    def submit(self, plots):
+        """
+        Queue plots for copying.
+
+        Parameters
+        ----------
+        plots: list of dict
+            Plot files to be copied.
+
+        Returns
+        -------
+        futures: list of ~concurrent.futures.Future
+            The copy tasks of the plots.
+        """
+
+        futures = []
+
+        for item in plots:
+            self._slots.acquire()
+            future = self._executor.submit(self._copy, item)
+            self._futures.append((item, future))
+            futures.append(future)
+
+        return futures
+
+    def wait(self):
+        """
+        Wait until all plots are copied.
+
+        Returns
+        -------
+        ncopied: int
+            The number of plots copied.
+
+        Raises
+        ------
+        RuntimeError
+            If any of the plots could not be copied.
+        """
+
+        log = logging.getLogger("meertrapdb.ingest_helpers")
+
+        self._executor.shutdown(wait=True)
+
+        failures = []
+        nlinked = 0
+
+        for item, future in self._futures:
+            error = future.exception()
+
+            if error is not None:
+                log.error(
+                    "Could not copy plot: {0}, {1}".format(item["staging"], error)
+                )
+                failures.append(item)
+            else:
+                nlinked += future.result()
+
+        ncopied = len(self._futures) - len(failures)
+        self._futures = []
+
+        log.info("Copied {0} plots, {1} hard linked.".format(ncopied, nlinked))
+
+        if len(failures) > 0:
+            raise RuntimeError("Could not copy {0} plots.".format(len(failures)))
+
+        return ncopied
+
+
+class IngestJournal:
+    """
+    Record the ingest state of each SPCCL file in a local SQLite database.
+
+    The journal stores whether the candidates of a file were parsed and
+    inserted into the database, their number, the plots to publish, and
+    whether the plots were published and the file was moved to the processed
+    directory. This allows resuming an interrupted ingest without redoing the
+    files that are complete.
+    """
+
+    fields = ["parsed", "inserted", "ncands", "plots", "published", "moved"]
+
+    def __init__(self, filename):
+        """
+        Parameters
+        ----------
+        filename: str
+            The name of the journal file. It is created if it does not exist.
+        """
+
+        self.filename = filename
+
+        # wait for other ingest processes to finish writing
+        self._conn = sqlite3.connect(filename, timeout=60.0)
+        self._conn.row_factory = sqlite3.Row
+
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS files ("
+                "filename TEXT PRIMARY KEY, "
+                "schedule_block INTEGER NOT NULL, "
+                "parsed INTEGER NOT NULL DEFAULT 0, "
+                "inserted INTEGER NOT NULL DEFAULT 0, "
+                "ncands INTEGER, "
+                "plots TEXT, "
+                "published INTEGER NOT NULL DEFAULT 0, "
+                "moved INTEGER NOT NULL DEFAULT 0, "
+                "updated TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_files_schedule_block "
+                "ON files (schedule_block)"
+            )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        """
+        Close the journal file.
+        """
+
+        self._conn.close()
+
+    def _to_dict(self, row):
+        entry = dict(row)
+
+        for key in ["parsed", "inserted", "published", "moved"]:
+            entry[key] = bool(entry[key])
+
+        if entry["plots"] is not None:
+            entry["plots"] = json.loads(entry["plots"])
+
+        return entry
+
+    def get(self, filename):
+        """
+        Get the ingest state of a file.
+
+        Parameters
+        ----------
+        filename: str
+            The name of the SPCCL file.
+
+        Returns
+        -------
+        entry: dict
+            The ingest state or None if the file is not in the journal.
+        """
+
+        row = self._conn.execute(
+            "SELECT * FROM files WHERE filename = ?", (filename,)
+        ).fetchone()
+
+        if row is None:
+            return None
+
+        return self._to_dict(row)
+
+    def get_incomplete(self, schedule_block):
+        """
+        Get the files of a schedule block whose candidates were inserted, in
+        full or in part, but whose plots are not yet published.
+
+        Parameters
+        ----------
+        schedule_block: int
+            The schedule block ID.
+
+        Returns
+        -------
+        entries: list of dict
+            The ingest states of the files.
+        """
+
+        rows = self._conn.execute(
+            "SELECT * FROM files WHERE schedule_block = ? "
+            "AND plots IS NOT NULL AND published = 0 ORDER BY filename",
+            (schedule_block,),
+        ).fetchall()
+
+        return [self._to_dict(row) for row in rows]
+
+    def update(self, filename, schedule_block, **kwargs):
+        """
+        Update the ingest state of a file.
+
+        Parameters
+        ----------
+        filename: str
+            The name of the SPCCL file.
+        schedule_block: int
+            The schedule block ID.
+        **kwargs
+            The state fields to set, e.g. `inserted=True`.
+
+        Raises
+        ------
+        RuntimeError
+            If a field is unknown.
+        """
+
+        for key in kwargs:
+            if key not in self.fields:
+                raise RuntimeError("Unknown journal field: {0}".format(key))
+
+        if "plots" in kwargs:
+            kwargs["plots"] = json.dumps(kwargs["plots"])
+
+        keys = list(kwargs.keys())
+        values = [kwargs[key] for key in keys]
+
+        sql = (
+            "INSERT INTO files (filename, schedule_block{0}) VALUES (?, ?{1}) "
+            "ON CONFLICT (filename) DO UPDATE SET "
+            "schedule_block = excluded.schedule_block, "
+            "updated = CURRENT_TIMESTAMP{2}".format(
+                "".join(", {0}".format(key) for key in keys),
+                ", ?" * len(keys),
+                "".join(", {0} = excluded.{0}".format(key) for key in keys),
+            )
+        )
+
+        # commit straight away, so that the state survives crashes
+        with self._conn:
+            self._conn.execute(sql, [filename, schedule_block] + values)
+
+
+def is_ingest_complete(entry):
+    """
+    Check whether the ingest of an SPCCL file is complete.
+
+    Parameters
+    ----------
+    entry: dict
+        The ingest state of the file from the journal or None.
+
+    Returns
+    -------
+    complete: bool
+        Whether the candidates are in the database, their plots are published
+        and the file is moved.
+    """
+
+    if entry is None:
+        return False
+
+    complete = entry["inserted"] and entry["published"] and entry["moved"]
+
+    return complete
+
+
+class StagingScanner:
+    """
+    Watch the staging directory for new or changed SPCCL files.
+
+    A file is offered for ingest whenever its size or modification time
+    changed since it was last marked as done, i.e. whenever the pipeline has
+    appended candidates to it. Files can be offered while they are still being
+    written, so that they must be read incrementally.
+    """
+
+    def __init__(self, glob_pattern):
+        """
+        Parameters
+        ----------
+        glob_pattern: str
+            The glob pattern of the SPCCL files.
+        """
+
+        self.glob_pattern = glob_pattern
+
+        # the size and modification time of each file
+        self.pending = {}
+        self.done = {}
+
+    def scan(self):
+        """
+        Scan the staging directory.
+
+        Returns
+        -------
+        changed: list of str
+            The names of the files that are new or changed in sorted order.
+        """
+
+        pending = {}
+        done = {}
+
+        for filename in glob.glob(self.glob_pattern):
+            try:
+                info = os.stat(filename)
+            except FileNotFoundError:
+                # the file was moved in the meantime
+                continue
+
+            signature = (info.st_size, info.st_mtime)
+
+            if self.done.get(filename) == signature:
+                done[filename] = signature
+            else:
+                pending[filename] = signature
+
+        # forget the files that were moved away
+        self.pending = pending
+        self.done = done
+
+        return sorted(pending.keys())
+
+    def mark_done(self, filenames):
+        """
+        Mark files as ingested.
+
+        Parameters
+        ----------
+        filenames: list of str
+            The names of the files.
+        """
+
+        for filename in filenames:
+            if filename in self.pending:
+                self.done[filename] = self.pending.pop(filename)
+
+    def get_queue_depth(self):
+        """
+        Get the number of files that are waiting to be ingested.
+
+        Returns
+        -------
+        depth: int
+            The number of files.
+        """
+
+        return len(self.pending)
+
+    def get_last_modified(self):
+        """
+        Get the last modification time of the files that are waiting to be
+        ingested.
+
+        Returns
+        -------
+        mtime: float
+            The newest modification time as Unix timestamp or None if no files
+            are waiting.
+        """
+
+        if len(self.pending) == 0:
+            return None
+
+        return max(mtime for _, mtime in self.pending.values())
+
+    def get_lag(self, now=None):
+        """
+        Get the time since the oldest file that is waiting to be ingested was
+        last modified.
+
+        Parameters
+        ----------
+        now: float (default: None)
+            The current time as Unix timestamp. Defaults to the system time.
+
+        Returns
+        -------
+        lag: float
+            The lag in s or zero if no files are waiting.
+        """
+
+        if len(self.pending) == 0:
+            return 0.0
+
+        if now is None:
+            now = time.time()
+
+        oldest = min(mtime for _, mtime in self.pending.values())
+
+        return max(now - oldest, 0.0)
@@ -0,0 +1,296 @@
+#
+#   2020 Fabian Jankowski
+#   Known source matching related helper functions.
+#
+
+import glob
+import hashlib
+import logging
+import os
+import pickle
+
+import numpy as np
+import scipy
+
+# bump this if the format of the matcher cache files changes
+MATCHER_CACHE_VERSION = 1
+
+
+def get_match_dtype():
+    """
+    Get the data type of the known source matches.
+
+    Returns
+    -------
+    dtype: list of tuple
+        The data type.
+    """
+
+    dtype = [
+        ("has_match", bool),
+        ("source", "|U32"),
+        ("catalogue", "|U32"),
+        ("dm", float),
+        ("type", "|U32"),
+    ]
+
+    return dtype
+
+
+def find_known_sources(matcher, coords, dms):
+    """
+    Match candidates with known sources.
+
+    The matcher is queried only once for each distinct combination of sky
+    position and DM. The matches are identical to those of querying each
+    candidate separately. Only exact repeats share a query, i.e. candidates
+    from the same beam with the same DM. How many queries this saves depends
+    on the data. Cluster heads are mostly unique in DM, so the saving may be
+    small, and in the worst case there is one query per candidate as before.
+
+    Parameters
+    ----------
+    matcher: ~psrmatch.matcher.Matcher
+        The known source matcher with the catalogue loaded and the search
+        tree created.
+    coords: ~astropy.coordinates.SkyCoord
+        The sky positions of the candidates.
+    dms: ~np.array of float
+        The DMs of the candidates.
+
+    Returns
+    -------
+    info: ~np.record
+        Whether each candidate has a match, and the name, catalogue, DM and
+        type of the matching source.
+    """
+
+    log = logging.getLogger("meertrapdb.knownsource_helpers")
+
+    dms = np.asarray(dms, dtype=float)
+
+    if len(dms) == 0:
+        return np.zeros(0, dtype=get_match_dtype())
+
+    keys = np.column_stack((coords.ra.deg, coords.dec.deg, dms))
+
+    _, first, inverse = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+    inverse = inverse.reshape(-1)
+
+    log.debug("Distinct queries: {0} of {1} candidates.".format(len(first), len(dms)))
+
+    matches = np.zeros(len(first), dtype=get_match_dtype())
+
+    for i, idx in enumerate(first):
+        match = matcher.find_matches(coords[idx], dms[idx])
+
+        if match is None:
+            continue
+
+        matches["has_match"][i] = True
+        matches["source"][i] = match["psrj"]
+
+        for field in ["catalogue", "dm", "type"]:
+            matches[field][i] = match[field]
+
+    info = matches[inverse]
+
+    return info
+
+
+def get_package_hash(dirname):
+    """
+    Get a hash of the files in a package directory.
+
+    The hash is keyed by the relative path and the contents of each file, so
+    that it changes if the package or its catalogue data files are updated,
+    but not if they are merely touched or reinstalled.
+
+    Parameters
+    ----------
+    dirname: str
+        The package directory.
+
+    Returns
+    -------
+    key: str
+        The hash.
+    """
+
+    sha = hashlib.sha1()
+
+    for path, dirs, files in os.walk(dirname):
+        # walk in a deterministic order
+        dirs[:] = sorted(item for item in dirs if item != "__pycache__")
+
+        for item in sorted(files):
+            filename = os.path.join(path, item)
+            content = hashlib.sha1()
+
+            with open(filename, "rb") as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    content.update(chunk)
+
+            sha.update(
+                "{0}:{1}\n".format(
+                    os.path.relpath(filename, dirname), content.hexdigest()
+                ).encode("utf-8")
+            )
+
+    return sha.hexdigest()
+
+
+def is_private_path(path):
+    """
+    Check whether a file or directory can only be modified by the current user.
+
+    Parameters
+    ----------
+    path: str
+        The name of the file or directory.
+
+    Returns
+    -------
+    private: bool
+        Whether it is owned by the current user and neither group, nor world
+        writable.
+    """
+
+    info = os.stat(path)
+
+    private = info.st_uid == os.getuid() and info.st_mode & 0o022 == 0
+
+    return private
+
+
+def get_matcher_cache_file(catalogue, dist_thresh, dm_thresh, package_dir, cache_dir):
+    """
+    Get the name of the cache file of a prepared known source matcher.
+
+    The name is keyed by the catalogue, the matching thresholds, the files of
+    the matcher package including its catalogue data, and the versions of the
+    cache format and the numerical libraries.
+
+    Parameters
+    ----------
+    catalogue: str
+        The name of the catalogue, e.g. `psrcat`.
+    dist_thresh: float
+        The distance threshold in degrees.
+    dm_thresh: float
+        The fractional DM threshold in percent.
+    package_dir: str
+        The directory of the matcher package.
+    cache_dir: str
+        The cache directory.
+
+    Returns
+    -------
+    cache_file: str
+        Name of the cache file.
+    """
+
+    key = "{0}:{1!r}:{2!r}:{3}:{4}:{5}:{6}".format(
+        catalogue,
+        float(dist_thresh),
+        float(dm_thresh),
+        get_package_hash(package_dir),
+        MATCHER_CACHE_VERSION,
+        np.__version__,
+        scipy.__version__,
+    )
+    key = hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+    cache_file = os.path.join(
+        os.path.expanduser(cache_dir), "matcher_{0}.{1}.pickle".format(catalogue, key)
+    )
+
+    return cache_file
+
+
+def load_matcher(cache_file, create_matcher):
+    """
+    Load a prepared known source matcher from its cache file.
+
+    If the cache file does not exist or cannot be loaded, the matcher is
+    prepared from scratch and the cache file is written. Stale cache files of
+    the same catalogue are removed.
+
+    Unpickling can run arbitrary code, so that the cache file is only loaded if
+    it and its directory can only be modified by the current user. The cache
+    directory is created accordingly, and the cache file is written with
+    permissions for the current user only.
+
+    Parameters
+    ----------
+    cache_file: str
+        Name of the cache file.
+    create_matcher: callable
+        A function that returns the matcher with the catalogue loaded and the
+        search tree created.
+
+    Returns
+    -------
+    matcher: ~psrmatch.matcher.Matcher
+        The prepared matcher.
+    """
+
+    log = logging.getLogger("meertrapdb.knownsource_helpers")
+
+    cache_dir = os.path.dirname(cache_file)
+
+    if os.path.isfile(cache_file) and not (
+        is_private_path(cache_dir) and is_private_path(cache_file)
+    ):
+        log.warning(
+            "Not loading cache file, other users can modify it: {0}".format(cache_file)
+        )
+
+    elif os.path.isfile(cache_file):
+        try:
+            with open(cache_file, "rb") as f:
+                matcher = pickle.load(f)
+        except (
+            AttributeError,
+            EOFError,
+            ImportError,
+            OSError,
+            pickle.UnpicklingError,
+        ) as err:
+            log.warning("Could not load cache file: {0}, {1}".format(cache_file, err))
+        else:
+            log.info("Loaded matcher from cache file: {0}".format(cache_file))
+            return matcher
+
+    matcher = create_matcher()
+
+    # write to a temporary file first, so that readers never see a partial
+    # cache file
+    temp_file = "{0}.{1}.tmp".format(cache_file, os.getpid())
+
+    try:
+        os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+
+        with open(temp_file, "wb") as f:
+            os.chmod(temp_file, 0o600)
+            pickle.dump(matcher, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+        os.replace(temp_file, cache_file)
+
+        # remove stale cache files of the same catalogue
+        prefix = os.path.basename(cache_file).split(".")[0]
+        pattern = os.path.join(
+            glob.escape(cache_dir), "{0}.{1}.pickle".format(prefix, "[0-9a-f]" * 16)
+        )
+
+        for item in glob.glob(pattern):
+            if item != cache_file:
+                os.remove(item)
+
+    except (OSError, pickle.PicklingError) as err:
+        log.warning("Could not write cache file: {0}, {1}".format(cache_file, err))
+
+        if os.path.isfile(temp_file):
+            os.remove(temp_file)
+
+    return matcher
@@ -3,40 +3,55 @@
 #   Parsing related helper functions.
 #
 
-import os.path
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import glob
+import hashlib
+import io
+import logging
+import os
 
 import numpy as np
-from numpy.lib.recfunctions import append_fields
+import pandas as pd
 
+# the data types of the spccl columns, strings are sized to fit
+SPCCL_TYPES = {
+    "index": int,
+    "mjd": float,
+    "dm": float,
+    "width": float,
+    "snr": float,
+    "beam": int,
+    "beam_mode": str,
+    "ra": str,
+    "dec": str,
+    "label": int,
+    "probability": float,
+    "fil_file": str,
+    "plot_file": str,
+}
 
-def parse_spccl_file(filename, version):
+
+def get_spccl_names(version):
     """
-    Parse a SPCCL file.
+    Get the column names of a SPCCL file.
 
     Parameters
     ----------
-    filename: str
-        Name of the file to parse.
+    version: int
+        The spccl version to assume.
 
     Returns
     -------
-    data: ~numpy.record
-        The parsed data.
-    version: int
-        The spccl version to assume.
+    names: list of str
+        The column names.
 
     Raises
     ------
-    RuntimeError
-        If the file does not exist.
     NotImplementedError
         If the requested SPCCL version is not implemented.
     """
 
-    # check if file exists
-    if not os.path.isfile(filename):
-        raise RuntimeError("The SPCCL file does not exist: {0}".format(filename))
-
     if version == 1:
         names = [
             "index",
@@ -85,43 +100,592 @@ def parse_spccl_file(filename, version):
             "The requested SPCCL version is not implemented: {0}".format(version)
         )
 
-    temp = np.genfromtxt(
-        filename,
-        dtype=None,
-        names=names,
-        delimiter="\t",
-        encoding="ascii",
-        autostrip=True,
-    )
+    return names
 
-    # treat case where the file is empty
-    temp = np.atleast_1d(temp)
 
-    # sanity check that the version is correct
-    # Need checks for label and probability?
-    if (version == 2) or (version == 3):
-        if np.unique(temp["beam_mode"]) in ["C", "I"]:
-            pass
+def parse_spccl_buffer(buffer, version):
+    """
+    Parse SPCCL data from a text buffer.
+
+    The data are read using a tab-separated reader in C with a fixed data type
+    for each column. Old files without the index column are supported too.
+
+    Parameters
+    ----------
+    buffer: file-like object
+        The buffer to parse, positioned at the start of a line.
+    version: int
+        The spccl version to assume.
+
+    Returns
+    -------
+    data: ~numpy.record
+        The parsed data, with a unique running index and the coherent flag.
+
+    Raises
+    ------
+    RuntimeError
+        If the data do not match the SPCCL version.
+    NotImplementedError
+        If the requested SPCCL version is not implemented.
+    """
+
+    names = get_spccl_names(version)
+
+    # work out if the index column is present from the first data line
+    offset = buffer.tell()
+    first = ""
+
+    for line in iter(buffer.readline, ""):
+        if line.strip() != "" and not line.lstrip().startswith("#"):
+            first = line
+            break
+
+    buffer.seek(offset)
+
+    if first == "":
+        columns = {name: np.zeros(0, dtype=SPCCL_TYPES[name]) for name in names[1:]}
+
+    else:
+        ncols = len(first.split("\t"))
+
+        if ncols == len(names):
+            present = names
+        elif ncols == len(names) - 1:
+            present = names[1:]
         else:
             raise RuntimeError("Incorrect SPCCL version detected.")
 
-    # add coherent flag
-    coherent = np.zeros(len(temp), dtype=bool)
+        try:
+            frame = pd.read_csv(
+                buffer,
+                sep="\t",
+                header=None,
+                names=present,
+                usecols=names[1:],
+                dtype={name: SPCCL_TYPES[name] for name in present},
+                engine="c",
+                skipinitialspace=True,
+                skip_blank_lines=True,
+                comment="#",
+                na_filter=False,
+            )
+        except ValueError as err:
+            raise RuntimeError("Incorrect SPCCL version detected: {0}".format(err))
+
+        # convert the string columns first to find their sizes
+        columns = {}
+
+        for name in names[1:]:
+            if SPCCL_TYPES[name] == str:
+                columns[name] = np.char.strip(frame[name].to_numpy().astype(str))
+            else:
+                columns[name] = frame[name].to_numpy()
+
+    dtype = [("index", int)]
+    dtype += [(name, columns[name].dtype) for name in names[1:]]
+    dtype += [("coherent", bool)]
 
-    data = append_fields(temp, "coherent", coherent)
+    # allocate the output including the index and coherent flag once
+    data = np.zeros(len(columns["mjd"]), dtype=dtype)
 
+    for name in names[1:]:
+        data[name] = columns[name]
+
+    # sanity check that the version is correct
+    # Need checks for label and probability?
+    if version in [2, 3] and len(data) > 0:
+        if not np.all(np.isin(data["beam_mode"], ["C", "I"])):
+            raise RuntimeError("Incorrect SPCCL version detected.")
+
+    # add coherent flag
     if version == 1:
         data["coherent"] = True
     elif version >= 2:
-        mask = np.char.lower(temp["beam_mode"]) == "c"
-        data["coherent"][mask] = True
+        data["coherent"] = np.char.lower(data["beam_mode"]) == "c"
 
     # ensure a unique running index
-    data["index"] = range(len(data))
+    data["index"] = np.arange(len(data))
+
+    return data
+
+
+def get_spccl_cache_file(filename, version, cache_dir=None):
+    """
+    Get the name of the cache file for a SPCCL file.
+
+    The name is keyed by the path, size and modification time of the SPCCL
+    file and the SPCCL version, so that a changed file gets a new cache file.
+    In a cache directory, the name also contains a hash of the path, so that
+    the SPCCL files of different directories with the same name do not share
+    a prefix.
+
+    Parameters
+    ----------
+    filename: str
+        Name of the SPCCL file.
+    version: int
+        The spccl version to assume.
+    cache_dir: str (default: None)
+        The cache directory. By default, the cache file is a sidecar of the
+        SPCCL file.
+
+    Returns
+    -------
+    cache_file: str
+        Name of the cache file.
+    """
+
+    path = os.path.abspath(filename)
+    stat = os.stat(path)
+
+    key = "{0}:{1}:{2}:{3}".format(path, stat.st_size, stat.st_mtime_ns, version)
+    key = hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+    if cache_dir is None:
+        cache_file = "{0}.{1}.npy".format(path, key)
+    else:
+        path_key = hashlib.sha1(path.encode("utf-8")).hexdigest()[:8]
+
+        cache_file = os.path.join(
+            os.path.expanduser(cache_dir),
+            "{0}.{1}.{2}.npy".format(os.path.basename(path), path_key, key),
+        )
+
+    return cache_file
+
+
+def parse_spccl_file(filename, version, cache=False, cache_dir=None):
+    """
+    Parse a SPCCL file.
+
+    Parameters
+    ----------
+    filename: str
+        Name of the file to parse.
+    version: int
+        The spccl version to assume.
+    cache: bool (default: False)
+        Whether to cache the parsed data in a binary file. Later calls load the
+        cached data memory-mapped and read-only instead of parsing the file
+        again.
+    cache_dir: str (default: None)
+        The directory to store the cache files in. By default, they are
+        sidecars of the SPCCL files.
+
+    Returns
+    -------
+    data: ~numpy.record
+        The parsed data.
+
+    Raises
+    ------
+    RuntimeError
+        If the file does not exist.
+    NotImplementedError
+        If the requested SPCCL version is not implemented.
+    """
+
+    log = logging.getLogger("meertrapdb.parsing_helpers")
+
+    # check if file exists
+    if not os.path.isfile(filename):
+        raise RuntimeError("The SPCCL file does not exist: {0}".format(filename))
+
+    if cache:
+        cache_file = get_spccl_cache_file(filename, version, cache_dir)
+
+        if os.path.isfile(cache_file):
+            try:
+                data = np.load(cache_file, mmap_mode="r")
+            except (OSError, ValueError) as err:
+                log.warning(
+                    "Could not load cache file: {0}, {1}".format(cache_file, err)
+                )
+            else:
+                return data
+
+    with open(filename, "r", encoding="ascii") as f:
+        data = parse_spccl_buffer(f, version)
+
+    if cache:
+        # write to a temporary file first, so that readers never see a
+        # partial cache file
+        temp_file = "{0}.{1}.tmp".format(cache_file, os.getpid())
+
+        try:
+            os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+
+            with open(temp_file, "wb") as f:
+                np.save(f, data)
+
+            os.replace(temp_file, cache_file)
+
+            # remove stale cache files of earlier versions of the file
+            pattern = "{0}.{1}.npy".format(
+                glob.escape(cache_file.rsplit(".", 2)[0]), "[0-9a-f]" * 16
+            )
+
+            for item in glob.glob(pattern):
+                if item != cache_file:
+                    os.remove(item)
+
+        except OSError as err:
+            log.warning("Could not write cache file: {0}, {1}".format(cache_file, err))
+
+            if os.path.isfile(temp_file):
+                os.remove(temp_file)
+
+    return data
+
+
+def get_spccl_file_info(filename, utc_format="%Y-%m-%d_%H:%M:%S"):
+    """
+    Work out the node name and observation start UTC of a SPCCL file from its
+    path.
+
+    Parameters
+    ----------
+    filename: str
+        Name of the SPCCL file, e.g.
+        `2020-02-21_19:28:13/tpn-0-37/2020-02-21_19:28:13.spccl.log`.
+    utc_format: str (default: %Y-%m-%d_%H:%M:%S)
+        The format of the UTC at the start of the file name.
+
+    Returns
+    -------
+    node_name: str
+        The name of the node, i.e. that of the parent directory.
+    utc_start_str: str
+        The observation start UTC as in the file name.
+    obs_utc_start: datetime.datetime
+        The observation start UTC.
+    """
+
+    utc_start_str = os.path.basename(filename)[:19]
+    obs_utc_start = datetime.strptime(utc_start_str, utc_format)
+    node_name = os.path.basename(os.path.dirname(filename))
+
+    return node_name, utc_start_str, obs_utc_start
+
+
+def _load_spccl_file(filename, version, utc_format, cache, cache_dir):
+    """
+    Parse a SPCCL file and tag the candidates with their node name and
+    observation start UTC.
+
+    Parameters
+    ----------
+    filename: str
+        Name of the file to parse.
+    version: int
+        The spccl version to assume.
+    utc_format: str
+        The format of the UTC at the start of the file name.
+    cache: bool
+        Whether to cache the parsed data in a binary file.
+    cache_dir: str
+        The directory to store the cache files in.
+
+    Returns
+    -------
+    data: ~numpy.record
+        The tagged candidates.
+    """
+
+    node_name, _, obs_utc_start = get_spccl_file_info(filename, utc_format)
+
+    temp = parse_spccl_file(filename, version, cache=cache, cache_dir=cache_dir)
+
+    dtype = temp.dtype.descr + [
+        ("node_name", "U{0}".format(max(1, len(node_name)))),
+        ("obs_utc_start", "datetime64[s]"),
+    ]
+
+    data = np.zeros(len(temp), dtype=dtype)
+
+    for field in temp.dtype.names:
+        data[field] = temp[field]
+
+    data["node_name"] = node_name
+    data["obs_utc_start"] = np.datetime64(obs_utc_start, "s")
 
     return data
 
 
+def iter_spccl_files(
+    filenames,
+    version,
+    nproc=1,
+    utc_format="%Y-%m-%d_%H:%M:%S",
+    cache=False,
+    cache_dir=None,
+):
+    """
+    Parse several SPCCL files in parallel, one file at a time.
+
+    Parameters
+    ----------
+    filenames: str or list of str
+        A glob pattern or the names of the files to parse.
+    version: int
+        The spccl version to assume.
+    nproc: int (default: 1)
+        The number of processes to use for parsing.
+    utc_format: str (default: %Y-%m-%d_%H:%M:%S)
+        The format of the UTC at the start of the file names.
+    cache: bool (default: False)
+        Whether to cache the parsed data in binary files.
+    cache_dir: str (default: None)
+        The directory to store the cache files in.
+
+    Returns
+    -------
+    data: generator of (str, ~numpy.record)
+        The name of each file and its candidates, in order of file name. The
+        candidates are tagged with their node name and observation start UTC.
+        Their index runs over all files.
+    """
+
+    if isinstance(filenames, str):
+        filenames = sorted(glob.glob(filenames))
+    else:
+        filenames = sorted(filenames)
+
+    args = [
+        filenames,
+        [version] * len(filenames),
+        [utc_format] * len(filenames),
+        [cache] * len(filenames),
+        [cache_dir] * len(filenames),
+    ]
+
+    offset = 0
+
+    if nproc > 1 and len(filenames) > 1:
+        with ProcessPoolExecutor(max_workers=nproc) as executor:
+            for filename, data in zip(filenames, executor.map(_load_spccl_file, *args)):
+                data["index"] += offset
+                offset += len(data)
+
+                yield filename, data
+
+    else:
+        for filename, data in zip(filenames, map(_load_spccl_file, *args)):
+            data["index"] += offset
+            offset += len(data)
+
+            yield filename, data
+
+
+def load_spccl_files(
+    filenames,
+    version,
+    nproc=1,
+    utc_format="%Y-%m-%d_%H:%M:%S",
+    cache=False,
+    cache_dir=None,
+):
+    """
+    Parse several SPCCL files in parallel into a single array.
+
+    Parameters
+    ----------
+    filenames: str or list of str
+        A glob pattern or the names of the files to parse.
+    version: int
+        The spccl version to assume.
+    nproc: int (default: 1)
+        The number of processes to use for parsing.
+    utc_format: str (default: %Y-%m-%d_%H:%M:%S)
+        The format of the UTC at the start of the file names.
+    cache: bool (default: False)
+        Whether to cache the parsed data in binary files.
+    cache_dir: str (default: None)
+        The directory to store the cache files in.
+
+    Returns
+    -------
+    data: ~numpy.record
+        The candidates of all files, in order of file name. They are tagged
+        with their node name and observation start UTC. Their index runs over
+        all files.
+    """
+
+    parts = [
+        item[1]
+        for item in iter_spccl_files(
+            filenames,
+            version,
+            nproc=nproc,
+            utc_format=utc_format,
+            cache=cache,
+            cache_dir=cache_dir,
+        )
+    ]
+
+    if len(parts) == 0:
+        temp = parse_spccl_buffer(io.StringIO(""), version)
+        dtype = temp.dtype.descr + [
+            ("node_name", "U1"),
+            ("obs_utc_start", "datetime64[s]"),
+        ]
+
+        return np.zeros(0, dtype=dtype)
+
+    # make room for the longest strings
+    dtype = []
+
+    for field in parts[0].dtype.names:
+        field_type = parts[0].dtype[field]
+
+        for part in parts[1:]:
+            field_type = np.promote_types(field_type, part.dtype[field])
+
+        dtype.append((field, field_type))
+
+    data = np.zeros(sum(len(part) for part in parts), dtype=dtype)
+
+    offset = 0
+
+    for part in parts:
+        data[offset : offset + len(part)] = part
+        offset += len(part)
+
+    return data
+
+
+class SpcclFollower(object):
+    """
+    Follow SPCCL files that are still being written.
+    """
+
+    name = "SpcclFollower"
+
+    def __init__(self, version):
+        """
+        Follow SPCCL files that are still being written.
+
+        The follower remembers the byte offset up to which each file was read
+        and only parses the complete lines that were appended since.
+
+        Parameters
+        ----------
+        version: int
+            The spccl version to assume.
+        """
+
+        self.version = version
+        self.__states = {}
+        self.__log = logging.getLogger("meertrapdb.parsing_helpers")
+
+    def __repr__(self):
+        """
+        Representation of the object.
+        """
+
+        info_dict = {"version": self.version, "files": len(self.__states)}
+
+        info_str = "{0}".format(info_dict)
+
+        return info_str
+
+    def __str__(self):
+        """
+        String representation of the object.
+        """
+
+        info_str = "{0}: {1}".format(self.name, repr(self))
+
+        return info_str
+
+    @property
+    def offsets(self):
+        """
+        The byte offsets up to which the files were read.
+        """
+
+        offsets = {key: self.__states[key]["offset"] for key in self.__states}
+
+        return offsets
+
+    def read(self, filename, final=False):
+        """
+        Read the candidates appended to a SPCCL file since the last call.
+
+        A partial line at the end of the file is left for the next call. If
+        the file was truncated or replaced in between, it is read from the
+        start again, and the index continues from that of the candidates read
+        before.
+
+        Parameters
+        ----------
+        filename: str
+            Name of the file to read.
+        final: bool (default: False)
+            Whether the file is complete. A partial line at its end is read
+            too then.
+
+        Returns
+        -------
+        data: ~numpy.record
+            The parsed candidates. Their index continues from that of the
+            candidates returned earlier.
+
+        Raises
+        ------
+        RuntimeError
+            If the file does not exist.
+        """
+
+        if not os.path.isfile(filename):
+            raise RuntimeError("The SPCCL file does not exist: {0}".format(filename))
+
+        state = self.__states.get(filename, {"inode": None, "offset": 0, "count": 0})
+
+        with open(filename, "rb") as f:
+            stat = os.fstat(f.fileno())
+
+            if state["inode"] is not None and (
+                stat.st_ino != state["inode"] or stat.st_size < state["offset"]
+            ):
+                self.__log.warning(
+                    "SPCCL file was truncated or replaced: {0}".format(filename)
+                )
+                # keep the running index, so that it stays unique
+                state = {"inode": None, "offset": 0, "count": state["count"]}
+
+            f.seek(state["offset"])
+            chunk = f.read()
+
+        # only use complete lines
+        if not final:
+            chunk = chunk[: chunk.rfind(b"\n") + 1]
+
+        data = parse_spccl_buffer(io.StringIO(chunk.decode("ascii")), self.version)
+        data["index"] += state["count"]
+
+        self.__states[filename] = {
+            "inode": stat.st_ino,
+            "offset": state["offset"] + len(chunk),
+            "count": state["count"] + len(data),
+        }
+
+        return data
+
+    def forget(self, filename):
+        """
+        Forget the state of a file, e.g. after it was processed.
+
+        Parameters
+        ----------
+        filename: str
+            Name of the file.
+        """
+
+        self.__states.pop(filename, None)
+
+
 if __name__ == "__main__":
     cand_v1 = os.path.join(
         os.path.dirname(__file__), "tests", "candidates_v1.spccl.log"
@@ -134,6 +134,9 @@ class SpsCandidate(db.Entity):
     sift_result = Set("SiftResult")
     head_of = Set("SiftResult")
     known_source = Set("KnownSource")
+    # observation, beam number, coherent flag and mjd in units of 1e-10 days
+    # that identify the candidate, so that it cannot be inserted twice
+    ingest_key = Optional(str, max_len=64, unique=True, nullable=True)
 
 
 class Node(db.Entity):
@@ -0,0 +1 @@
+from meertrapdb.simulation.generator import CandidateGenerator
@@ -0,0 +1,737 @@
+#
+#   2020 Fabian Jankowski
+#   Generate synthetic single-pulse candidates.
+#
+
+import logging
+
+from astropy.coordinates import SkyCoord
+from astropy.time import Time
+import astropy.units as u
+import numpy as np
+from scipy.spatial import cKDTree
+
+
+class CandidateGenerator(object):
+    """
+    Generate synthetic multi-beam single-pulse candidates.
+    """
+
+    name = "CandidateGenerator"
+
+    # the available candidate populations
+    populations = ["noise", "showers", "rfi", "pulsars"]
+
+    # the sampling time in ms, the candidate widths are multiples of it
+    tsamp = 0.30624
+
+    def __init__(
+        self,
+        nbeams=390,
+        rate=0.5,
+        mjd_start=58900.0,
+        ra=200.0,
+        dec=-60.0,
+        beam_sep=0.02,
+        snr_min=10.0,
+        npulsars=5,
+        seed=None,
+    ):
+        """
+        Generate synthetic multi-beam single-pulse candidates.
+
+        Parameters
+        ----------
+        nbeams: int (default: 390)
+            The number of beams, which are tiled hexagonally on the sky.
+        rate: float (default: 0.5)
+            The average candidate rate in 1/s. It sets the length of the
+            observation for a given number of candidates.
+        mjd_start: float (default: 58900.0)
+            The start MJD of the observation.
+        ra: float (default: 200.0)
+            The right ascension of the boresight in degrees.
+        dec: float (default: -60.0)
+            The declination of the boresight in degrees.
+        beam_sep: float (default: 0.02)
+            The separation of adjacent beams in degrees.
+        snr_min: float (default: 10.0)
+            The detection threshold in S/N.
+        npulsars: int (default: 5)
+            The number of pulsars in the field.
+        seed: int (default: None)
+            The seed of the random number generator.
+
+        Raises
+        ------
+        RuntimeError
+            If a parameter is invalid.
+        """
+
+        if not (type(nbeams) == int and nbeams > 0):
+            raise RuntimeError("Number of beams is invalid: {0}".format(nbeams))
+
+        if not rate > 0:
+            raise RuntimeError("Candidate rate is invalid: {0}".format(rate))
+
+        if not beam_sep > 0:
+            raise RuntimeError("Beam separation is invalid: {0}".format(beam_sep))
+
+        if not (type(npulsars) == int and npulsars > 0):
+            raise RuntimeError("Number of pulsars is invalid: {0}".format(npulsars))
+
+        self.nbeams = nbeams
+        self.rate = rate
+        self.mjd_start = mjd_start
+        self.ra = ra
+        self.dec = dec
+        self.beam_sep = beam_sep
+        self.snr_min = snr_min
+        self.npulsars = npulsars
+
+        self.__log = logging.getLogger("meertrapdb.simulation.generator")
+        self.__rng = np.random.default_rng(seed)
+
+        self.__xy = self._get_tiling()
+        self.__neighbours = self._get_neighbours(3 * self.beam_sep)
+        self.__pulsars = self._get_pulsars()
+
+    def __repr__(self):
+        """
+        Representation of the object.
+        """
+
+        info_dict = {
+            "nbeams": self.nbeams,
+            "rate": self.rate,
+            "mjd_start": self.mjd_start,
+            "ra": self.ra,
+            "dec": self.dec,
+            "beam_sep": self.beam_sep,
+            "snr_min": self.snr_min,
+            "npulsars": self.npulsars,
+        }
+
+        info_str = "{0}".format(info_dict)
+
+        return info_str
+
+    def __str__(self):
+        """
+        String representation of the object.
+        """
+
+        info_str = "{0}: {1}".format(self.name, repr(self))
+
+        return info_str
+
+    def _get_tiling(self):
+        """
+        Tile the beams hexagonally around the boresight.
+
+        Returns
+        -------
+        xy: ~np.array of float
+            The offsets of the beams from the boresight in degrees. The beams
+            are numbered in rings outwards from the boresight.
+        """
+
+        nrings = 0
+        while 1 + 3 * nrings * (nrings + 1) < self.nbeams:
+            nrings += 1
+
+        # axial coordinates of the hexagonal grid
+        q, r = np.meshgrid(
+            np.arange(-nrings, nrings + 1), np.arange(-nrings, nrings + 1)
+        )
+        q = q.flatten()
+        r = r.flatten()
+        ring = np.maximum(np.abs(q), np.maximum(np.abs(r), np.abs(q + r)))
+
+        xy = np.column_stack((q + 0.5 * r, 0.5 * np.sqrt(3) * r)) * self.beam_sep
+
+        order = np.lexsort((np.arctan2(xy[:, 1], xy[:, 0]), ring))
+        xy = xy[order][: self.nbeams]
+
+        return xy
+
+    def _get_neighbours(self, radius):
+        """
+        Look up the beams near each beam.
+
+        Parameters
+        ----------
+        radius: float
+            The search radius in degrees.
+
+        Returns
+        -------
+        ptr: ~np.array of int
+            The start of the neighbours of each beam, with the total number
+            appended.
+        indices: ~np.array of int
+            The neighbouring beams, including the beam itself.
+        """
+
+        tree = cKDTree(self.__xy)
+        neighbours = tree.query_ball_point(self.__xy, r=radius)
+
+        counts = np.array([len(item) for item in neighbours])
+        ptr = np.concatenate(([0], np.cumsum(counts)))
+        indices = np.concatenate(neighbours).astype(int)
+
+        return ptr, indices
+
+    def _get_pulsars(self):
+        """
+        Draw the parameters of the pulsars in the field.
+
+        Returns
+        -------
+        pulsars: ~np.record
+            The period in s, phase in s, DM, width in samples, mean S/N and
+            beam of each pulsar.
+        """
+
+        rng = self.__rng
+
+        dtype = [
+            ("period", float),
+            ("phase", float),
+            ("dm", float),
+            ("width", int),
+            ("snr", float),
+            ("beam", int),
+        ]
+
+        pulsars = np.zeros(self.npulsars, dtype=dtype)
+        pulsars["period"] = 10 ** rng.uniform(
+            np.log10(0.03), np.log10(2.0), self.npulsars
+        )
+        pulsars["phase"] = rng.uniform(0, pulsars["period"])
+        pulsars["dm"] = 10 ** rng.uniform(1.0, 2.5, self.npulsars)
+        pulsars["width"] = rng.integers(1, 6, self.npulsars)
+        pulsars["snr"] = self.snr_min * rng.uniform(0.8, 2.0, self.npulsars)
+        pulsars["beam"] = rng.integers(0, self.nbeams, self.npulsars)
+
+        return pulsars
+
+    def _draw_snr(self, size, index):
+        """
+        Draw S/N values from a power law above the detection threshold.
+
+        Parameters
+        ----------
+        size: int
+            The number of values.
+        index: float
+            The index of the cumulative distribution.
+
+        Returns
+        -------
+        snr: ~np.array of float
+            The S/N values.
+        """
+
+        snr = self.snr_min * (1.0 + self.__rng.pareto(index, size))
+
+        return snr
+
+    def _draw_dm(self, size, dm_min, dm_max):
+        """
+        Draw DM values log-uniformly.
+
+        Parameters
+        ----------
+        size: int
+            The number of values.
+        dm_min: float
+            The minimum DM.
+        dm_max: float
+            The maximum DM.
+
+        Returns
+        -------
+        dm: ~np.array of float
+            The DM values.
+        """
+
+        dm = 10 ** self.__rng.uniform(np.log10(dm_min), np.log10(dm_max), size)
+
+        return dm
+
+    def _draw_width(self, size, mean):
+        """
+        Draw widths as powers of two times the sampling time.
+
+        Parameters
+        ----------
+        size: int
+            The number of values.
+        mean: float
+            The mean of the base-two logarithm of the width in samples.
+
+        Returns
+        -------
+        width: ~np.array of int
+            The base-two logarithms of the widths in samples.
+        """
+
+        width = np.clip(self.__rng.poisson(mean, size), 0, 9)
+
+        return width
+
+    def _make_bursts(self, time, dm, width, snr, beam):
+        """
+        Make the candidates of astrophysical bursts.
+
+        Each burst is detected in the beams near its position, with an S/N
+        that follows a Gaussian beam response. The pipeline reports several
+        detections per beam in adjacent DM and width trials.
+
+        Parameters
+        ----------
+        time: ~np.array of float
+            The arrival times in s.
+        dm: ~np.array of float
+            The DMs.
+        width: ~np.array of int
+            The base-two logarithms of the widths in samples.
+        snr: ~np.array of float
+            The S/N at the beam centre.
+        beam: ~np.array of int
+            The beam nearest to each burst.
+
+        Returns
+        -------
+        data: dict
+            The time, DM, width, S/N and beam of each candidate.
+        """
+
+        rng = self.__rng
+        ptr, indices = self.__neighbours
+        nbursts = len(time)
+
+        # the bursts are somewhere within their beams
+        position = self.__xy[beam] + rng.uniform(
+            -0.5 * self.beam_sep, 0.5 * self.beam_sep, (nbursts, 2)
+        )
+
+        # all nearby beams
+        counts = ptr[beam + 1] - ptr[beam]
+        burst = np.repeat(np.arange(nbursts), counts)
+        offset = np.arange(len(burst)) - np.repeat(np.cumsum(counts) - counts, counts)
+        beams = indices[ptr[beam][burst] + offset]
+
+        distance = np.linalg.norm(self.__xy[beams] - position[burst], axis=1)
+        beam_snr = snr[burst] * np.exp(-0.5 * (distance / (0.6 * self.beam_sep)) ** 2)
+
+        mask = beam_snr >= self.snr_min
+        burst = burst[mask]
+        beams = beams[mask]
+        beam_snr = beam_snr[mask]
+
+        # several detections in each beam
+        ndet = 1 + rng.poisson(1.5, len(burst))
+        burst = np.repeat(burst, ndet)
+        beams = np.repeat(beams, ndet)
+        beam_snr = np.repeat(beam_snr, ndet)
+        ncands = len(burst)
+
+        widths = np.clip(width[burst] + rng.integers(-1, 2, ncands), 0, 9)
+
+        data = {
+            "time": time[burst] + rng.normal(0, 0.5e-3 * self.tsamp * 2.0**widths),
+            "dm": dm[burst] * (1.0 + rng.normal(0, 0.005, ncands)),
+            "width": widths,
+            "snr": beam_snr * rng.uniform(0.7, 1.0, ncands),
+            "beam": beams,
+        }
+
+        mask = data["snr"] >= self.snr_min
+        data = {key: data[key][mask] for key in data}
+
+        return data
+
+    def make_noise(self, nevents, tobs):
+        """
+        Make noise candidates, which are single detections at random times.
+
+        Parameters
+        ----------
+        nevents: int
+            The number of candidates.
+        tobs: float
+            The length of the observation in s.
+
+        Returns
+        -------
+        data: dict
+            The time, DM, width, S/N and beam of each candidate.
+        """
+
+        rng = self.__rng
+
+        data = {
+            "time": rng.uniform(0, tobs, nevents),
+            "dm": self._draw_dm(nevents, 5.0, 5000.0),
+            "width": self._draw_width(nevents, 2.0),
+            "snr": self._draw_snr(nevents, 2.5),
+            "beam": rng.integers(0, self.nbeams, nevents),
+        }
+
+        return data
+
+    def make_showers(self, nevents, tobs):
+        """
+        Make the candidates of astrophysical bursts that show up in several
+        adjacent beams.
+
+        Parameters
+        ----------
+        nevents: int
+            The number of bursts.
+        tobs: float
+            The length of the observation in s.
+
+        Returns
+        -------
+        data: dict
+            The time, DM, width, S/N and beam of each candidate.
+        """
+
+        rng = self.__rng
+
+        data = self._make_bursts(
+            rng.uniform(0, tobs, nevents),
+            self._draw_dm(nevents, 50.0, 3000.0),
+            self._draw_width(nevents, 3.0),
+            2 * self._draw_snr(nevents, 1.5),
+            rng.integers(0, self.nbeams, nevents),
+        )
+
+        return data
+
+    def make_rfi(self, nevents, tobs):
+        """
+        Make the candidates of RFI storms that show up at low DMs in a large
+        fraction of the beams.
+
+        Parameters
+        ----------
+        nevents: int
+            The number of storms.
+        tobs: float
+            The length of the observation in s.
+
+        Returns
+        -------
+        data: dict
+            The time, DM, width, S/N and beam of each candidate.
+        """
+
+        rng = self.__rng
+
+        time = rng.uniform(0, tobs, nevents)
+        dm = 1.0 + rng.exponential(10.0, nevents)
+        fraction = rng.uniform(0.25, 1.0, nevents)
+
+        storm, beams = np.nonzero(
+            rng.random((nevents, self.nbeams)) < fraction[:, np.newaxis]
+        )
+
+        # many detections in each beam
+        ndet = 1 + rng.poisson(3.0, len(storm))
+        storm = np.repeat(storm, ndet)
+        beams = np.repeat(beams, ndet)
+        ncands = len(storm)
+
+        data = {
+            "time": time[storm] + rng.normal(0, 0.002, ncands),
+            "dm": dm[storm] * (1.0 + rng.normal(0, 0.01, ncands)),
+            "width": self._draw_width(ncands, 5.0),
+            "snr": self._draw_snr(ncands, 1.0),
+            "beam": beams,
+        }
+
+        return data
+
+    def make_pulsars(self, nevents, tobs):
+        """
+        Make the candidates of pulsar pulses, which arrive periodically at
+        a fixed DM and position.
+
+        Parameters
+        ----------
+        nevents: int
+            The number of detected pulses.
+        tobs: float
+            The length of the observation in s.
+
+        Returns
+        -------
+        data: dict
+            The time, DM, width, S/N and beam of each candidate.
+        """
+
+        rng = self.__rng
+
+        pulsar = self.__pulsars[rng.integers(0, self.npulsars, nevents)]
+        npulses = np.maximum(1, (tobs // pulsar["period"]).astype(int))
+        time = pulsar["phase"] + pulsar["period"] * rng.integers(0, npulses)
+
+        data = self._make_bursts(
+            time,
+            pulsar["dm"],
+            pulsar["width"],
+            pulsar["snr"] * rng.lognormal(0, 0.3, nevents),
+            pulsar["beam"],
+        )
+
+        return data
+
+    def _make_population(self, population, ncands, tobs):
+        """
+        Make a given number of candidates of a population.
+
+        Parameters
+        ----------
+        population: str
+            The name of the population.
+        ncands: int
+            The number of candidates.
+        tobs: float
+            The length of the observation in s.
+
+        Returns
+        -------
+        data: dict
+            The time, DM, width, S/N and beam of each candidate.
+        """
+
+        make = getattr(self, "make_{0}".format(population))
+
+        parts = []
+        total = 0
+        nevents = 0
+
+        while total < ncands:
+            if total == 0:
+                # guess the number of candidates per event
+                todo = max(1, ncands // 100)
+            else:
+                todo = int(np.ceil(1.1 * (ncands - total) * nevents / total)) + 1
+
+            part = make(todo, tobs)
+            parts.append(part)
+            total += len(part["time"])
+            nevents += todo
+
+        data = {key: np.concatenate([part[key] for part in parts]) for key in parts[0]}
+
+        # keep exactly the requested number of candidates
+        if total > ncands:
+            mask = np.zeros(total, dtype=bool)
+            mask[self.__rng.choice(total, ncands, replace=False)] = True
+            data = {key: data[key][mask] for key in data}
+
+        data["label"] = np.full(
+            ncands, int(population in ["showers", "pulsars"]), dtype=int
+        )
+
+        return data
+
+    def _get_dtype(self, version, filenames=True):
+        """
+        Get the data type of the candidates.
+
+        Parameters
+        ----------
+        version: int
+            The SPCCL version.
+        filenames: bool (default: True)
+            Whether to make room for the names of the filterbank and plot
+            files. Otherwise, the fields are only one character wide.
+
+        Returns
+        -------
+        dtype: list
+            The data type, which is that of `parse_spccl_file`.
+
+        Raises
+        ------
+        NotImplementedError
+            If the requested SPCCL version is not implemented.
+        """
+
+        dtype = [
+            ("index", int),
+            ("mjd", float),
+            ("dm", float),
+            ("width", float),
+            ("snr", float),
+            ("beam", int),
+        ]
+
+        if version == 1:
+            pass
+        elif version == 2:
+            dtype += [("beam_mode", "U1")]
+        elif version == 3:
+            dtype += [("beam_mode", "U1")]
+        else:
+            raise NotImplementedError(
+                "The requested SPCCL version is not implemented: {0}".format(version)
+            )
+
+        dtype += [("ra", "U11"), ("dec", "U11")]
+
+        if version == 3:
+            dtype += [("label", int), ("probability", float)]
+
+        if filenames:
+            dtype += [("fil_file", "U25"), ("plot_file", "U42")]
+        else:
+            dtype += [("fil_file", "U1"), ("plot_file", "U1")]
+
+        dtype += [("coherent", bool)]
+
+        return dtype
+
+    def generate(self, ncands, fractions=None, version=2, filenames=False):
+        """
+        Generate synthetic candidates.
+
+        Parameters
+        ----------
+        ncands: int
+            The number of candidates.
+        fractions: dict (default: None)
+            The fraction of candidates of each population, i.e. noise,
+            showers, rfi and pulsars. By default half are noise, 30 per cent
+            showers, 15 per cent RFI and 5 per cent pulsars.
+        version: int (default: 2)
+            The SPCCL version to output.
+        filenames: bool (default: False)
+            Whether to fill in the names of the filterbank and plot files.
+            Formatting and storing them dominates the runtime and memory use
+            for large numbers of candidates, so they are empty by default.
+
+        Returns
+        -------
+        candidates: ~np.record
+            The candidates in order of MJD, with the data type of
+            `parse_spccl_file`.
+
+        Raises
+        ------
+        RuntimeError
+            If the fractions are invalid.
+        """
+
+        if fractions is None:
+            fractions = {"noise": 0.5, "showers": 0.3, "rfi": 0.15, "pulsars": 0.05}
+
+        for population in fractions:
+            if population not in self.populations:
+                raise RuntimeError("Population is invalid: {0}".format(population))
+
+        if not np.isclose(sum(fractions.values()), 1.0) or min(fractions.values()) < 0:
+            raise RuntimeError("Fractions are invalid: {0}".format(fractions))
+
+        dtype = self._get_dtype(version, filenames)
+        tobs = ncands / self.rate
+
+        # split the candidates over the populations
+        counts = [int(ncands * fractions[item]) for item in fractions]
+        counts[0] += ncands - sum(counts)
+
+        parts = [
+            self._make_population(population, count, tobs)
+            for population, count in zip(fractions, counts)
+            if count > 0
+        ]
+
+        if len(parts) == 0:
+            return np.zeros(0, dtype=dtype)
+
+        data = {key: np.concatenate([part[key] for part in parts]) for key in parts[0]}
+
+        order = np.argsort(data["time"], kind="stable")
+
+        candidates = np.zeros(ncands, dtype=dtype)
+        candidates["index"] = np.arange(ncands)
+        candidates["mjd"] = np.round(
+            self.mjd_start + data["time"][order] / (24 * 60 * 60.0), 10
+        )
+        candidates["dm"] = np.round(data["dm"][order], 3)
+        candidates["width"] = np.round(self.tsamp * 2.0 ** data["width"][order], 4)
+        candidates["snr"] = np.round(data["snr"][order], 2)
+        candidates["beam"] = data["beam"][order]
+        candidates["coherent"] = True
+
+        if version >= 2:
+            candidates["beam_mode"] = "C"
+
+        if version == 3:
+            label = data["label"][order]
+            candidates["label"] = label
+            candidates["probability"] = np.where(
+                label == 1,
+                self.__rng.beta(5.0, 1.0, ncands),
+                self.__rng.beta(1.0, 5.0, ncands),
+            )
+
+        # the beam positions
+        coord = SkyCoord(
+            ra=self.ra + self.__xy[:, 0] / np.cos(np.radians(self.dec)),
+            dec=self.dec + self.__xy[:, 1],
+            unit=(u.deg, u.deg),
+            frame="icrs",
+        )
+
+        ra = coord.ra.to_string(unit=u.hour, sep=":", precision=2, pad=True)
+        dec = coord.dec.to_string(
+            unit=u.deg, sep=":", precision=1, pad=True, alwayssign=True
+        )
+
+        candidates["ra"] = np.asarray(ra)[candidates["beam"]]
+        candidates["dec"] = np.asarray(dec)[candidates["beam"]]
+
+        if filenames:
+            self._fill_filenames(candidates)
+
+        self.__log.info("Generated candidates: {0}".format(ncands))
+
+        return candidates
+
+    def _fill_filenames(self, candidates):
+        """
+        Fill in the names of the filterbank and plot files.
+
+        Parameters
+        ----------
+        candidates: ~np.record
+            The candidates.
+        """
+
+        # the filterbank files are 300 s long
+        length = 300.0 / (24 * 60 * 60.0)
+        fil_number = ((candidates["mjd"] - self.mjd_start) // length).astype(int)
+        numbers = np.unique(fil_number)
+
+        starts = Time(self.mjd_start + numbers * length, format="mjd")
+        fil_files = np.array(
+            [item.strftime("%Y_%m_%d_%H:%M:%S.fil") for item in starts]
+        )
+        candidates["fil_file"] = fil_files[np.searchsorted(numbers, fil_number)]
+
+        plot_file = np.char.add(candidates["mjd"].astype("U16"), "_DM_")
+        plot_file = np.char.add(plot_file, np.round(candidates["dm"], 2).astype("U10"))
+        plot_file = np.char.add(plot_file, "_beam_")
+        plot_file = np.char.add(plot_file, candidates["beam"].astype("U4"))
+
+        if "beam_mode" in candidates.dtype.names:
+            plot_file = np.char.add(plot_file, candidates["beam_mode"])
+
+        candidates["plot_file"] = np.char.add(plot_file, ".jpg")
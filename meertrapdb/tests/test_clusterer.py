@@ -36,6 +36,394 @@ def test_multibeam_clustering():
     np.testing.assert_equal(good_info, info)
 
 
+def test_multibeam_clustering_algorithms():
+    good_filename = os.path.join(
+        os.path.dirname(__file__), "test_clusterer_good_info.npy"
+    )
+    good_info = np.load(good_filename)
+
+    spccl_file = os.path.join(
+        os.path.dirname(__file__), "test_clusterer_candidates.spccl.log"
+    )
+
+    candidates = parse_spccl_file(spccl_file, 1)
+
+    for algorithm in ["naive", "sweep"]:
+        clust = Clusterer(10.0, 0.02, algorithm=algorithm)
+        info = clust.match_candidates(candidates)
+
+        np.testing.assert_equal(good_info, info)
+
+
+def test_sweep_matches_naive():
+    rng = np.random.default_rng(42)
+    ncands = 2000
+
+    dtype = [
+        ("index", int),
+        ("mjd", float),
+        ("dm", float),
+        ("snr", float),
+        ("beam", int),
+    ]
+    candidates = np.zeros(ncands, dtype=dtype)
+    candidates["index"] = rng.permutation(ncands)
+    # dense in time with many exact duplicates to exercise the tie-breaking
+    candidates["mjd"] = 58900.0 + rng.integers(0, 500, size=ncands) * 5.0e-8
+    candidates["dm"] = rng.choice([100.0, 101.0, 150.0, 500.0], size=ncands)
+    candidates["snr"] = rng.choice([8.0, 10.0, 12.0], size=ncands)
+    candidates["beam"] = rng.integers(0, 10, size=ncands)
+
+    for time_thresh in [1.0, 10.0, 50.0]:
+        info_naive = Clusterer(time_thresh, 0.02, algorithm="naive").match_candidates(
+            candidates
+        )
+        info_sweep = Clusterer(time_thresh, 0.02, algorithm="sweep").match_candidates(
+            candidates
+        )
+
+        np.testing.assert_equal(info_naive, info_sweep)
+
+
+def test_parallel_clustering():
+    good_filename = os.path.join(
+        os.path.dirname(__file__), "test_clusterer_good_info.npy"
+    )
+    good_info = np.load(good_filename)
+
+    spccl_file = os.path.join(
+        os.path.dirname(__file__), "test_clusterer_candidates.spccl.log"
+    )
+
+    candidates = parse_spccl_file(spccl_file, 1)
+
+    for algorithm in ["naive", "sweep"]:
+        clust = Clusterer(10.0, 0.02, algorithm=algorithm, nproc=2)
+        info = clust.match_candidates(candidates)
+
+        np.testing.assert_equal(good_info, info)
+
+
+def test_spatial_clustering():
+    good_filename = os.path.join(
+        os.path.dirname(__file__), "test_clusterer_good_info.npy"
+    )
+    good_info = np.load(good_filename)
+
+    spccl_file = os.path.join(
+        os.path.dirname(__file__), "test_clusterer_candidates.spccl.log"
+    )
+
+    candidates = parse_spccl_file(spccl_file, 1)
+
+    # all beams are adjacent
+    clust = Clusterer(10.0, 0.02, beam_thresh=180.0)
+    info = clust.match_candidates(candidates)
+
+    for field in good_info.dtype.names:
+        np.testing.assert_equal(good_info[field], info[field])
+
+    for field in ["extent_ra", "extent_dec", "extent_area"]:
+        assert np.all(info[field] >= 0)
+        assert np.all(info[field][info["beams"] == 1] == 0)
+
+    # only candidates in the same beam match
+    clust = Clusterer(10.0, 0.02, beam_thresh=0.0)
+    info = clust.match_candidates(candidates)
+
+    assert np.all(info["beams"] == 1)
+    assert np.all(info["extent_area"] == 0)
+
+    # the algorithms must agree
+    info_naive = Clusterer(
+        10.0, 0.02, algorithm="naive", beam_thresh=0.1
+    ).match_candidates(candidates)
+    info_sweep = Clusterer(10.0, 0.02, beam_thresh=0.1).match_candidates(candidates)
+
+    np.testing.assert_equal(info_naive, info_sweep)
+    assert np.count_nonzero(info_sweep["is_head"]) > np.count_nonzero(
+        good_info["is_head"]
+    )
+
+
+def test_streaming_clustering():
+    good_filename = os.path.join(
+        os.path.dirname(__file__), "test_clusterer_good_info.npy"
+    )
+    good_info = np.load(good_filename)
+
+    spccl_file = os.path.join(
+        os.path.dirname(__file__), "test_clusterer_candidates.spccl.log"
+    )
+
+    candidates = parse_spccl_file(spccl_file, 1)
+    candidates = np.sort(candidates, order="mjd")
+
+    clust = Clusterer(10.0, 0.02)
+
+    for chunk_size in [10, 1000, len(candidates)]:
+        chunks = (
+            candidates[i : i + chunk_size]
+            for i in range(0, len(candidates), chunk_size)
+        )
+
+        info = np.concatenate(list(clust.match_candidates_stream(chunks)))
+        info = np.sort(info, order="index")
+
+        np.testing.assert_equal(good_info, info)
+
+
+def test_streaming_unsorted_chunks():
+    spccl_file = os.path.join(
+        os.path.dirname(__file__), "test_clusterer_candidates.spccl.log"
+    )
+
+    candidates = parse_spccl_file(spccl_file, 1)
+    candidates = np.sort(candidates, order="mjd")[::-1]
+
+    clust = Clusterer(10.0, 0.02)
+
+    chunks = (candidates[i : i + 100] for i in range(0, len(candidates), 100))
+
+    with assert_raises(RuntimeError):
+        for _ in clust.match_candidates_stream(chunks):
+            pass
+
+
+def test_incremental_clustering():
+    spccl_file = os.path.join(
+        os.path.dirname(__file__), "test_clusterer_candidates.spccl.log"
+    )
+
+    candidates = parse_spccl_file(spccl_file, 1)
+
+    clust = Clusterer(10.0, 0.02)
+
+    # without existing clusters, this is the normal clustering
+    dtype = [
+        ("index", int),
+        ("mjd", float),
+        ("dm", float),
+        ("snr", float),
+        ("beam", int),
+        ("cluster_id", int),
+    ]
+    existing = np.zeros(0, dtype=dtype)
+
+    info = clust.extend_clusters(candidates, existing)
+    good_info = clust.match_candidates(candidates)
+
+    np.testing.assert_equal(good_info, info)
+
+    # add the candidates of one beam to the clusters of the others
+    mask = candidates["beam"] == np.median(np.asarray(candidates["beam"]))
+    old_info = clust.match_candidates(candidates[~mask])
+
+    existing = np.zeros(len(old_info), dtype=dtype)
+    for field in ["index", "mjd", "dm", "snr", "beam"]:
+        existing[field] = np.sort(candidates[~mask], order="index")[field]
+    existing["cluster_id"] = old_info["cluster_id"]
+
+    info = clust.extend_clusters(
+        candidates[mask], existing, cluster_id=np.max(old_info["cluster_id"]) + 1
+    )
+
+    assert np.all(np.isin(candidates["index"][mask], info["index"]))
+    assert np.all(info["processed"])
+
+    # combine the old and the changed clustering information
+    unchanged = old_info[np.logical_not(np.isin(old_info["index"], info["index"]))]
+    combined = np.sort(np.concatenate((unchanged, info)), order="index")
+
+    assert len(combined) == len(candidates)
+    assert np.count_nonzero(combined["is_head"]) == len(np.unique(combined["head"]))
+    assert np.count_nonzero(combined["is_head"]) <= np.count_nonzero(
+        old_info["is_head"]
+    ) + np.count_nonzero(mask)
+
+    with assert_raises(RuntimeError):
+        clust.extend_clusters(candidates[mask], existing, cluster_id=0)
+
+
+def test_incremental_clustering_bounded():
+    dtype = [
+        ("index", int),
+        ("mjd", float),
+        ("dm", float),
+        ("snr", float),
+        ("beam", int),
+        ("cluster_id", int),
+    ]
+
+    # a pulse train that chains together, 6 ms apart
+    candidates = np.zeros(20, dtype=dtype)
+    candidates["index"] = np.arange(20)
+    candidates["mjd"] = 58000.0 + 6.0 * np.arange(20) / 86400e3
+    candidates["dm"] = 100.0
+    candidates["snr"] = 10.0
+    candidates["beam"] = 1
+
+    clust = Clusterer(10.0, 0.02)
+    good_info = clust.match_candidates(candidates)
+
+    # add one candidate at a time
+    existing = np.zeros(0, dtype=dtype)
+
+    for i in range(len(candidates)):
+        cluster_id = np.max(existing["cluster_id"], initial=-1) + 1
+        info = clust.extend_clusters(candidates[i : i + 1], existing, cluster_id)
+
+        existing = existing[np.logical_not(np.isin(existing["index"], info["index"]))]
+        added = candidates[info["index"]]
+        added["cluster_id"] = info["cluster_id"]
+        existing = np.sort(np.concatenate((existing, added)), order="index")
+
+    # the clusters do not grow with each run
+    for cluster_id in np.unique(existing["cluster_id"]):
+        mjd = existing["mjd"][existing["cluster_id"] == cluster_id]
+        assert (np.max(mjd) - np.min(mjd)) * 86400e3 <= 20.0
+
+    np.testing.assert_equal(existing["cluster_id"], good_info["cluster_id"])
+
+
+def test_incremental_spatial_clustering():
+    dtype = [
+        ("index", int),
+        ("mjd", float),
+        ("dm", float),
+        ("snr", float),
+        ("beam", int),
+        ("ra", float),
+        ("dec", float),
+        ("cluster_id", int),
+    ]
+
+    candidates = np.zeros(5, dtype=dtype)
+    candidates["index"] = np.arange(5)
+    candidates["mjd"] = 58000.0 + np.array([0.0, 1.0, 2.0, 1.5, 2.5]) / 86400e3
+    candidates["dm"] = [100.0, 100.5, 101.0, 100.2, 100.8]
+    candidates["snr"] = [10.0, 12.0, 9.0, 8.0, 11.0]
+    candidates["beam"] = [1, 2, 1, 3, 4]
+
+    # the fourth candidate is on the opposite side of the sky
+    candidates["ra"] = [10.0, 10.5, 10.0, 190.0, 10.2]
+    candidates["dec"] = [-30.0, -30.0, -30.0, 30.0, -30.2]
+
+    clust = Clusterer(10.0, 0.02, beam_thresh=1.0)
+    good_info = clust.match_candidates(candidates)
+
+    existing = candidates[:3]
+    existing["cluster_id"] = good_info["cluster_id"][:3]
+
+    info = clust.extend_clusters(
+        candidates[3:], existing, cluster_id=np.max(existing["cluster_id"]) + 1
+    )
+
+    unchanged = good_info[:3][np.logical_not(np.isin(np.arange(3), info["index"]))]
+    combined = np.sort(np.concatenate((unchanged, info)), order="index")
+
+    # the same candidates share a cluster
+    for i in range(len(candidates)):
+        np.testing.assert_equal(
+            combined["cluster_id"] == combined["cluster_id"][i],
+            good_info["cluster_id"] == good_info["cluster_id"][i],
+        )
+
+    assert combined["cluster_id"][3] != combined["cluster_id"][0]
+    assert combined["cluster_id"][4] == combined["cluster_id"][0]
+
+
+def test_cluster_summary():
+    spccl_file = os.path.join(
+        os.path.dirname(__file__), "test_clusterer_candidates.spccl.log"
+    )
+
+    candidates = parse_spccl_file(spccl_file, 1)
+
+    clust = Clusterer(10.0, 0.02)
+    info, summary = clust.match_candidates(candidates, return_summary=True)
+
+    np.testing.assert_equal(info, clust.match_candidates(candidates))
+
+    assert len(summary) == np.max(info["cluster_id"]) + 1
+    np.testing.assert_equal(summary["cluster_id"], np.arange(len(summary)))
+    assert np.sum(summary["members"]) == len(candidates)
+
+    # compare with a straightforward loop over the clusters
+    candidates = np.sort(candidates, order="index")
+
+    for item in summary[:: max(1, len(summary) // 50)]:
+        mask = info["cluster_id"] == item["cluster_id"]
+        members = candidates[mask]
+        head = candidates[info["is_head"] & mask]
+
+        assert item["head"] == head["index"][0]
+        assert item["members"] == len(members)
+        assert item["beams"] == len(np.unique(members["beam"]))
+        assert item["snr_max"] == np.max(members["snr"])
+        assert item["mjd_min"] == np.min(members["mjd"])
+        assert item["dm_max"] == np.max(members["dm"])
+        assert item["width_min"] == np.min(members["width"])
+        assert item["mjd_min"] <= item["mjd_centroid"] <= item["mjd_max"]
+
+        np.testing.assert_allclose(
+            item["dm_centroid"],
+            np.average(members["dm"], weights=members["snr"]),
+        )
+
+    # no candidates, no clusters
+    info, summary = clust.match_candidates(candidates[:0], return_summary=True)
+    assert len(info) == 0
+    assert len(summary) == 0
+
+
+def test_threshold_grid():
+    spccl_file = os.path.join(
+        os.path.dirname(__file__), "test_clusterer_candidates.spccl.log"
+    )
+
+    candidates = parse_spccl_file(spccl_file, 1)
+
+    time_threshs = [1.0, 10.0, 50.0]
+    dm_threshs = [0.01, 0.02, 0.05]
+
+    clust = Clusterer()
+    stats = clust.match_candidates_grid(candidates, time_threshs, dm_threshs)
+
+    assert len(stats) == len(time_threshs) * len(dm_threshs)
+
+    # compare with separate runs
+    for item in stats:
+        clust = Clusterer(float(item["time_thresh"]), float(item["dm_thresh"]))
+        info = clust.match_candidates(candidates)
+        mask = info["is_head"]
+
+        assert item["candidates"] == len(candidates)
+        assert item["heads"] == np.count_nonzero(mask)
+        assert item["size_max"] == np.max(info["members"][mask])
+        np.testing.assert_allclose(item["reduction"], len(candidates) / np.sum(mask))
+        np.testing.assert_allclose(
+            item["size_median"], np.median(info["members"][mask])
+        )
+
+    # the number of heads cannot increase for larger thresholds
+    for time_thresh in time_threshs:
+        heads = stats["heads"][stats["time_thresh"] == time_thresh]
+        assert np.all(np.diff(heads) <= 0)
+
+    # parallel run
+    clust = Clusterer(nproc=2)
+    stats_parallel = clust.match_candidates_grid(candidates, time_threshs, dm_threshs)
+
+    np.testing.assert_equal(stats, stats_parallel)
+
+    with assert_raises(RuntimeError):
+        clust.match_candidates_grid(candidates, [1], dm_threshs)
+
+    with assert_raises(RuntimeError):
+        clust.match_candidates_grid(candidates, time_threshs, [-0.1])
+
+
 def test_private_access():
     clust = Clusterer(10.0, 0.02)
 
@@ -72,8 +460,20 @@ def test_invalid_parameters():
     with assert_raises(RuntimeError):
         clust.dm_thresh = "bla"
 
+    with assert_raises(RuntimeError):
+        clust.algorithm = "bla"
+
+    with assert_raises(RuntimeError):
+        clust.nproc = 0
+
+    with assert_raises(RuntimeError):
+        clust.beam_thresh = -1.0
+
     assert clust.time_thresh == 10.0
     assert clust.dm_thresh == 0.02
+    assert clust.algorithm == "sweep"
+    assert clust.nproc == 1
+    assert clust.beam_thresh is None
 
 
 if __name__ == "__main__":
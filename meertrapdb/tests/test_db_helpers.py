@@ -0,0 +1,143 @@
+#
+#   2020 Fabian Jankowski
+#
+
+from decimal import Decimal
+
+from numpy.testing import assert_raises
+from pony.orm import Database, Optional, PrimaryKey, Required, Set, db_session
+
+from meertrapdb.db_helpers import delete_links, insert_entities, insert_links
+
+
+def get_database():
+    db = Database()
+
+    class Candidate(db.Entity):
+        id = PrimaryKey(int, auto=True)
+        mjd = Required(Decimal, precision=15, scale=10)
+        snr = Required(float)
+        plot = Optional(str, max_len=64)
+        viewed = Optional(int, default=0)
+        key = Optional(str, max_len=32, unique=True, nullable=True)
+        beam = Set("Beam")
+
+    class Beam(db.Entity):
+        id = PrimaryKey(int, auto=True)
+        number = Required(int)
+        candidate = Set("Candidate")
+
+    db.bind(provider="sqlite", filename=":memory:")
+    db.generate_mapping(create_tables=True)
+
+    return db
+
+
+def test_insert_entities():
+    db = get_database()
+
+    values = {
+        "mjd": [Decimal("58900.{0:010d}".format(i)) for i in range(2500)],
+        "snr": [float(i) for i in range(2500)],
+    }
+
+    with db_session:
+        beam = db.Beam(number=3)
+        db.Beam(number=4)
+
+        # some rows created through the orm first
+        db.Candidate(mjd=Decimal("1.0"), snr=1.0)
+        db.flush()
+
+        ids = insert_entities(db.Candidate, values, batch_size=1000)
+        insert_links(db.Candidate.beam, ids, beam.id, batch_size=1000)
+
+    assert len(ids) == 2500
+
+    with db_session:
+        for i in [0, 1234, 2499]:
+            cand = db.Candidate[ids[i]]
+            assert cand.mjd == values["mjd"][i]
+            assert cand.snr == values["snr"][i]
+            assert cand.plot == ""
+            assert cand.viewed == 0
+            assert [item.number for item in cand.beam] == [3]
+
+        assert db.Beam.get(number=3).candidate.count() == 2500
+        assert db.Beam.get(number=4).candidate.count() == 0
+
+    with db_session:
+        assert insert_entities(db.Candidate, {"snr": []}) == []
+
+        with assert_raises(RuntimeError):
+            insert_entities(db.Candidate, {"snr": [1.0], "bla": [1]})
+
+        with assert_raises(RuntimeError):
+            insert_entities(db.Candidate, {"snr": [1.0], "mjd": []})
+
+        with assert_raises(RuntimeError):
+            insert_links(db.Candidate.beam, [1, 2], [1])
+
+
+def test_insert_entities_key():
+    db = get_database()
+
+    values = {
+        "mjd": [Decimal(i) for i in range(2500)],
+        "snr": [float(i) for i in range(2500)],
+        "key": ["cand_{0}".format(i) for i in range(2500)],
+    }
+
+    with db_session:
+        db.Candidate(mjd=Decimal("1.0"), snr=1.0, key="other")
+        db.flush()
+
+        ids = insert_entities(db.Candidate, values, batch_size=1000, key="key")
+
+    assert len(ids) == 2500
+
+    with db_session:
+        for i in [0, 1234, 2499]:
+            cand = db.Candidate[ids[i]]
+            assert cand.key == values["key"][i]
+            assert cand.snr == values["snr"][i]
+
+        with assert_raises(RuntimeError):
+            insert_entities(db.Candidate, {"snr": [1.0], "mjd": [1]}, key="snr")
+
+        with assert_raises(RuntimeError):
+            insert_entities(db.Candidate, {"snr": [1.0], "mjd": [1]}, key="key")
+
+
+def test_delete_links():
+    db = get_database()
+
+    with db_session:
+        beams = [db.Beam(number=i) for i in range(3)]
+        db.flush()
+
+        ids = insert_entities(
+            db.Candidate,
+            {"mjd": [Decimal(i) for i in range(10)], "snr": [1.0] * 10},
+        )
+        insert_links(db.Candidate.beam, ids, [beams[i % 3].id for i in range(10)])
+
+        # the links of the other candidates are kept
+        assert delete_links(db.Candidate.beam, ids[:4], batch_size=3) == 4
+        assert delete_links(db.Candidate.beam, []) == 0
+
+    with db_session:
+        for i, cand_id in enumerate(ids):
+            nlink = db.Candidate[cand_id].beam.count()
+            assert nlink == (0 if i < 4 else 1)
+
+        assert db.Candidate.select().count() == 10
+
+        with assert_raises(RuntimeError):
+            delete_links(db.Candidate.snr, ids)
+
+
+if __name__ == "__main__":
+    import nose2
+
+    nose2.main()
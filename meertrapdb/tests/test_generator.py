@@ -0,0 +1,95 @@
+#
+#   2020 Fabian Jankowski
+#
+
+import os.path
+
+import numpy as np
+from numpy.testing import assert_raises
+
+from meertrapdb.clustering.clusterer import Clusterer
+from meertrapdb.parsing_helpers import parse_spccl_file
+from meertrapdb.simulation.generator import CandidateGenerator
+
+
+def test_spccl_compatibility():
+    spccl_file = os.path.join(
+        os.path.dirname(__file__), "test_clusterer_candidates.spccl.log"
+    )
+
+    parsed = parse_spccl_file(spccl_file, 1)
+
+    gen = CandidateGenerator(seed=42)
+
+    for version in [1, 2, 3]:
+        candidates = gen.generate(1000, version=version, filenames=True)
+
+        assert len(candidates) == 1000
+        np.testing.assert_equal(candidates["index"], np.arange(len(candidates)))
+        assert np.all(np.diff(candidates["mjd"]) >= 0)
+        assert np.all(candidates["snr"] >= gen.snr_min - 0.01)
+        assert np.all(candidates["dm"] > 0)
+        assert np.all(candidates["beam"] < gen.nbeams)
+        assert np.all(np.char.endswith(candidates["plot_file"], ".jpg"))
+
+        if version == 1:
+            assert candidates.dtype == parsed.dtype
+
+    with assert_raises(NotImplementedError):
+        gen.generate(10, version=4)
+
+
+def test_reproducibility():
+    candidates = CandidateGenerator(seed=42).generate(5000)
+    same = CandidateGenerator(seed=42).generate(5000)
+    other = CandidateGenerator(seed=43).generate(5000)
+
+    np.testing.assert_equal(candidates, same)
+    assert not np.array_equal(candidates["mjd"], other["mjd"])
+
+
+def test_populations():
+    gen = CandidateGenerator(seed=42)
+    clust = Clusterer(10.0, 0.02)
+
+    # noise candidates hardly cluster, showers and rfi storms do
+    reduction = {}
+
+    for population in ["noise", "showers", "rfi", "pulsars"]:
+        candidates = gen.generate(5000, fractions={population: 1.0})
+        info = clust.match_candidates(candidates)
+
+        reduction[population] = len(candidates) / np.count_nonzero(info["is_head"])
+
+    assert reduction["noise"] < 1.1
+    assert reduction["showers"] > 2
+    assert reduction["rfi"] > 10
+    assert reduction["pulsars"] > 2
+
+    # rfi is at low dm
+    candidates = gen.generate(1000, fractions={"rfi": 1.0})
+    assert np.median(candidates["dm"]) < 20
+
+    with assert_raises(RuntimeError):
+        gen.generate(10, fractions={"bla": 1.0})
+
+    with assert_raises(RuntimeError):
+        gen.generate(10, fractions={"noise": 0.5})
+
+
+def test_invalid_parameters():
+    for nbeams in [0, -1, 1.5]:
+        with assert_raises(RuntimeError):
+            CandidateGenerator(nbeams=nbeams)
+
+    with assert_raises(RuntimeError):
+        CandidateGenerator(rate=0)
+
+    with assert_raises(RuntimeError):
+        CandidateGenerator(npulsars=0)
+
+
+if __name__ == "__main__":
+    import nose2
+
+    nose2.main()
@@ -0,0 +1,272 @@
+#
+#   2020 Fabian Jankowski
+#
+
+from decimal import Decimal
+import os.path
+import tempfile
+
+from astropy.time import Time
+import numpy as np
+from numpy.testing import assert_raises
+
+from meertrapdb.ingest_helpers import (
+    EntityCache,
+    IngestJournal,
+    PlotCopier,
+    StagingScanner,
+    copy_file,
+    get_candidate_times,
+    get_duplicates,
+    get_mjd_keys,
+    is_ingest_complete,
+    publish_file,
+)
+
+
+def test_candidate_times():
+    rng = np.random.default_rng(42)
+    mjds = 58900.0 + rng.uniform(0, 100, size=200)
+
+    utcs, mjds_fixed = get_candidate_times(mjds)
+
+    assert len(utcs) == len(mjds)
+    assert len(mjds_fixed) == len(mjds)
+
+    # compare with the conversion for each candidate
+    for mjd, utc, mjd_fixed in zip(mjds, utcs, mjds_fixed):
+        assert utc == Time(mjd, format="mjd").iso
+        assert mjd_fixed == Decimal("{0:.10f}".format(mjd))
+
+
+def test_candidate_times_empty():
+    utcs, mjds_fixed = get_candidate_times(np.zeros(0))
+
+    assert len(utcs) == 0
+    assert len(mjds_fixed) == 0
+
+
+def test_mjd_keys():
+    mjds = np.array([58900.0, 58900.12345678901, 59000.5])
+
+    keys = get_mjd_keys(mjds)
+    assert keys.dtype == np.int64
+    np.testing.assert_equal(keys, [589000000000000, 589001234567890, 590005000000000])
+
+    # the same keys for the mjds stored in the database
+    _, mjds_fixed = get_candidate_times(mjds)
+    np.testing.assert_equal(get_mjd_keys(mjds_fixed), keys)
+
+    assert len(get_mjd_keys([])) == 0
+
+
+def test_duplicates():
+    keys = np.array([5, 3, 7, 5, 9, 3, 11])
+    existing = set([7, 11, 100])
+
+    mask = get_duplicates(keys, existing)
+    np.testing.assert_equal(mask, [False, False, True, True, False, True, True])
+
+    mask = get_duplicates(keys, set())
+    np.testing.assert_equal(mask, [False, False, False, True, False, True, False])
+
+    assert len(get_duplicates(np.zeros(0, dtype=np.int64), existing)) == 0
+
+
+def test_entity_cache():
+    cache = EntityCache()
+
+    assert cache.get("beam", (1, 2, 3, True)) is None
+
+    cache.update([("beam", (1, 2, 3, True), 42), ("node", (1, 2), 7)])
+
+    assert len(cache) == 2
+    assert cache.get("beam", (1, 2, 3, True)) == 42
+    assert cache.get("beam", (1, 2, 3, False)) is None
+    assert cache.get("node", (1, 2)) == 7
+    assert cache.hits == 2
+    assert cache.misses == 2
+
+    with assert_raises(RuntimeError):
+        cache.get("bla", 1)
+
+    with assert_raises(RuntimeError):
+        cache.update([("bla", 1, 1)])
+
+    cache.clear()
+    assert len(cache) == 0
+    assert cache.get("node", (1, 2)) is None
+
+
+def get_plots(tempdir, nplot):
+    plots = []
+
+    for i in range(nplot):
+        filename = os.path.join(tempdir, "staging", "plot_{0}.jpg".format(i))
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+
+        with open(filename, "w") as f:
+            f.write("plot {0}".format(i))
+
+        item = {
+            "staging": filename,
+            "processed": os.path.join(
+                tempdir, "processed", "node", "plot_{0}.jpg".format(i)
+            ),
+            "webserver": os.path.join(tempdir, "web", "node", "plot_{0}.jpg".format(i)),
+        }
+        plots.append(item)
+
+    return plots
+
+
+def test_plot_copier():
+    with tempfile.TemporaryDirectory() as tempdir:
+        plots = get_plots(tempdir, 50)
+
+        with PlotCopier(nthreads=4, max_pending=8) as copier:
+            copier.submit(plots[:25])
+            copier.submit(plots[25:])
+
+        for i, item in enumerate(plots):
+            assert not os.path.isfile(item["staging"])
+
+            for key in ["processed", "webserver"]:
+                with open(item[key], "r") as f:
+                    assert f.read() == "plot {0}".format(i)
+
+    # missing staging files are reported at the end
+    with tempfile.TemporaryDirectory() as tempdir:
+        plots = get_plots(tempdir, 5)
+        os.remove(plots[2]["staging"])
+
+        copier = PlotCopier(nthreads=2)
+        copier.submit(plots)
+
+        with assert_raises(RuntimeError):
+            copier.wait()
+
+        assert os.path.isfile(plots[4]["processed"])
+
+    for nthreads in [0, 1.5]:
+        with assert_raises(RuntimeError):
+            PlotCopier(nthreads=nthreads)
+
+
+def test_publish_file():
+    with tempfile.TemporaryDirectory() as tempdir:
+        src = os.path.join(tempdir, "plot.jpg")
+
+        with open(src, "w") as f:
+            f.write("plot")
+
+        # hard link on the same filesystem
+        devices = {}
+        dst = os.path.join(tempdir, "linked.jpg")
+        assert publish_file(src, dst, devices=devices)
+        assert os.path.samefile(src, dst)
+        assert devices == {tempdir: os.stat(tempdir).st_dev}
+
+        # replace existing files
+        assert publish_file(src, dst, devices=devices)
+        assert os.stat(src).st_nlink == 2
+
+        # copy otherwise
+        dst = os.path.join(tempdir, "copied.jpg")
+        assert not publish_file(src, dst, link=False)
+        assert not os.path.samefile(src, dst)
+
+        with open(dst, "r") as f:
+            assert f.read() == "plot"
+
+        dst = os.path.join(tempdir, "copied2.jpg")
+        copy_file(src, dst)
+
+        with open(dst, "r") as f:
+            assert f.read() == "plot"
+
+
+def test_ingest_journal():
+    with tempfile.TemporaryDirectory() as tempdir:
+        filename = os.path.join(tempdir, "journal.sqlite")
+        plots = get_plots(tempdir, 2)
+
+        with IngestJournal(filename) as journal:
+            assert journal.get("a.spccl.log") is None
+            assert not is_ingest_complete(None)
+
+            journal.update("a.spccl.log", 1, parsed=True)
+            journal.update("a.spccl.log", 1, inserted=True, ncands=10, plots=plots)
+            journal.update("b.spccl.log", 1, inserted=True, ncands=0, plots=[])
+            journal.update("c.spccl.log", 2, inserted=True, ncands=5, plots=plots)
+
+            entry = journal.get("a.spccl.log")
+            assert entry["parsed"] and entry["inserted"]
+            assert entry["ncands"] == 10
+            assert entry["plots"] == plots
+            assert not entry["published"] and not entry["moved"]
+
+            with assert_raises(RuntimeError):
+                journal.update("a.spccl.log", 1, bla=True)
+
+        # the state persists
+        with IngestJournal(filename) as journal:
+            entries = journal.get_incomplete(1)
+            assert [item["filename"] for item in entries] == [
+                "a.spccl.log",
+                "b.spccl.log",
+            ]
+
+            journal.update("a.spccl.log", 1, published=True, moved=True)
+            assert is_ingest_complete(journal.get("a.spccl.log"))
+            assert not is_ingest_complete(journal.get("c.spccl.log"))
+            assert len(journal.get_incomplete(1)) == 1
+
+
+def test_staging_scanner():
+    with tempfile.TemporaryDirectory() as tempdir:
+        filenames = []
+
+        for i in range(3):
+            filename = os.path.join(tempdir, "node", "{0}.spccl.log".format(i))
+            os.makedirs(os.path.dirname(filename), exist_ok=True)
+
+            with open(filename, "w") as f:
+                f.write("cand {0}\n".format(i))
+
+            os.utime(filename, (1000.0 + i, 1000.0 + i))
+            filenames.append(filename)
+
+        scanner = StagingScanner(os.path.join(tempdir, "*", "*.spccl.log"))
+
+        assert scanner.get_lag() == 0.0
+        assert scanner.get_last_modified() is None
+
+        # the files are offered while they are still being written
+        assert scanner.scan() == filenames
+        assert scanner.get_queue_depth() == 3
+        assert scanner.get_lag(now=1011.5) == 11.5
+        assert scanner.get_last_modified() == 1002.0
+
+        scanner.mark_done(filenames[:2])
+        assert scanner.get_queue_depth() == 1
+        assert scanner.scan() == filenames[2:]
+
+        # changed files are offered again
+        with open(filenames[0], "a") as f:
+            f.write("cand 3\n")
+
+        os.utime(filenames[0], (1020.0, 1020.0))
+        assert scanner.scan() == [filenames[0], filenames[2]]
+
+        # moved files are forgotten
+        scanner.mark_done(filenames)
+        os.remove(filenames[1])
+        assert scanner.scan() == []
+        assert sorted(scanner.done.keys()) == [filenames[0], filenames[2]]
+
+
+if __name__ == "__main__":
+    import nose2
+
+    nose2.main()
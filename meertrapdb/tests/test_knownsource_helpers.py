@@ -0,0 +1,169 @@
+#
+#   2020 Fabian Jankowski
+#
+
+import glob
+import os.path
+import tempfile
+
+from astropy.coordinates import SkyCoord
+import astropy.units as u
+import numpy as np
+from numpy.testing import assert_raises
+from scipy.spatial import cKDTree
+
+from meertrapdb.knownsource_helpers import (
+    find_known_sources,
+    get_matcher_cache_file,
+    get_package_hash,
+    is_private_path,
+    load_matcher,
+)
+
+
+class PositionMatcher:
+    def __init__(self):
+        """
+        A simple matcher that matches sources north of the equator by DM.
+        """
+
+        self.nquery = 0
+
+    def find_matches(self, source, dm):
+        self.nquery += 1
+
+        if source.dec.deg < 0:
+            return None
+
+        match = {
+            "psrj": "J{0:04.0f}".format(dm),
+            "catalogue": "test",
+            "dm": dm,
+            "type": "radio",
+        }
+
+        return match
+
+
+def test_find_known_sources():
+    rng = np.random.default_rng(42)
+
+    ra = rng.choice([10.0, 20.0, 30.0], size=500)
+    dec = rng.choice([-30.0, 30.0], size=500)
+    dms = rng.choice([100.0, 100.5, 300.0], size=500)
+    coords = SkyCoord(ra=ra, dec=dec, frame="icrs", unit=(u.deg, u.deg))
+
+    matcher = PositionMatcher()
+    info = find_known_sources(matcher, coords, dms)
+
+    assert len(info) == 500
+    assert matcher.nquery == 18
+
+    # compare with querying each candidate
+    for i in range(len(info)):
+        match = PositionMatcher().find_matches(coords[i], dms[i])
+
+        if match is None:
+            assert not info["has_match"][i]
+        else:
+            assert info["has_match"][i]
+            assert info["source"][i] == match["psrj"]
+            assert info["dm"][i] == match["dm"]
+            assert info["catalogue"][i] == "test"
+            assert info["type"][i] == "radio"
+
+    info = find_known_sources(matcher, coords[:0], [])
+    assert len(info) == 0
+
+
+def create_tree():
+    rng = np.random.default_rng(42)
+
+    return cKDTree(rng.uniform(size=(100, 3)))
+
+
+def test_matcher_cache():
+    package_dir = os.path.dirname(os.path.abspath(__file__))
+
+    with tempfile.TemporaryDirectory() as tempdir:
+        cache_file = get_matcher_cache_file("psrcat", 1.5, 5.0, package_dir, tempdir)
+
+        assert os.path.dirname(cache_file) == tempdir
+        assert cache_file == get_matcher_cache_file(
+            "psrcat", 1.5, 5.0, package_dir, tempdir
+        )
+        assert cache_file != get_matcher_cache_file(
+            "psrcat", 1.5, 10.0, package_dir, tempdir
+        )
+        assert cache_file != get_matcher_cache_file(
+            "rratalog", 1.5, 5.0, package_dir, tempdir
+        )
+
+        tree = load_matcher(cache_file, create_tree)
+        assert os.path.isfile(cache_file)
+
+        # loaded from the cache file
+        def fail():
+            raise AssertionError("The cache file was not used.")
+
+        cached = load_matcher(cache_file, fail)
+        np.testing.assert_equal(cached.data, tree.data)
+        assert cached.query([0.5, 0.5, 0.5]) == tree.query([0.5, 0.5, 0.5])
+
+        # broken cache files are replaced
+        with open(cache_file, "wb") as f:
+            f.write(b"bla")
+
+        tree = load_matcher(cache_file, create_tree)
+        np.testing.assert_equal(tree.data, cached.data)
+
+        # stale cache files are removed
+        other_file = get_matcher_cache_file("psrcat", 2.0, 5.0, package_dir, tempdir)
+        load_matcher(other_file, create_tree)
+
+        assert glob.glob(os.path.join(tempdir, "*")) == [other_file]
+        assert is_private_path(other_file)
+
+        # cache files that other users can modify are not loaded
+        os.chmod(other_file, 0o666)
+        assert not is_private_path(other_file)
+
+        tree = load_matcher(other_file, create_tree)
+        np.testing.assert_equal(tree.data, cached.data)
+        assert is_private_path(other_file)
+
+        # the matcher is prepared from scratch
+        os.chmod(tempdir, 0o777)
+
+        with assert_raises(AssertionError):
+            load_matcher(other_file, fail)
+
+        os.chmod(tempdir, 0o700)
+        load_matcher(other_file, fail)
+
+
+def test_package_hash():
+    with tempfile.TemporaryDirectory() as tempdir:
+        filename = os.path.join(tempdir, "data", "catalogue.txt")
+        os.makedirs(os.path.dirname(filename))
+
+        with open(filename, "w") as f:
+            f.write("J0000+0000")
+
+        key = get_package_hash(tempdir)
+        assert key == get_package_hash(tempdir)
+
+        # the contents count, not the modification time
+        os.utime(filename, (1000.0, 1000.0))
+        assert key == get_package_hash(tempdir)
+
+        with open(filename, "a") as f:
+            f.write(" 10.0")
+
+        assert key != get_package_hash(tempdir)
+
+
+if __name__ == "__main__":
+    import nose2
+
+    nose2.main()
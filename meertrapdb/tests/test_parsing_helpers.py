@@ -2,9 +2,23 @@
 #   2020 Fabian Jankowski
 #
 
+import glob
+import io
 import os.path
+import shutil
+import tempfile
 
-from meertrapdb.parsing_helpers import parse_spccl_file
+import numpy as np
+from numpy.testing import assert_raises
+
+from meertrapdb.parsing_helpers import (
+    get_spccl_cache_file,
+    iter_spccl_files,
+    load_spccl_files,
+    parse_spccl_buffer,
+    parse_spccl_file,
+    SpcclFollower,
+)
 
 
 def test_spccl_versions_parsing():
@@ -18,6 +32,267 @@ def test_spccl_versions_parsing():
         parse_spccl_file(filename, version)
 
 
+def test_spccl_parsing_types():
+    spccl_file = os.path.join(
+        os.path.dirname(__file__), "test_clusterer_candidates.spccl.log"
+    )
+
+    data = parse_spccl_file(spccl_file, 1)
+
+    assert len(data) == 7213
+    assert data.dtype.names == (
+        "index",
+        "mjd",
+        "dm",
+        "width",
+        "snr",
+        "beam",
+        "ra",
+        "dec",
+        "fil_file",
+        "plot_file",
+        "coherent",
+    )
+
+    for field, kind in zip(["index", "mjd", "beam", "ra", "coherent"], "ifiUb"):
+        assert data.dtype[field].kind == kind
+
+    np.testing.assert_equal(data["index"], np.arange(len(data)))
+    assert np.all(data["coherent"])
+
+    assert data[0]["mjd"] == 58743.6291353253
+    assert data[0]["dm"] == 531.292
+    assert data[0]["beam"] == 0
+    assert data[0]["ra"] == "19:09:47.43"
+    assert data[0]["plot_file"] == "58743.629135325304_DM_531.29_beam_0.jpg"
+
+    # the legacy format without index column
+    cand_v1 = os.path.join(os.path.dirname(__file__), "candidates_v1.spccl.log")
+    data = parse_spccl_file(cand_v1, 1)
+
+    assert data[0]["beam"] == 21
+    assert data[0]["plot_file"] == "58657.890851710705_DM_57.716_beam_21.jpg"
+
+
+def test_spccl_parsing_versions():
+    line_v2 = "3\t58900.8\t51.269\t34.2992\t93.23\t0\tI\t13:22:32.15\t-62:41:53.5\ta.fil\ta.jpg\n"
+    line_v3 = "3\t58900.8\t51.269\t34.2992\t93.23\t1\tC\t13:22:32.15\t-62:41:53.5\t1\t0.9\ta.fil\ta.jpg\n"
+
+    data = parse_spccl_buffer(io.StringIO(line_v2 * 2), 2)
+    assert len(data) == 2
+    assert not np.any(data["coherent"])
+
+    data = parse_spccl_buffer(io.StringIO(line_v3), 3)
+    assert data[0]["label"] == 1
+    assert data[0]["probability"] == 0.9
+    assert data[0]["coherent"]
+
+    # wrong version
+    with assert_raises(RuntimeError):
+        parse_spccl_buffer(io.StringIO(line_v2), 3)
+
+    with assert_raises(RuntimeError):
+        parse_spccl_buffer(io.StringIO(line_v3), 2)
+
+    with assert_raises(NotImplementedError):
+        parse_spccl_buffer(io.StringIO(line_v2), 4)
+
+    # empty file
+    with tempfile.NamedTemporaryFile(mode="w", suffix=".spccl.log") as f:
+        data = parse_spccl_file(f.name, 2)
+
+    assert len(data) == 0
+    assert "coherent" in data.dtype.names
+
+    with assert_raises(RuntimeError):
+        parse_spccl_file("does_not_exist.spccl.log", 2)
+
+
+def test_spccl_follower():
+    spccl_file = os.path.join(
+        os.path.dirname(__file__), "test_clusterer_candidates.spccl.log"
+    )
+
+    with open(spccl_file, "rb") as f:
+        content = f.read()
+
+    good_data = parse_spccl_file(spccl_file, 1)
+
+    with tempfile.TemporaryDirectory() as tempdir:
+        filename = os.path.join(tempdir, "candidates.spccl.log")
+        follower = SpcclFollower(1)
+
+        # append the file in pieces that end in partial lines
+        parts = []
+
+        for start in range(0, len(content), 100000):
+            with open(filename, "ab") as f:
+                f.write(content[start : start + 100000])
+
+            parts.append(follower.read(filename))
+
+            assert follower.offsets[filename] <= start + 100000
+
+        data = np.concatenate(parts)
+
+        np.testing.assert_equal(data, good_data)
+        assert follower.offsets[filename] == len(content)
+
+        # nothing new
+        assert len(follower.read(filename)) == 0
+
+        # a partial line is only read at the end
+        line = content[: content.find(b"\n")]
+
+        with open(filename, "ab") as f:
+            f.write(line)
+
+        assert len(follower.read(filename)) == 0
+        data = follower.read(filename, final=True)
+        assert len(data) == 1
+        assert data["index"][0] == len(good_data)
+
+        # truncation
+        with open(filename, "wb") as f:
+            f.write(content[: content.find(b"\n") + 1])
+
+        data = follower.read(filename)
+        assert len(data) == 1
+        assert data["index"][0] == len(good_data) + 1
+        assert follower.offsets[filename] == content.find(b"\n") + 1
+
+        # replacement with a new file of the same size
+        temp_file = os.path.join(tempdir, "new.spccl.log")
+
+        with open(temp_file, "wb") as f:
+            f.write(content[: content.find(b"\n") + 1])
+
+        os.replace(temp_file, filename)
+
+        data = follower.read(filename)
+        assert len(data) == 1
+        assert data["index"][0] == len(good_data) + 2
+
+        follower.forget(filename)
+        assert filename not in follower.offsets
+
+    with assert_raises(RuntimeError):
+        follower.read(filename)
+
+
+def test_spccl_cache():
+    spccl_file = os.path.join(
+        os.path.dirname(__file__), "test_clusterer_candidates.spccl.log"
+    )
+
+    good_data = parse_spccl_file(spccl_file, 1)
+
+    with tempfile.TemporaryDirectory() as tempdir:
+        filename = os.path.join(tempdir, "candidates.spccl.log")
+        shutil.copy(spccl_file, filename)
+
+        # sidecar
+        data = parse_spccl_file(filename, 1, cache=True)
+        cache_file = get_spccl_cache_file(filename, 1)
+
+        assert os.path.isfile(cache_file)
+        np.testing.assert_equal(data, good_data)
+
+        data = parse_spccl_file(filename, 1, cache=True)
+
+        assert isinstance(data, np.memmap)
+        np.testing.assert_equal(data, good_data)
+
+        # the version is part of the key
+        assert get_spccl_cache_file(filename, 2) != cache_file
+
+        # a changed file gets a new cache file, the old one is removed
+        with open(filename, "a") as f:
+            f.write(
+                "0\t58743.6\t100.0\t0.6125\t13.36\t0\t19:09:47.43\t-37:44:14.5\ta.fil\ta.jpg\n"
+            )
+
+        os.utime(filename, ns=(0, 0))
+        data = parse_spccl_file(filename, 1, cache=True)
+
+        assert len(data) == len(good_data) + 1
+        assert not os.path.isfile(cache_file)
+        assert len(glob.glob(filename + ".*.npy")) == 1
+
+        # central cache directory
+        cache_dir = os.path.join(tempdir, "cache")
+        data = parse_spccl_file(filename, 1, cache=True, cache_dir=cache_dir)
+
+        assert len(os.listdir(cache_dir)) == 1
+        assert len(data) == len(good_data) + 1
+
+        # the stale entry in the cache directory is removed too
+        cache_file = get_spccl_cache_file(filename, 1, cache_dir=cache_dir)
+
+        with open(filename, "a") as f:
+            f.write(
+                "1\t58743.7\t100.0\t0.6125\t13.36\t0\t19:09:47.43\t-37:44:14.5\ta.fil\ta.jpg\n"
+            )
+
+        os.utime(filename, ns=(0, 0))
+        data = parse_spccl_file(filename, 1, cache=True, cache_dir=cache_dir)
+
+        assert len(data) == len(good_data) + 2
+        assert not os.path.isfile(cache_file)
+        assert len(os.listdir(cache_dir)) == 1
+
+        # the user directory is expanded
+        home = os.environ.get("HOME")
+        os.environ["HOME"] = tempdir
+
+        try:
+            parse_spccl_file(filename, 1, cache=True, cache_dir="~/user_cache")
+        finally:
+            if home is None:
+                del os.environ["HOME"]
+            else:
+                os.environ["HOME"] = home
+
+        assert len(os.listdir(os.path.join(tempdir, "user_cache"))) == 1
+
+
+def test_spccl_multi_file_loading():
+    cand_v2 = os.path.join(os.path.dirname(__file__), "candidates_v2.spccl.log")
+
+    good_data = parse_spccl_file(cand_v2, 2)
+
+    with tempfile.TemporaryDirectory() as tempdir:
+        for node_name in ["tpn-0-1", "tpn-0-37"]:
+            outdir = os.path.join(tempdir, "2020-02-21_19:28:13", node_name)
+            os.makedirs(outdir)
+            shutil.copy(cand_v2, os.path.join(outdir, "2020-02-21_19:28:13.spccl.log"))
+
+        pattern = os.path.join(tempdir, "2*", "tpn*", "2*.spccl.log")
+
+        for nproc in [1, 2]:
+            data = load_spccl_files(pattern, 2, nproc=nproc)
+
+            assert len(data) == 2 * len(good_data)
+            np.testing.assert_equal(data["index"], np.arange(len(data)))
+            np.testing.assert_equal(data["mjd"][len(good_data) :], good_data["mjd"])
+            assert np.all(data["node_name"][: len(good_data)] == "tpn-0-1")
+            assert np.all(data["node_name"][len(good_data) :] == "tpn-0-37")
+            assert np.all(data["obs_utc_start"] == np.datetime64("2020-02-21T19:28:13"))
+
+        # per file
+        parts = list(iter_spccl_files(sorted(glob.glob(pattern)), 2))
+
+        assert len(parts) == 2
+        assert parts[1][0].endswith(
+            os.path.join("tpn-0-37", "2020-02-21_19:28:13.spccl.log")
+        )
+        assert parts[1][1]["index"][0] == len(good_data)
+
+    # no files
+    data = load_spccl_files(os.path.join(tempdir, "*.spccl.log"), 2)
+    assert len(data) == 0
+
+
 if __name__ == "__main__":
     import nose2
 
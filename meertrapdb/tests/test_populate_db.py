@@ -0,0 +1,361 @@
+#
+#   2020 Fabian Jankowski
+#
+
+import builtins
+import copy
+from datetime import datetime
+import glob
+import json
+import os.path
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+from numpy.testing import assert_raises
+from pony.orm import db_session, select
+from pony.orm.dbproviders.sqlite import SQLiteProvider
+from pytz import timezone
+
+try:
+    import meertrapdb.apps.populate_db as populate_db
+except ImportError as err:
+    raise unittest.SkipTest("The ingest dependencies are missing: {0}".format(err))
+
+from meertrapdb import schema
+from meertrapdb.config_helpers import get_config
+from meertrapdb.ingest_helpers import IngestJournal, get_mjd_keys, is_ingest_complete
+from meertrapdb.parsing_helpers import parse_spccl_file
+from meertrapdb.schema import db
+from meertrapdb.simulation.generator import CandidateGenerator
+
+# the database of all tests, it can only be bound once
+DB_DIR = tempfile.TemporaryDirectory()
+
+
+def get_database():
+    if db.provider is None:
+        # sqlite stores signed 64 bit integers, enough for the test ids
+        SQLiteProvider.uint64_support = True
+
+        db.bind(
+            provider="sqlite",
+            filename=os.path.join(DB_DIR.name, "test.sqlite"),
+            create_db=True,
+        )
+        db.generate_mapping(create_tables=True)
+
+    return db
+
+
+def get_summary(utc_start, finished=True):
+    summary = {
+        "utc_start": utc_start,
+        "sb_details": {
+            "actual_start_time": "{0}.000000Z".format(utc_start.replace("_", " ")),
+            "id": 5,
+            "id_code": "20200101-0001",
+            "proposal_id": "SCI-20200101-MK-01",
+            "description": "TRAPUM test",
+            "sub_nr": 1,
+            "owner": "test",
+        },
+        "beams": {
+            "coherent_beam_shape": {"angle": 1.0, "x": 1.0, "y": 1.0},
+            "ca_target_request": {
+                "tilings": [
+                    {
+                        "epoch": 1.0,
+                        "nbeams": 3,
+                        "overlap": 0.5,
+                        "reference_frequency": 1.284e9,
+                        "target": "test",
+                    }
+                ]
+            },
+            "cb_antennas": [1, 2],
+            "ib_antennas": [1],
+            "list": [],
+        },
+        "data": {"cfreq": 1284e6, "bw": 856e6, "nchan": 4096, "tsamp": 3e-4},
+        "pipeline": {
+            "mode": "test",
+            "cheetah": {
+                "ddplan_str": "test",
+                "spsift": {
+                    "dm_thresh": 5.0,
+                    "sigma_thresh": 8.0,
+                    "pulse_width_threshold": 100.0,
+                },
+            },
+        },
+        "version_info": {"control": "test"},
+    }
+
+    # the pipeline writes the stop time at the end of the run
+    if finished:
+        summary["utc_stop"] = "2020-01-01_11:00:00"
+
+    return summary
+
+
+def get_config_for(tempdir):
+    config = get_config()
+
+    fsconf = config["filesystem"]
+    fsconf["ingest"]["staging_dir"] = os.path.join(tempdir, "staging")
+    fsconf["ingest"]["processed_dir"] = os.path.join(tempdir, "processed")
+    fsconf["webserver"]["candidate_dir"] = os.path.join(tempdir, "web")
+    config["ingest"]["journal"] = os.path.join(tempdir, "journal.sqlite")
+
+    return config
+
+
+def write_spccl_lines(filename, data, beam):
+    with open(filename, "a") as f:
+        for i, item in enumerate(data):
+            fields = [
+                i,
+                "{0:.10f}".format(item["mjd"]),
+                item["dm"],
+                item["width"],
+                item["snr"],
+                beam,
+                "C",
+                item["ra"],
+                item["dec"],
+                item["label"],
+                item["probability"],
+                item["fil_file"],
+                item["plot_file"],
+            ]
+            f.write("\t".join(str(field) for field in fields) + "\n")
+
+
+def write_staging(config, utc_start, nnode, nfile, ncand, seed, finished=True):
+    staging_dir = config["filesystem"]["ingest"]["staging_dir"]
+    gen = CandidateGenerator(seed=seed)
+
+    nunique = 0
+
+    for node in range(nnode):
+        node_name = "tpn-0-{0}".format(node)
+        dirname = os.path.join(staging_dir, utc_start, node_name)
+        os.makedirs(dirname)
+
+        summary_file = os.path.join(
+            dirname, "{0}_{1}_run_summary.json".format(utc_start, node_name)
+        )
+
+        with open(summary_file, "w") as f:
+            json.dump(get_summary(utc_start, finished), f)
+
+        for i in range(nfile):
+            data = gen.generate(ncand, version=3, filenames=True)
+            filename = os.path.join(
+                dirname, "{0}_beam{1:02d}.spccl.log".format(utc_start, i)
+            )
+
+            write_spccl_lines(filename, data, nfile * node + i)
+
+            # plots of some candidates
+            for item in data[:3]:
+                with open(os.path.join(dirname, item["plot_file"]), "w") as f:
+                    f.write("plot")
+
+            nunique += len(np.unique(get_mjd_keys(data["mjd"])))
+
+    return nunique
+
+
+def get_candidate_count(schedule_block):
+    with db_session:
+        ncand = select(
+            c
+            for c in schema.SpsCandidate
+            for obs in c.observation
+            for sb in obs.schedule_block
+            if sb.sb_id == schedule_block
+        ).count()
+
+    return ncand
+
+
+def test_ingest_parallel():
+    get_database()
+
+    with tempfile.TemporaryDirectory() as tempdir:
+        config = get_config_for(tempdir)
+        config["ingest"]["nproc"] = 2
+
+        nunique = write_staging(config, "2020-01-01_10:00:00", 3, 2, 200, 42)
+
+        # some candidates are duplicates
+        assert nunique < 3 * 2 * 200
+
+        staging_dir = config["filesystem"]["ingest"]["staging_dir"]
+        filenames = glob.glob(os.path.join(staging_dir, "*", "*", "*.spccl.log"))
+
+        get_config = populate_db.get_config
+        populate_db.get_config = lambda: copy.deepcopy(config)
+
+        try:
+            populate_db.run_production(101, False)
+        finally:
+            populate_db.get_config = get_config
+
+        assert get_candidate_count(101) == nunique
+
+        # the journal records the candidates inserted, without the duplicates
+        with IngestJournal(config["ingest"]["journal"]) as journal:
+            ncands = [journal.get(item)["ncands"] for item in filenames]
+
+        assert sum(ncands) == nunique
+
+        # the files are moved and the plots are published
+        assert len(glob.glob(os.path.join(staging_dir, "*", "*", "*.log"))) == 0
+        assert len(glob.glob(os.path.join(staging_dir, "*", "*", "*.jpg"))) == 0
+
+        web_dir = config["filesystem"]["webserver"]["candidate_dir"]
+        assert len(glob.glob(os.path.join(web_dir, "*", "*", "*", "*.jpg"))) == 18
+
+
+def test_ingest_rerun():
+    get_database()
+
+    with tempfile.TemporaryDirectory() as tempdir:
+        config = get_config_for(tempdir)
+        config["ingest"]["nproc"] = 1
+
+        utc_start = "2020-01-01_14:00:00"
+        nunique = write_staging(config, utc_start, 1, 2, 50, 45)
+
+        get_config = populate_db.get_config
+        populate_db.get_config = lambda: copy.deepcopy(config)
+
+        # confirm to continue with the existing schedule block
+        prompt = builtins.input
+        builtins.input = lambda msg: "Y"
+
+        try:
+            first = populate_db.run_production(103, False)
+
+            # the files are moved, nothing is left to ingest
+            with assert_raises(RuntimeError):
+                populate_db.run_production(103, False)
+
+            # the files are complete in the journal
+            fsconf = config["filesystem"]["ingest"]
+
+            for filename in glob.glob(
+                os.path.join(fsconf["processed_dir"], "*", "*", "*.spccl.log")
+            ):
+                shutil.copy(
+                    filename,
+                    filename.replace(fsconf["processed_dir"], fsconf["staging_dir"]),
+                )
+
+            second = populate_db.run_production(103, False)
+        finally:
+            populate_db.get_config = get_config
+            builtins.input = prompt
+
+        assert first == second
+        assert first == datetime(2020, 1, 1, 14, 0, 0, tzinfo=timezone("UTC"))
+        assert get_candidate_count(103) == nunique
+
+
+def test_ingest_watch():
+    get_database()
+
+    with tempfile.TemporaryDirectory() as tempdir:
+        config = get_config_for(tempdir)
+        config["watch"]["poll_interval"] = 0.0
+        config["watch"]["settle_time"] = 0.0
+        config["watch"]["max_idle"] = 0.0
+
+        utc_start = "2020-01-01_12:00:00"
+        write_staging(config, utc_start, 1, 1, 100, 43, finished=False)
+
+        staging_dir = config["filesystem"]["ingest"]["staging_dir"]
+        dirname = os.path.join(staging_dir, utc_start, "tpn-0-0")
+        filename = os.path.join(dirname, "{0}_beam00.spccl.log".format(utc_start))
+        summary_file = os.path.join(
+            dirname, "{0}_tpn-0-0_run_summary.json".format(utc_start)
+        )
+
+        counts = []
+
+        # the pipeline appends to the file and finishes the run in between the
+        # watch cycles, when the processing stages run
+        def run_stage(schedule_block):
+            counts.append(get_candidate_count(schedule_block))
+
+            if len(counts) == 1:
+                # the file is not moved while the run is going on
+                assert os.path.isfile(filename)
+
+                gen = CandidateGenerator(seed=44)
+                write_spccl_lines(filename, gen.generate(50, version=3), 1)
+
+            elif len(counts) == 2:
+                assert os.path.isfile(filename)
+
+                with open(summary_file, "w") as f:
+                    json.dump(get_summary(utc_start), f)
+
+        stages = {
+            "run_parameters": run_stage,
+            "run_sift": lambda schedule_block, incremental: None,
+            "run_known_sources": lambda schedule_block: None,
+            "get_config": lambda: copy.deepcopy(config),
+        }
+
+        for name in stages:
+            func = getattr(populate_db, name)
+            setattr(populate_db, name, stages[name])
+            stages[name] = func
+
+        try:
+            populate_db.run_watch(102, False)
+        finally:
+            for name in stages:
+                setattr(populate_db, name, stages[name])
+
+        # the file is moved once the run is finished
+        assert not os.path.isfile(filename)
+
+        outfile = os.path.join(
+            config["filesystem"]["ingest"]["processed_dir"],
+            utc_start,
+            "tpn-0-0",
+            os.path.basename(filename),
+        )
+        data = parse_spccl_file(outfile, config["candidates"]["version"])
+        assert len(data) == 150
+
+        # the appended candidates arrive after the next cycle
+        nunique = len(np.unique(get_mjd_keys(data["mjd"])))
+        nfirst = len(np.unique(get_mjd_keys(data["mjd"][:100])))
+
+        assert counts == [nfirst, nunique, nunique]
+        assert get_candidate_count(102) == nunique
+
+        with IngestJournal(config["ingest"]["journal"]) as journal:
+            entry = journal.get(filename)
+
+        assert is_ingest_complete(entry)
+        assert entry["ncands"] == nunique
+
+        with db_session:
+            observation = schema.Observation.get(
+                utc_start=datetime(2020, 1, 1, 12, 0, 0)
+            )
+            assert observation.finished
+
+
+if __name__ == "__main__":
+    import nose2
+
+    nose2.main()
@@ -46,6 +46,7 @@ setup(
         "pytz",
         "pyyaml",
         "requests",
+        "scipy",
         "skymap @ git+https://github.com/fjankowsk/skymap.git@master",
     ],
     entry_points={
@@ -56,6 +57,7 @@ setup(
             "meertrapdb-parse_datadump = meertrapdb.apps.parse_data_dump:main",
             "meertrapdb-populate_db = meertrapdb.apps.populate_db:main",
             "meertrapdb-search_knownsources = meertrapdb.apps.search_known_sources:main",
+            "meertrapdb-sweep_sifter = meertrapdb.apps.sweep_sifter:main",
         ],
     },
     classifiers=[